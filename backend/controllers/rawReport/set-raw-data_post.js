@@ -9,7 +9,17 @@ const setRawDataPost = async (req, res) => {
       return res.status(404).json({ message: "User not found" });
     }
 
-    const jsonData = req.body;
+    // Retried deliveries from the chatbot's report outbox carry the same key
+    const idempotencyKey = req.body.idempotency_key || req.get("Idempotency-Key");
+    if (idempotencyKey) {
+      for (const [existingKey, report] of user.rawReports) {
+        if (report && report.idempotency_key === idempotencyKey) {
+          return res.status(200).json({ message: "Raw data already set", key: existingKey });
+        }
+      }
+    }
+
+    const jsonData = idempotencyKey ? { ...req.body, idempotency_key: idempotencyKey } : req.body;
     const currentLength = user.rawReports.size;
     const i = currentLength + 1;
     const key = `${user._id}_${i}`;
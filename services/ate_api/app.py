@@ -1,9 +1,23 @@
+import asyncio
 import os
+import re
+import sys
+from collections import Counter
+from typing import List
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from google import genai  # Google GenAI SDK
+from gemini_client import GeminiClient
+from language_detect import classify, load_phrase_table
+from translation_cache import TranslationCache, normalize_text
+
+# Shared instrumentation (services/common)
+_COMMON_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+if _COMMON_DIR not in sys.path:
+    sys.path.insert(0, _COMMON_DIR)
+import metrics
 
 load_dotenv()  # reads .env at project root
 
@@ -15,6 +29,8 @@ app.add_middleware(
     allow_origins=["*"], allow_credentials=True,
     allow_methods=["*"], allow_headers=["*"],
 )
+# Request histograms and GET /metrics (Prometheus text format)
+metrics.instrument_fastapi(app, "ate_api")
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if not GEMINI_API_KEY:
@@ -23,11 +39,61 @@ if not GEMINI_API_KEY:
 client = genai.Client(api_key=GEMINI_API_KEY)
 MODEL = "gemini-2.5-flash"  # change to "gemini-2.5-pro" for higher quality
 
+# Non-blocking model calls: GEMINI_CONCURRENCY requests upstream at once, each
+# (queueing included) bounded by TRANSLATE_DEADLINE_SECS
+TRANSLATE_DEADLINE_SECS = float(os.getenv("TRANSLATE_DEADLINE_SECS", "20"))
+gemini = GeminiClient(
+    client, MODEL,
+    concurrency=int(os.getenv("GEMINI_CONCURRENCY", "32")),
+    deadline=TRANSLATE_DEADLINE_SECS,
+)
+metrics.upstream_errors.add_source(lambda: {
+    ("gemini", "error"): gemini.stats["errors"],
+    ("gemini", "timeout"): gemini.stats["timeouts"],
+})
+
+# Translations by normalized text; set TRANSLATION_CACHE_PATH to keep them on
+# disk across restarts, TRANSLATION_CACHE_SIZE=0 to disable the memory tier
+translation_cache = TranslationCache(
+    max_entries=int(os.getenv("TRANSLATION_CACHE_SIZE", "4096")),
+    path=os.getenv("TRANSLATION_CACHE_PATH") or None,
+    ttl=float(os.getenv("TRANSLATION_CACHE_TTL_SECS", str(30 * 24 * 3600))),
+)
+metrics.register_cache("translation", lambda: translation_cache.stats,
+                       size=lambda: translation_cache.snapshot()["size"])
+
+# Local classifier in front of the model: English, numbers/places and known
+# phrases never reach Gemini. LANGUAGE_FAST_PATH=0 sends everything to the model.
+LANGUAGE_FAST_PATH = os.getenv("LANGUAGE_FAST_PATH", "1") not in ("0", "false")
+phrase_table = load_phrase_table()
+# Texts returned unchanged for these paths
+PASSTHROUGH_PATHS = ("english", "non_linguistic")
+# How each text was answered: english, non_linguistic, phrase_table, cache or model
+path_counts = Counter()
+
+# Limits for /translate/batch: texts per request, and items / characters
+# packed into one model call
+BATCH_MAX_TEXTS = int(os.getenv("TRANSLATE_BATCH_MAX_TEXTS", "200"))
+BATCH_CALL_ITEMS = int(os.getenv("TRANSLATE_BATCH_CALL_ITEMS", "25"))
+BATCH_CALL_CHARS = int(os.getenv("TRANSLATE_BATCH_CALL_CHARS", "3000"))
+
 class TranslateIn(BaseModel):
     text: str
 
 class TranslateOut(BaseModel):
     translation: str
+    cached: bool = False
+    path: str = "model"
+
+class TranslateBatchIn(BaseModel):
+    texts: List[str]
+
+class TranslateBatchOut(BaseModel):
+    translations: List[str]
+    paths: List[str]
+    cached: int
+    coalesced: int
+    model_calls: int
 
 PROMPT = """You are a professional translator.
 Convert the following Hinglish (Hindi written in Latin script) into clear, natural English.
@@ -39,20 +105,223 @@ Return only the translation.
 Text:
 \"\"\"{text}\"\"\""""
 
+BATCH_PROMPT = """You are a professional translator.
+Convert each numbered Hinglish (Hindi written in Latin script) item below into clear, natural English.
+- Keep the meaning and tone.
+- Expand slang to standard English when helpful.
+- Do NOT add extra info.
+- Translate every item on its own, even when items repeat or look related.
+Return all {count} items in the same order, each as its marker line followed by
+the translation only, like:
+[[1]]
+<translation of item 1>
+
+Items:
+{items}"""
+
+BATCH_MARKER = re.compile(r"\[\[(\d+)\]\]\s*(.*?)(?=\s*\[\[\d+\]\]|\s*$)", re.DOTALL)
+
+
+def fast_path(text):
+    """(path, translation) when the text can be answered locally, else None."""
+    if not LANGUAGE_FAST_PATH:
+        return None
+    with metrics.span("ate.classify"):
+        path, translation, _ = classify(text, phrase_table)
+    return None if path == "model" else (path, translation)
+
+
+def cache_key(text):
+    return f"{MODEL}:{normalize_text(text)}"
+
+
+async def generate_translation(text):
+    with metrics.span("ate.model"):
+        output = (await gemini.generate(PROMPT.format(text=text))).strip()
+    if not output:
+        raise RuntimeError("Empty response from model.")
+    return output
+
+
+async def translate_and_cache(key, text):
+    output = await generate_translation(text)
+    translation_cache.put(key, output)
+    return output
+
+
+async def generate_batch(texts):
+    """
+    Translates several texts in one model call; returns {position: translation}
+    for the items the reply carried back (missing ones are left out).
+    """
+    items = "\n".join(f"[[{i}]]\n{text}" for i, text in enumerate(texts, 1))
+    with metrics.span("ate.model_batch"):
+        reply = await gemini.generate(BATCH_PROMPT.format(count=len(texts), items=items))
+    found = {}
+    for number, translation in BATCH_MARKER.findall(reply):
+        position = int(number) - 1
+        if 0 <= position < len(texts) and translation.strip():
+            found.setdefault(position, translation.strip())
+    return found
+
+
+def pack_calls(texts):
+    """Splits {key: text} into model calls bounded by BATCH_CALL_ITEMS and BATCH_CALL_CHARS."""
+    calls, current, chars = [], {}, 0
+    for key, text in texts.items():
+        if current and (len(current) >= BATCH_CALL_ITEMS or chars + len(text) > BATCH_CALL_CHARS):
+            calls.append(current)
+            current, chars = {}, 0
+        current[key] = text
+        chars += len(text)
+    if current:
+        calls.append(current)
+    return calls
+
+
+async def translate_call(call, futures):
+    """
+    One packed model call for {key: text} `call`, plus single retries for
+    items the reply leaves out; resolves each key's single-flight future.
+    Returns the number of model calls made.
+    """
+    keys = list(call)
+    model_calls = 0
+    try:
+        found = {}
+        if len(keys) > 1:
+            model_calls += 1
+            found = await generate_batch([call[k] for k in keys])
+        missing = [k for position, k in enumerate(keys) if position not in found]
+        model_calls += len(missing)
+        retried = await asyncio.gather(*(generate_translation(call[k]) for k in missing), return_exceptions=True)
+        found.update({keys.index(k): r for k, r in zip(missing, retried)})
+        for position, key in enumerate(keys):
+            translation = found[position]
+            if isinstance(translation, Exception):
+                gemini.finish(key, futures[key], error=translation)
+            else:
+                translation_cache.put(key, translation)
+                gemini.finish(key, futures[key], translation)
+    except Exception as e:
+        for key in keys:
+            gemini.finish(key, futures[key], error=e)
+    finally:
+        for key in keys:
+            gemini.finish(key, futures[key], error=RuntimeError("Translation was cancelled"))
+    return model_calls
+
 @app.get("/health")
 def health():
     return {"ok": True}
 
 @app.post("/translate", response_model=TranslateOut)
-def translate(body: TranslateIn):
+async def translate(body: TranslateIn):
     text = (body.text or "").strip()
     if not text:
         raise HTTPException(status_code=400, detail="`text` cannot be empty.")
+    local = fast_path(text)
+    if local is not None:
+        path_counts[local[0]] += 1
+        return TranslateOut(translation=local[1], path=local[0])
+    key = cache_key(text)
+    cached = translation_cache.get(key)
+    if cached is not None:
+        path_counts["cache"] += 1
+        return TranslateOut(translation=cached, cached=True, path="cache")
     try:
-        resp = client.models.generate_content(model=MODEL, contents=PROMPT.format(text=text))
-        output = (resp.text or "").strip()
-        if not output:
-            raise RuntimeError("Empty response from model.")
-        return TranslateOut(translation=output)
+        # Identical texts already on their way to the model share that call
+        output = await asyncio.wait_for(gemini.once(key, lambda: translate_and_cache(key, text)),
+                                        TRANSLATE_DEADLINE_SECS)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"Gemini did not answer within {TRANSLATE_DEADLINE_SECS:g}s.")
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Gemini error: {e}")
+    path_counts["model"] += 1
+    return TranslateOut(translation=output)
+
+@app.post("/translate/batch", response_model=TranslateBatchOut)
+async def translate_batch(body: TranslateBatchIn):
+    """
+    Translates a list of texts, in order. Texts the local classifier can
+    answer and cached texts never reach the model, and texts already being translated for another request share that call;
+    the rest are deduplicated and packed several to a model call, with the
+    calls running concurrently. Items a batched reply leaves out are retried
+    one by one. Empty texts map to "". `model_calls` counts this request's
+    own calls; texts that shared another request's call are `coalesced`.
+    """
+    if not body.texts:
+        raise HTTPException(status_code=400, detail="`texts` cannot be empty.")
+    if len(body.texts) > BATCH_MAX_TEXTS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_TEXTS} texts per request.")
+
+    texts = [(t or "").strip() for t in body.texts]
+    results, paths, futures, pending = {}, {}, {}, {}
+    cached = coalesced = 0
+    for text in texts:
+        if not text:
+            continue
+        key = cache_key(text)
+        if key in paths:
+            continue
+        local = fast_path(text)
+        if local is not None:
+            paths[key], results[key] = local
+            continue
+        hit = translation_cache.get(key)
+        if hit is not None:
+            paths[key], results[key] = "cache", hit
+            cached += 1
+            continue
+        paths[key] = "model"
+        future = gemini.join(key)
+        if future is None:
+            future = gemini.lead(key)
+            pending[key] = text
+        else:
+            coalesced += 1
+        futures[key] = future
+
+    # Detached from this request so a deadline here does not strand requests sharing the keys
+    calls = [gemini.spawn(translate_call(call, futures)) for call in pack_calls(pending)]
+    try:
+        translations = await asyncio.wait_for(
+            asyncio.gather(*(asyncio.shield(f) for f in futures.values())), TRANSLATE_DEADLINE_SECS
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"Gemini did not answer within {TRANSLATE_DEADLINE_SECS:g}s.")
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Gemini error: {e}")
+    results.update(zip(futures, translations))
+    # A call resolves its futures just before it returns; wait for its count
+    call_counts = await asyncio.gather(*(asyncio.shield(call) for call in calls), return_exceptions=True)
+
+    item_paths = [paths[cache_key(t)] if t else "empty" for t in texts]
+    path_counts.update(p for p in item_paths if p != "empty")
+    return TranslateBatchOut(
+        # Passthrough keeps each text as written, not the first spelling seen
+        translations=[t if p in PASSTHROUGH_PATHS else results[cache_key(t)] if t else ""
+                      for t, p in zip(texts, item_paths)],
+        paths=item_paths,
+        cached=cached,
+        coalesced=coalesced,
+        model_calls=sum(n for n in call_counts if isinstance(n, int)),
+    )
+
+@app.get("/translate/cache/stats")
+def translation_cache_stats():
+    return translation_cache.snapshot()
+
+@app.get("/translate/stats")
+def translate_stats():
+    """How texts were answered; skip_rate is the share that did not need a model call."""
+    total = sum(path_counts.values())
+    return {
+        "paths": dict(path_counts),
+        "total": total,
+        "skip_rate": round(1 - path_counts["model"] / total, 4) if total else 0.0,
+    }
+
+@app.get("/gemini/stats")
+def gemini_stats():
+    return gemini.snapshot()
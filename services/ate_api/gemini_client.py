@@ -0,0 +1,106 @@
+import asyncio
+
+
+class GeminiClient:
+    """
+    Async Gemini calls through the SDK's `client.aio`. At most `concurrency`
+    requests are upstream at once, each bounded by `deadline` seconds, and
+    concurrent work on the same key (e.g. the same normalized text) runs
+    once: later callers await the first caller's result.
+    """
+
+    def __init__(self, client, model, concurrency=32, deadline=20.0):
+        self.aio = client.aio
+        self.model = model
+        self.concurrency = concurrency
+        self.deadline = deadline
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._flights = {}
+        self._tasks = set()
+        self.stats = {"calls": 0, "errors": 0, "timeouts": 0, "coalesced": 0}
+        self._active = 0
+        self._queued = 0
+
+    async def _call(self, contents):
+        self._queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._queued -= 1
+        self._active += 1
+        self.stats["calls"] += 1
+        try:
+            resp = await self.aio.models.generate_content(model=self.model, contents=contents)
+            return resp.text or ""
+        finally:
+            self._active -= 1
+            self._semaphore.release()
+
+    async def generate(self, contents):
+        """Reply text for one prompt; TimeoutError after `deadline` seconds, queueing included."""
+        try:
+            return await asyncio.wait_for(self._call(contents), self.deadline)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+
+    def join(self, key):
+        """The in-flight future for `key`, or None."""
+        future = self._flights.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+        return future
+
+    def lead(self, key):
+        """Registers the caller as the one computing `key`; it must finish() it."""
+        future = asyncio.get_running_loop().create_future()
+        # Nobody may be waiting when it fails; do not warn about that
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._flights[key] = future
+        return future
+
+    def finish(self, key, future, result=None, error=None):
+        if self._flights.get(key) is future:
+            del self._flights[key]
+        if not future.done():
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def spawn(self, coro):
+        """Runs `coro` detached from the request, so a caller giving up does not cancel work others share."""
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def once(self, key, compute):
+        """`await compute()` for the first caller of `key`; concurrent callers share its result."""
+        future = self.join(key)
+        if future is None:
+            future = self.lead(key)
+
+            async def leader():
+                try:
+                    self.finish(key, future, await compute())
+                except Exception as e:
+                    self.finish(key, future, error=e)
+                finally:
+                    # No-op once finished; releases waiters if the task is cancelled
+                    self.finish(key, future, error=RuntimeError("Translation was cancelled"))
+
+            self.spawn(leader())
+        return await asyncio.shield(future)
+
+    def snapshot(self):
+        return {
+            **self.stats,
+            "concurrency": self.concurrency,
+            "active": self._active,
+            "queued": self._queued,
+            "in_flight_keys": len(self._flights),
+        }
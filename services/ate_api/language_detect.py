@@ -0,0 +1,139 @@
+"""
+Local fast path in front of the model for /translate.
+
+`classify(text)` decides, on CPU and without network, whether a text needs
+Gemini at all:
+  non_linguistic  only numbers, dates, seed codes, places, seasons: returned as is
+  phrase_table    a frequent Hinglish phrase with a stored translation
+  english         already English (known English words, no Hinglish cues): returned as is
+  model           Hinglish or uncertain: translated by Gemini
+Word lists are scored per token; a word in both lists ("the" is also
+Hinglish for "were") counts for neither.
+"""
+import json
+import os
+import re
+
+from translation_cache import normalize_text
+
+PHRASE_TABLE_PATH = os.getenv("PHRASE_TABLE_PATH") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "phrases.json")
+
+# Share of the words that must be known English (with no Hinglish cue at all)
+# before a text is passed through untranslated
+ENGLISH_MIN_SHARE = float(os.getenv("ENGLISH_MIN_SHARE", "0.6"))
+
+HINGLISH_WORDS = frozenset("""
+    hai hain ho hoga hogi honge hua hui hue tha thi the raha rahi rahe rha rhi
+    kya kab kaise kaisa kaisi kitna kitni kitne kaun kyun kyon kahan kidhar jab tab
+    mera meri mere mujhe muje humko hamara hamari aap aapka aapki tum tumhara
+    nahi nahin nhi mat haan ji ka ki ke ko se mein mai pe aur ya bhi toh
+    kar karo karna karen karein kare karu karun karte karta karti kiya kijiye
+    chahiye chaiye lagega lagegi lagta lagti lagao lagaye lagana daalein dalna daale dale
+    liye wala wali wale kuch sab bahut bohot bahot accha acha achha theek thik sahi galat
+    abhi kal aaj parso pehle baad din mahina mahine saal samay waqt
+    fasal fasalon kheti khet beej paani pani barish baarish mausam mitti khad dawai dawa
+    keede keet kida rog bimari boyein boye boyen boni bona buwai bowai katai kataai sinchai
+    dhan gehu gehun makka chana sarson bajra jowar arhar urad moong masoor soyabean
+    kisan bhai bhaiya namaste namaskar dhanyavad dhanyawad shukriya kripya
+    batao bataiye bataye batayein samjhao samajh jaankari madad chahta chahti
+    zameen jameen bigha ekad upaj paidawar nuksan nuksaan bima kharab
+""".split())
+
+ENGLISH_WORDS = frozenset("""
+    the a an is are was were be been being am i you he she it we they my your our their
+    this that these those what when where which who whom why how whose
+    do does did done can could should would will shall may might must
+    have has had not no yes ok okay sure please thanks thank hello hey hi good morning evening
+    of in on at for with from by about into over under after before between during
+    and or but if then than so because also very more most less much many some any all
+    there here now today tomorrow yesterday week weeks month months year years day days time
+    get give tell know need want help like make use start stop show check see find
+    crop crops farm farmer farming field fields seed seeds sow sowing sown plant planting
+    harvest harvesting yield grow growing growth water watering irrigation irrigate rain
+    rainfall weather temperature humidity forecast soil fertilizer fertiliser manure urea
+    pest pests insect insects disease diseases fungus leaf leaves root roots stem spray
+    wheat rice maize corn soybean mustard chickpea gram lentil groundnut millet sorghum
+    cotton sugarcane potato onion tomato barley vegetables fruit
+    risk insurance claim report loss damage price market profit cost best right wrong
+    variety type high low late early dry wet hot cold heavy light
+""".split())
+
+# Tokens that are names or codes rather than language
+ENTITY_WORDS = frozenset("""
+    kharif rabi zaid madhya pradesh maharashtra punjab uttar rajasthan haryana gujarat
+    karnataka bengal bihar india district state season
+    agar malwa alirajpur anuppur ashoknagar balaghat barwani betul bhind bhopal burhanpur
+    chhatarpur chhindwara damoh datia dewas dhar dindori guna gwalior harda hoshangabad
+    indore jabalpur jhabua katni khandwa khargone mandla mandsaur morena narmadapuram
+    narsinghpur neemuch panna rajgarh ratlam rewa sagar satna sehore seoni shajapur
+    shivpuri sidhi singrauli tikamgarh ujjain umaria vidisha pune jaipur hisar nagpur
+    kanpur patna ludhiana
+    loam alluvial vertisol clayey laterite saline sandy silty
+    pusa tejas basmati sharbati swarna kalyan sona pioneer ankur mahak tarak vaibhav
+""".split())
+
+HINGLISH_SUFFIXES = ("iye", "enge", "engi", "ega", "egi", "unga", "ungi", "ogi", "oge", "wala", "wali", "yein")
+
+_DEVANAGARI = re.compile(r"[\u0900-\u097f]")
+_DATE = re.compile(r"\b\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}\b")
+# Seed variety codes written joined or hyphenated: "hd2967", "js20-29", "pbw-343".
+# A space is only accepted after an upper-case prefix ("HD 2967"), checked
+# before lowercasing, so "kitna 20" keeps its word.
+_CODE = re.compile(r"\b[a-z]{1,6}-?\d[\w-]*")
+_SPACED_CODE = re.compile(r"\b[A-Z]{1,6} \d[\w-]*")
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+_EDGE_PUNCTUATION = re.compile(r"^[\W_]+|[\W_]+$")
+
+
+def load_phrase_table(path=PHRASE_TABLE_PATH):
+    """{normalized Hinglish phrase: English}; empty when the file is missing."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            table = json.load(f)
+    except FileNotFoundError:
+        return {}
+    return {phrase_key(k): v for k, v in table.items()}
+
+
+def phrase_key(text):
+    return _EDGE_PUNCTUATION.sub("", normalize_text(text))
+
+
+def _is_code(token):
+    # Numbers and whatever is left of codes: "2025", "1509"
+    return any(c.isdigit() for c in token)
+
+
+def _hinglish_cue(word):
+    return word in HINGLISH_WORDS and word not in ENGLISH_WORDS
+
+
+def _english(word):
+    return word in ENGLISH_WORDS and word not in HINGLISH_WORDS
+
+
+def classify(text, phrases):
+    """Returns (path, translation or None, scores) for a non-empty text."""
+    normalized = normalize_text(text)
+    if _DEVANAGARI.search(normalized):
+        return "model", None, {"reason": "devanagari"}
+
+    stripped = normalize_text(_SPACED_CODE.sub(" ", text))
+    words = [w for w in _TOKEN.findall(_CODE.sub(" ", _DATE.sub(" ", stripped)))
+             if not _is_code(w) and w not in ENTITY_WORDS]
+    if not words:
+        return "non_linguistic", text, {"words": 0}
+
+    phrase = phrases.get(phrase_key(text))
+    if phrase is not None:
+        return "phrase_table", phrase, {"words": len(words)}
+
+    hinglish = sum(1 for w in words if _hinglish_cue(w))
+    hinglish += sum(0.5 for w in words if w not in HINGLISH_WORDS and w not in ENGLISH_WORDS
+                    and w.endswith(HINGLISH_SUFFIXES))
+    english = sum(1 for w in words if _english(w))
+    scores = {"words": len(words), "hinglish": hinglish, "english_share": round(english / len(words), 3)}
+    if not hinglish and english / len(words) >= ENGLISH_MIN_SHARE:
+        return "english", text, scores
+    return "model", None, scores
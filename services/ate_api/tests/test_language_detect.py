@@ -0,0 +1,26 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from language_detect import classify
+
+
+@pytest.mark.parametrize("text", ["kitna 20", "kab 15", "aaj 5", "kya 10 acre for wheat is good"])
+def test_word_before_number_is_not_a_code(text):
+    path, translation, _ = classify(text, {})
+    assert path == "model"
+    assert translation is None
+
+
+@pytest.mark.parametrize("text", ["hd2967", "pbw-343", "js20-29", "HD 2967", "JS 20-29", "HD 2967 rabi 2025"])
+def test_seed_codes_are_non_linguistic(text):
+    assert classify(text, {})[0] == "non_linguistic"
+
+
+def test_english_with_a_code_passes_through():
+    path, translation, _ = classify("Is HD 2967 good for wheat sowing", {})
+    assert path == "english"
+    assert translation == "Is HD 2967 good for wheat sowing"
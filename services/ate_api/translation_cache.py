@@ -0,0 +1,97 @@
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """Cache key form of an utterance: NFKC, lower case, single spaces."""
+    return _SPACES.sub(" ", unicodedata.normalize("NFKC", text)).strip().lower()
+
+
+class TranslationCache:
+    """
+    LRU of translations keyed by normalized source text, optionally backed by
+    SQLite so they survive restarts. Entries older than `ttl` seconds are
+    ignored (0 = never expire).
+    """
+
+    def __init__(self, max_entries=4096, path=None, ttl=0):
+        self.max_entries = max_entries
+        self.path = path
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+        if path:
+            self._conn().execute(
+                "CREATE TABLE IF NOT EXISTS translations "
+                "(key TEXT PRIMARY KEY, text TEXT NOT NULL, created REAL NOT NULL)"
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _fresh(self, created):
+        return not self.ttl or time.time() - created <= self.ttl
+
+    def _remember(self, key, text, created):
+        self._entries[key] = (text, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        """The cached translation for a normalized key, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and self._fresh(entry[1]):
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[0]
+        if self.path:
+            row = self._conn().execute(
+                "SELECT text, created FROM translations WHERE key = ?", (key,)
+            ).fetchone()
+            if row and self._fresh(row[1]):
+                with self._lock:
+                    self._remember(key, row[0], row[1])
+                    self.stats["disk_hits"] += 1
+                return row[0]
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, key, text):
+        created = time.time()
+        with self._lock:
+            self._remember(key, text, created)
+        if self.path:
+            conn = self._conn()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO translations (key, text, created) VALUES (?, ?, ?)",
+                    (key, text, created),
+                )
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            size = len(self._entries)
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        served = stats["hits"] + stats["disk_hits"]
+        return {
+            **stats,
+            "size": size,
+            "hit_ratio": round(served / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1 @@
+"""Offline latency and throughput benchmarks for the FasalSaathi services."""
@@ -0,0 +1,129 @@
+"""
+Offline benchmark for the planner -> forecast -> risk path.
+
+Runs the three Flask apps in-process, answers Visual Crossing, WeatherAPI
+and Gemini from recorded fixtures, and reports per-stage and end-to-end
+latency percentiles, requests per second and peak RSS at each concurrency
+level, plus microbenchmarks of the hot helpers. Run from services/:
+
+    python -m benchmarks --concurrency 1,4,16 --requests 200 --output bench.json
+    python -m benchmarks.compare base.json bench.json
+
+Planner timings need a trained model in planner_api/ (train.py); without
+one the recorded planner response is used and the planner stage is skipped.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from .fixtures import load_fixture, provider_fixtures
+from .micro import run_micro
+from .pipeline import Pipeline, peak_rss_mb, run_level
+from .services import SERVICES_DIR, configure_environment, load_services
+
+
+def git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SERVICES_DIR,
+            capture_output=True, text=True, timeout=10,
+        )
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def parse_latency(spec):
+    """'visualcrossing=80,gemini=400' -> {provider: ms}."""
+    latency = {}
+    for item in filter(None, (spec or "").split(",")):
+        name, _, ms = item.partition("=")
+        latency[name.strip()] = float(ms)
+    return latency
+
+
+def print_report(result):
+    print(f"\nplanner: {result['meta']['planner']}, caches: {'on' if result['meta']['caches'] else 'off'}")
+    print(f"{'conc':>5}{'stage':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rps':>9}{'errors':>8}{'rss MB':>9}")
+    for level in result["levels"]:
+        for name, stats in level["latency"].items():
+            if not stats.get("count"):
+                continue
+            extra = (f"{level['rps']:>9.1f}{level['errors']:>8}{level['peak_rss_mb']:>9.1f}"
+                     if name == "end_to_end" else "")
+            print(f"{level['concurrency']:>5}{name:>12}{stats['p50_ms']:>10.2f}"
+                  f"{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}{extra}")
+        if level["last_error"]:
+            print(f"      last error: {level['last_error']}")
+    for name, stats in result["micro"].items():
+        print(f"micro {name:<38}{stats['median_us']:>10.1f} us (best {stats['best_us']:.1f})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated thread counts")
+    parser.add_argument("--requests", type=int, default=200, help="pipeline requests per level")
+    parser.add_argument("--caches", action="store_true", help="keep the planner, weather and description caches on")
+    parser.add_argument("--provider-latency-ms", default="",
+                        help="simulated provider delay, e.g. visualcrossing=80,weatherapi=60,gemini=400")
+    parser.add_argument("--micro-number", type=int, default=200)
+    parser.add_argument("--micro-repeat", type=int, default=5)
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--output", help="write the JSON result here")
+    args = parser.parse_args(argv)
+
+    configure_environment(caches=args.caches)
+    latency = parse_latency(args.provider_latency_ms)
+    records = load_fixture("planner_requests.json")
+    planner_fallback = load_fixture("planner_response.json")
+
+    started = time.perf_counter()
+    apps = load_services()
+    pipeline = Pipeline(apps, planner_fallback)
+    result = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "caches": args.caches,
+            "provider_latency_ms": latency,
+            "planner": "model" if pipeline.planner_loaded else "fixture",
+            "startup_s": round(time.perf_counter() - started, 3),
+        },
+        "levels": [],
+        "micro": {},
+    }
+
+    with provider_fixtures(latency) as fixtures:
+        if not args.skip_load:
+            # One pass over the workload first so imports and lazy init are not timed
+            run_level(pipeline, records, 1, len(records))
+            for concurrency in (int(c) for c in args.concurrency.split(",") if c.strip()):
+                result["levels"].append(run_level(pipeline, records, concurrency, args.requests))
+        if not args.skip_micro:
+            plan = planner_fallback
+            if pipeline.planner_loaded:
+                plan = pipeline._post(pipeline._clients()["planner"], "planner", "/predict", records[0])
+            result["micro"] = run_micro(apps, records[0], plan, args.micro_number, args.micro_repeat)
+        result["provider_calls"] = dict(fixtures.calls)
+    result["meta"]["peak_rss_mb"] = peak_rss_mb()
+
+    print_report(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to '{args.output}'.")
+    return 1 if any(level["errors"] for level in result["levels"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
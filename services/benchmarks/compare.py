@@ -0,0 +1,71 @@
+"""
+Compares two benchmark JSON results (e.g. from two commits).
+
+    python -m benchmarks.compare base.json head.json --threshold 10
+
+Prints the change in p50/p95/p99 per stage and concurrency level, in
+requests per second and in microbenchmark medians. Exits with 1 when any
+of them got worse by more than --threshold percent.
+"""
+import argparse
+import json
+import sys
+
+LATENCY_KEYS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def _change(base, head):
+    return (head - base) / base * 100.0 if base else 0.0
+
+
+def compare(base, head, threshold):
+    """Returns (rows, regressions); each row is (label, base, head, change %, worse?)."""
+    rows = []
+    base_levels = {level["concurrency"]: level for level in base.get("levels", [])}
+    for level in head.get("levels", []):
+        old = base_levels.get(level["concurrency"])
+        if old is None:
+            continue
+        conc = level["concurrency"]
+        for stage, stats in level["latency"].items():
+            old_stats = old["latency"].get(stage, {})
+            for key in LATENCY_KEYS:
+                if key in stats and key in old_stats:
+                    change = _change(old_stats[key], stats[key])
+                    rows.append((f"c={conc} {stage} {key}", old_stats[key], stats[key], change, change > threshold))
+        # Throughput regresses downwards
+        change = _change(old["rps"], level["rps"])
+        rows.append((f"c={conc} rps", old["rps"], level["rps"], change, -change > threshold))
+
+    for name, stats in head.get("micro", {}).items():
+        old = base.get("micro", {}).get(name)
+        if old:
+            change = _change(old["median_us"], stats["median_us"])
+            rows.append((f"micro {name} median_us", old["median_us"], stats["median_us"], change, change > threshold))
+    return rows, sum(1 for row in rows if row[4])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.compare", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent change counted as a regression")
+    args = parser.parse_args(argv)
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+
+    print(f"base {base['meta'].get('git_commit')}  ->  head {head['meta'].get('git_commit')}")
+    rows, regressions = compare(base, head, args.threshold)
+    print(f"{'metric':<52}{'base':>12}{'head':>12}{'change':>10}")
+    for label, old, new, change, worse in rows:
+        print(f"{label:<52}{old:>12.2f}{new:>12.2f}{change:>+9.1f}%{'  <-- regression' if worse else ''}")
+    print(f"{regressions} regression(s) beyond {args.threshold:g}%.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""
+Offline stand-ins for the external providers.
+
+`provider_fixtures()` patches requests' HTTP adapter so Visual Crossing,
+WeatherAPI and Gemini calls are answered from the recorded JSON files in
+fixtures/, optionally after a simulated network delay. Any other host raises
+ConnectionError, so a benchmark never reaches the network by accident.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from urllib.parse import unquote, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+HOSTS = {
+    "weather.visualcrossing.com": "visualcrossing",
+    "api.weatherapi.com": "weatherapi",
+    "generativelanguage.googleapis.com": "gemini",
+}
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURE_DIR, name)) as f:
+        return json.load(f)
+
+
+class ProviderFixtures:
+    """
+    Answers provider URLs from the recordings. The Visual Crossing recording
+    covers one (leap) year, replayed by month and day for any requested range;
+    WeatherAPI's 14 days are re-dated to start today, as the live API does.
+    """
+
+    def __init__(self, latency_ms=None):
+        self.latency = {k: v / 1000.0 for k, v in (latency_ms or {}).items()}
+        self.vc = load_fixture("visualcrossing_timeline.json")
+        self.vc_days = {d["datetime"][5:]: d for d in self.vc["days"]}
+        self.wa = load_fixture("weatherapi_forecast.json")
+        self.gemini = load_fixture("gemini_generate.json")
+        self.calls = {name: 0 for name in HOSTS.values()}
+        self._lock = threading.Lock()
+
+    def visualcrossing(self, url):
+        # .../timeline/<location>/<start>/<end>?unitGroup=metric&...
+        parts = unquote(urlsplit(url).path).rstrip("/").split("/")
+        start, end = date.fromisoformat(parts[-2]), date.fromisoformat(parts[-1])
+        days = []
+        day = start
+        while day <= end:
+            days.append(dict(self.vc_days[day.isoformat()[5:]], datetime=day.isoformat()))
+            day += timedelta(days=1)
+        return dict(self.vc, resolvedAddress=parts[-3], days=days)
+
+    def weatherapi(self, url):
+        today = date.today()
+        forecastday = [
+            dict(d, date=(today + timedelta(days=i)).isoformat())
+            for i, d in enumerate(self.wa["forecast"]["forecastday"])
+        ]
+        return dict(self.wa, forecast={"forecastday": forecastday})
+
+    def send(self, adapter, request):
+        provider = HOSTS.get(urlsplit(request.url).hostname)
+        if provider is None:
+            raise requests.exceptions.ConnectionError(
+                f"Benchmark fixtures do not serve {request.url}", request=request
+            )
+        with self._lock:
+            self.calls[provider] += 1
+        delay = self.latency.get(provider)
+        if delay:
+            time.sleep(delay)
+
+        body = self.gemini if provider == "gemini" else getattr(self, provider)(request.url)
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.headers["Content-Type"] = "application/json"
+        response.encoding = "utf-8"
+        response._content = json.dumps(body).encode("utf-8")
+        response.url = request.url
+        response.request = request
+        response.connection = adapter
+        return response
+
+
+@contextmanager
+def provider_fixtures(latency_ms=None):
+    """Serves provider calls from fixtures for the duration of the block."""
+    fixtures = ProviderFixtures(latency_ms)
+    original = HTTPAdapter.send
+    HTTPAdapter.send = lambda adapter, request, **kwargs: fixtures.send(adapter, request)
+    try:
+        yield fixtures
+    finally:
+        HTTPAdapter.send = original
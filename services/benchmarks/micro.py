@@ -0,0 +1,49 @@
+"""
+Microbenchmarks for the per-request hot spots, timed with timeit on the
+same fixture data the load runs use.
+"""
+import sys
+import timeit
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+
+def time_call(fn, number, repeat):
+    """Per-call time in microseconds: best and median of `repeat` runs."""
+    runs = sorted(t / number * 1e6 for t in timeit.repeat(fn, number=number, repeat=repeat))
+    return {
+        "number": number,
+        "repeat": repeat,
+        "best_us": round(runs[0], 2),
+        "median_us": round(runs[len(runs) // 2], 2),
+    }
+
+
+def run_micro(apps, record, plan, number=200, repeat=5):
+    forecast_utils = sys.modules[apps["forecast"].fill_forecast_for_payload.__module__]
+    risk_app = apps["risk"]
+    planner_app = apps["planner"]
+
+    # A 120-day daily map from the recorded providers, as /fill-forecast sees it
+    sw_date = plan["sw_date"]
+    daily_map = forecast_utils.fetch_daily_forecast(
+        forecast_utils.resolve_location(plan), sw_date, days=forecast_utils.FORECAST_WINDOW_DAYS
+    )
+    filled = forecast_utils.fill_stages_from_daily_map(plan, daily_map)
+    window_start = date.fromisoformat(sw_date)
+
+    # Synthetic model output; formatting cost does not depend on the values
+    raw = np.random.default_rng(42).uniform(1.0, 40.0, size=(1, len(planner_app.TARGETS)))
+    input_df = pd.DataFrame([record])
+
+    return {
+        "average_stage_window": time_call(
+            lambda: forecast_utils.average_stage_window(daily_map, window_start, 30), number, repeat
+        ),
+        "analyze_crop_risk": time_call(lambda: risk_app.analyze_crop_risk(filled), number, repeat),
+        "format_prediction_to_detailed_json": time_call(
+            lambda: planner_app.format_prediction_to_detailed_json(raw, input_df), number, repeat
+        ),
+    }
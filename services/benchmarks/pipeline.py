@@ -0,0 +1,124 @@
+"""
+End-to-end load runs: planner /predict -> forecast /fill-forecast -> risk
+/calculate-risk, each through its app's Flask test client, at a given
+concurrency.
+"""
+import math
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+STAGES = ("planner", "forecast", "risk")
+
+
+def summarize(samples):
+    """Latency summary in milliseconds (nearest-rank percentiles)."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pct(q):
+        return ordered[max(0, math.ceil(q / 100.0 * len(ordered)) - 1)] * 1000.0
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000.0, 3),
+        "p50_ms": round(pct(50), 3),
+        "p95_ms": round(pct(95), 3),
+        "p99_ms": round(pct(99), 3),
+        "max_ms": round(ordered[-1] * 1000.0, 3),
+    }
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes elsewhere
+    return round(peak / (1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0), 1)
+
+
+class Pipeline:
+    """
+    One farmer request through the three services. When the planner has no
+    model on disk, the recorded planner response stands in for /predict and
+    the planner stage is reported as skipped.
+    """
+
+    def __init__(self, apps, planner_fallback):
+        self.apps = apps
+        self.planner_fallback = planner_fallback
+        self.planner_loaded = getattr(apps["planner"], "model_pipeline", None) is not None
+        self._local = threading.local()
+
+    def _clients(self):
+        clients = getattr(self._local, "clients", None)
+        if clients is None:
+            clients = self._local.clients = {name: app.app.test_client() for name, app in self.apps.items()}
+        return clients
+
+    @staticmethod
+    def _post(client, stage, path, body):
+        response = client.post(path, json=body)
+        if response.status_code != 200:
+            raise RuntimeError(f"{stage} {path} returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return response.get_json()
+
+    def run_once(self, record):
+        """Returns {stage: seconds} for one request, plus 'end_to_end'."""
+        clients = self._clients()
+        timings = {}
+        started = time.perf_counter()
+
+        if self.planner_loaded:
+            plan = self._post(clients["planner"], "planner", "/predict", record)
+        else:
+            plan = dict(self.planner_fallback, sw_date=record["sw_date"])
+        planned = time.perf_counter()
+        if self.planner_loaded:
+            timings["planner"] = planned - started
+
+        filled = self._post(clients["forecast"], "forecast", "/fill-forecast", plan)
+        forecasted = time.perf_counter()
+        timings["forecast"] = forecasted - planned
+
+        self._post(clients["risk"], "risk", "/calculate-risk", filled)
+        finished = time.perf_counter()
+        timings["risk"] = finished - forecasted
+        timings["end_to_end"] = finished - started
+        return timings
+
+
+def run_level(pipeline, records, concurrency, total):
+    """Runs `total` pipeline requests over `concurrency` threads."""
+    samples = {name: [] for name in STAGES + ("end_to_end",)}
+    errors, last_error = 0, None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(pipeline.run_once, records[i % len(records)]) for i in range(total)]
+        for future in as_completed(futures):
+            try:
+                timings = future.result()
+            except Exception as e:
+                errors += 1
+                last_error = str(e)
+                continue
+            for name, seconds in timings.items():
+                samples[name].append(seconds)
+    elapsed = time.perf_counter() - started
+
+    completed = total - errors
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "last_error": last_error,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(completed / elapsed, 2) if elapsed else 0.0,
+        "latency": {
+            name: summarize(values) for name, values in samples.items()
+            if name != "planner" or pipeline.planner_loaded
+        },
+        "peak_rss_mb": peak_rss_mb(),
+    }
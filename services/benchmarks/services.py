@@ -0,0 +1,54 @@
+"""
+Loads the planner, forecast and risk Flask apps into one process.
+
+Each service imports its helpers as top-level modules (`from utils import ...`),
+so every app is imported from its file with its own directory on sys.path.
+The working directory is left alone: the planner resolves its model files
+against its own directory.
+"""
+import importlib.util
+import os
+import sys
+import tempfile
+
+SERVICES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVICE_DIRS = {
+    "planner": "planner_api",
+    "forecast": "forecast_api",
+    "risk": "risk_api",
+}
+
+
+def configure_environment(caches=False):
+    """
+    Offline credentials and cache settings, applied before the apps import.
+    With caches off every request takes the full cold path; with caches on
+    the on-disk caches go to a throwaway directory. Variables already set in
+    the environment win.
+    """
+    for key in ("VISUAL_CROSSING_API_KEY", "WEATHERAPI_API_KEY", "GEMINI_API_KEY"):
+        os.environ.setdefault(key, "benchmark")
+    if caches:
+        scratch = tempfile.mkdtemp(prefix="fasalsaathi-bench-")
+        os.environ.setdefault("FORECAST_CACHE_PATH", os.path.join(scratch, "weather_cache.sqlite3"))
+        os.environ.setdefault("PLANNER_CACHE", "1")
+    else:
+        os.environ.setdefault("FORECAST_CACHE_PATH", "")
+        os.environ.setdefault("PLANNER_CACHE", "0")
+        os.environ.setdefault("DESCRIPTION_CACHE_SIZE", "0")
+
+
+def load_service(name):
+    """Imports <service>/app.py as module '<name>_app' and returns it."""
+    directory = os.path.join(SERVICES_DIR, SERVICE_DIRS[name])
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    spec = importlib.util.spec_from_file_location(f"{name}_app", os.path.join(directory, "app.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_services(names=tuple(SERVICE_DIRS)):
+    return {name: load_service(name) for name in names}
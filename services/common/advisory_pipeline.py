@@ -0,0 +1,220 @@
+"""
+Fused planner -> forecast -> risk pipeline.
+
+`AdvisoryPipeline.run(profile)` turns a farm profile into the risk report in
+one call. A stage runs in-process when its service directory sits next to
+services/common and imports cleanly here; a stage that cannot load (no
+planner model on this host, missing packages, PIPELINE_MODE=http) is called
+over HTTP instead. When no stage is local and PIPELINE_URL points at a fused
+/run-pipeline endpoint, the whole run is that one request.
+
+In-process, the weather fetch starts alongside planner inference, since the
+forecast only needs the district, state and sowing date.
+"""
+import importlib.util
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import metrics
+from outbound import client as http
+
+logger = logging.getLogger(__name__)
+
+SERVICES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# auto: in-process where possible; local: in-process or fail; http: never in-process
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "auto")
+PIPELINE_URL = os.getenv("PIPELINE_URL") or None
+PLANNER_URL = os.getenv("PLANNER_URL", "https://planner.shivshaktifabrichouse.com/predict")
+FORECAST_URL = os.getenv("FORECAST_URL", "https://forecast.shivshaktifabrichouse.com/fill-forecast")
+RISK_URL = os.getenv("RISK_URL", "https://risk.shivshaktifabrichouse.com/calculate-risk")
+
+PLANNER_TIMEOUT = int(os.getenv("PLANNER_TIMEOUT", "15"))
+FORECAST_TIMEOUT = int(os.getenv("FORECAST_TIMEOUT", "20"))
+RISK_TIMEOUT = int(os.getenv("RISK_TIMEOUT", "20"))
+PIPELINE_TIMEOUT = int(os.getenv("PIPELINE_TIMEOUT", "45"))
+
+REQUIRED_FIELDS = ["crop", "seed_type", "soil", "district", "state", "season", "sw_date"]
+STAGES = ("planner", "forecast", "risk")
+
+
+class PipelineError(Exception):
+    """A stage failed; `status` is the HTTP status the fused endpoint returns."""
+
+    def __init__(self, stage, message, status=502):
+        super().__init__(message)
+        self.stage = stage
+        self.status = status
+
+
+def _import_service(service_dir, module, name):
+    """
+    Loads <service_dir>/<module>.py from its file under the unique module name
+    `name`, so it never resolves to another module of the same bare name. The
+    service directory goes on sys.path for its sibling imports; the services
+    resolve their own files by absolute path, so the working directory is
+    left alone.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    directory = os.path.join(SERVICES_DIR, service_dir)
+    path = os.path.join(directory, module + ".py")
+    if not os.path.isfile(path):
+        raise ImportError(f"{service_dir}/{module}.py not found")
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+
+    spec = importlib.util.spec_from_file_location(name, path)
+    loaded = importlib.util.module_from_spec(spec)
+    sys.modules[name] = loaded
+    try:
+        spec.loader.exec_module(loaded)
+    except Exception:
+        sys.modules.pop(name, None)
+        raise
+    return loaded
+
+
+def _load_planner():
+    planner = _import_service("planner_api", "app", "planner_app")
+    if planner.model_pipeline is None:
+        raise RuntimeError("planner model is not loaded on this host")
+    return planner
+
+
+def _load_forecast():
+    return _import_service("forecast_api", "utils", "forecast_utils")
+
+
+def _load_risk():
+    return _import_service("risk_api", "app", "risk_app")
+
+
+LOADERS = {"planner": _load_planner, "forecast": _load_forecast, "risk": _load_risk}
+
+
+class AdvisoryPipeline:
+
+    def __init__(self, mode=PIPELINE_MODE, pipeline_url=PIPELINE_URL):
+        self.mode = mode
+        self.pipeline_url = pipeline_url
+        self._pool = ThreadPoolExecutor(
+            max_workers=int(os.getenv("PIPELINE_WORKERS", "8")), thread_name_prefix="pipeline"
+        )
+        # Stages load here, at startup, not under a lock in a serving thread
+        self._local = self._load_stages()
+
+    def _load_stages(self):
+        local = {}
+        for stage in STAGES:
+            local[stage] = None
+            if self.mode == "http":
+                continue
+            try:
+                local[stage] = LOADERS[stage]()
+            except Exception as e:
+                if self.mode == "local":
+                    raise
+                logger.warning("Pipeline %s stage will use HTTP: %s", stage, e)
+        return local
+
+    def local_stages(self):
+        """{stage: service module, or None when that stage goes over HTTP}."""
+        return self._local
+
+    def modes(self):
+        return {stage: "local" if module else "http" for stage, module in self.local_stages().items()}
+
+    @staticmethod
+    def _post(stage, url, body, timeout):
+        try:
+            res = http.post(url, json=body, timeout=timeout, deadline=timeout)
+        except requests.RequestException as e:
+            raise PipelineError(stage, f"{stage} service is not reachable: {e}")
+        if res.status_code >= 400:
+            raise PipelineError(
+                stage, f"{stage} service returned {res.status_code}: {res.text[:200]}",
+                status=400 if res.status_code == 400 else 502,
+            )
+        return res.json()
+
+    def _plan(self, planner, profile):
+        if planner is None:
+            return self._post("planner", PLANNER_URL, profile, PLANNER_TIMEOUT)
+        try:
+            return planner.plan_for_record(profile)
+        except Exception as e:
+            raise PipelineError("planner", f"An error occurred during prediction: {e}", status=500)
+
+    def _assess(self, risk, filled):
+        if risk is None:
+            return self._post("risk", RISK_URL, filled, RISK_TIMEOUT)
+        try:
+            report = risk.analyze_crop_risk(filled)
+        except KeyError as e:
+            raise PipelineError("risk", f"Missing key in input data: {e}", status=400)
+        # Same as /calculate-risk in sync mode: bounded wait, template fallback
+        report["description"] = risk.description_jobs.describe(report)["description"]
+        return report
+
+    def run(self, profile, include_intermediate=False):
+        """
+        Returns {"risk", "modes", "timings_ms"}, plus the intermediate "planner"
+        and "forecast" payloads when `include_intermediate` is set.
+        """
+        missing = [f for f in REQUIRED_FIELDS if not profile.get(f)]
+        if missing:
+            raise PipelineError("input", f"Missing input fields: {', '.join(missing)}", status=400)
+
+        stages = self.local_stages()
+        if self.pipeline_url and not any(stages.values()):
+            url = self.pipeline_url + ("?debug=1" if include_intermediate else "")
+            return self._post("pipeline", url, profile, PIPELINE_TIMEOUT)
+
+        started = time.perf_counter()
+        forecast = stages["forecast"]
+        weather = None
+        if forecast is not None:
+            weather = self._pool.submit(
+                forecast.fetch_daily_forecast_with_status,
+                forecast.resolve_location(profile), profile["sw_date"], forecast.FORECAST_WINDOW_DAYS,
+            )
+
+        plan = self._plan(stages["planner"], profile)
+        planned = time.perf_counter()
+
+        if forecast is not None:
+            daily_map, providers = weather.result()
+            filled = forecast.fill_stages_from_daily_map(plan, daily_map, providers)
+        else:
+            filled = self._post("forecast", FORECAST_URL, plan, FORECAST_TIMEOUT)
+        forecasted = time.perf_counter()
+
+        report = self._assess(stages["risk"], filled)
+        finished = time.perf_counter()
+
+        metrics.observe_phase("pipeline.planner", planned - started)
+        metrics.observe_phase("pipeline.forecast", forecasted - planned)
+        metrics.observe_phase("pipeline.risk", finished - forecasted)
+        metrics.observe_phase("pipeline.total", finished - started)
+
+        result = {
+            "risk": report,
+            "modes": self.modes(),
+            "timings_ms": {
+                "planner": round((planned - started) * 1000, 1),
+                # Only the part of the weather fetch not hidden behind the planner
+                "forecast": round((forecasted - planned) * 1000, 1),
+                "risk": round((finished - forecasted) * 1000, 1),
+                "total": round((finished - started) * 1000, 1),
+            },
+        }
+        if include_intermediate:
+            result["planner"] = plan
+            result["forecast"] = filled
+        return result
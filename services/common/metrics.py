@@ -0,0 +1,377 @@
+"""
+Prometheus-format metrics shared by every service, without a client library.
+
+  http_request_duration_seconds{service, method, endpoint, status}
+      histogram per route, from instrument_flask() / instrument_fastapi()
+  phase_duration_seconds{phase}
+      histogram per internal step, from span() / timed() / observe_phase()
+  cache_events_total{cache, event}
+      hits, misses, ... from cache_event() or a cache's own stats (register_cache)
+  outbound_requests_total{host, status}, outbound_retries_total{host},
+  outbound_errors_total{host, reason}
+      HTTP attempts of the shared outbound client, by host (register_outbound)
+  upstream_errors_total{upstream, reason}
+      failed calls by logical provider (visualcrossing, gemini, ...) from upstream_error()
+
+Recording is a dict lookup plus a few additions under a per-series lock;
+counters that a component already keeps are read only when /metrics is
+scraped. Phases of services loaded in-process (the fused pipeline) land in
+the same registry, so their phase names carry the service prefix.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; wide enough for both a cache hit and an LLM round trip
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names, values, extra=""):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Series:
+    __slots__ = ("lock",)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+
+class _CounterSeries(_Series):
+    __slots__ = ("value",)
+
+    def __init__(self):
+        super().__init__()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+class _HistogramSeries(_Series):
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets):
+        super().__init__()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._sources = []
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        series = self._series.get(values)
+        if series is None:
+            with self._lock:
+                series = self._series.get(values)
+                if series is None:
+                    series = self._series[values] = self._new_series()
+        return series
+
+    def add_source(self, fn):
+        """`fn()` -> {label values tuple: value}, read at scrape time alongside recorded series."""
+        self._sources.append(fn)
+
+    def _source_values(self):
+        for fn in self._sources:
+            try:
+                yield from fn().items()
+            except Exception as e:
+                print(f"[metrics] {self.name} source failed: {e}")
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._render_series())
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_series(self):
+        return _CounterSeries()
+
+    def _render_series(self):
+        totals = {values: series.value for values, series in list(self._series.items())}
+        for values, value in self._source_values():
+            totals[values] = totals.get(values, 0) + value
+        for values, value in totals.items():
+            yield f"{self.name}{_label_text(self.labelnames, values)} {_number(value)}"
+
+
+class Gauge(Counter):
+    """Values come from sources only (queue depths, cache sizes)."""
+    kind = "gauge"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_series(self):
+        return _HistogramSeries(self.buckets)
+
+    def _render_series(self):
+        for values, series in list(self._series.items()):
+            with series.lock:
+                counts, total = list(series.counts), series.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                yield f"{self.name}_bucket{_label_text(self.labelnames, values, le)} {cumulative}"
+            labels = _label_text(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_number(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._add(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+http_duration = REGISTRY.histogram(
+    "http_request_duration_seconds", "Request handling time by route (streams: until headers are sent).",
+    ("service", "method", "endpoint", "status"),
+)
+phase_duration = REGISTRY.histogram(
+    "phase_duration_seconds", "Time spent in internal processing phases.", ("phase",),
+)
+cache_events = REGISTRY.counter(
+    "cache_events_total", "Cache lookups by cache and outcome.", ("cache", "event"),
+)
+cache_entries = REGISTRY.gauge(
+    "cache_entries", "Entries held in memory by each cache.", ("cache",),
+)
+outbound_requests = REGISTRY.counter(
+    "outbound_requests_total", "Outbound HTTP attempts by host and status.", ("host", "status"),
+)
+outbound_retries = REGISTRY.counter(
+    "outbound_retries_total", "Outbound HTTP retries by host.", ("host",),
+)
+outbound_errors = REGISTRY.counter(
+    "outbound_errors_total", "Failed outbound HTTP attempts by host and reason.", ("host", "reason"),
+)
+upstream_errors = REGISTRY.counter(
+    "upstream_errors_total", "Failed calls by provider and reason.", ("upstream", "reason"),
+)
+
+
+def render():
+    return REGISTRY.render()
+
+
+@contextmanager
+def span(phase):
+    """Times the block into phase_duration_seconds{phase}, whether or not it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        phase_duration.labels(phase).observe(time.perf_counter() - started)
+
+
+def timed(phase):
+    """Decorator form of span()."""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(phase):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def observe_phase(phase, seconds):
+    phase_duration.labels(phase).observe(seconds)
+
+
+def cache_event(cache, event, count=1):
+    if count:
+        cache_events.labels(cache, event).inc(count)
+
+
+def upstream_error(upstream, reason):
+    upstream_errors.labels(upstream, reason).inc()
+
+
+def register_cache(cache, stats, size=None):
+    """
+    Exports a cache's own counters: `stats()` -> {event: count} becomes
+    cache_events_total{cache, event}, and `size()` cache_entries{cache}.
+    """
+    cache_events.add_source(lambda: {(cache, event): value for event, value in dict(stats()).items()})
+    if size is not None:
+        cache_entries.add_source(lambda: {(cache,): size()})
+
+
+def register_outbound(client):
+    """Exports an OutboundClient's per-host counters as outbound_* series."""
+    def requests_by_status():
+        return {(host, status): count
+                for host, stats in client.snapshot().items()
+                for status, count in stats["statuses"].items()}
+
+    def retries():
+        return {(host,): stats["retries"] for host, stats in client.snapshot().items()}
+
+    def errors():
+        out = {}
+        for host, stats in client.snapshot().items():
+            out[(host, "error")] = stats["errors"]
+            out[(host, "circuit_open")] = stats["rejected"]
+        return out
+
+    outbound_requests.add_source(requests_by_status)
+    outbound_retries.add_source(retries)
+    outbound_errors.add_source(errors)
+
+
+def _endpoint_for(rule):
+    return rule.rule if rule is not None else "unmatched"
+
+
+def instrument_flask(app, service):
+    """Times every request of a Flask app into http_request_duration_seconds and adds GET /metrics."""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_started = time.perf_counter()
+
+    def _record(status):
+        started = g.pop("_metrics_started", None)
+        if started is not None:
+            http_duration.labels(
+                service, request.method, _endpoint_for(request.url_rule), str(status)
+            ).observe(time.perf_counter() - started)
+
+    @app.after_request
+    def _metrics_stop(response):
+        _record(response.status_code)
+        return response
+
+    @app.teardown_request
+    def _metrics_teardown(error=None):
+        # Only still pending when the handler raised past Flask's error handling
+        _record(500)
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return Response(render(), content_type=CONTENT_TYPE)
+
+    return app
+
+
+def instrument_fastapi(app, service):
+    """Times every request of a FastAPI app into http_request_duration_seconds and adds GET /metrics."""
+    from fastapi import Request
+    from fastapi.responses import Response
+
+    @app.middleware("http")
+    async def _metrics_middleware(request: Request, call_next):
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            endpoint = getattr(route, "path", None) or "unmatched"
+            http_duration.labels(service, request.method, endpoint, str(status)).observe(
+                time.perf_counter() - started
+            )
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return Response(render(), media_type=CONTENT_TYPE)
+
+    return app
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host="0.0.0.0"):
+    """Serves /metrics on its own port from a daemon thread, for processes whose server we do not own."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
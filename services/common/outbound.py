@@ -0,0 +1,260 @@
+"""
+Shared outbound HTTP client for the services and the Rasa action server.
+
+One keep-alive `requests.Session` per process, so repeated calls to a
+provider reuse pooled (already TLS-negotiated) connections. Per host, the
+client also
+  - caps concurrent calls (OUTBOUND_MAX_CONCURRENCY),
+  - retries connection errors, timeouts, 429 and 5xx with jittered
+    exponential backoff, honouring Retry-After (OUTBOUND_RETRIES); only
+    idempotent methods by default, a POST only when its call site passes
+    `retries=`,
+  - fails fast with CircuitOpenError after OUTBOUND_BREAKER_FAILURES
+    consecutive failures, probing again after OUTBOUND_BREAKER_RESET_SECS,
+  - keeps latency percentiles and error counts (`snapshot()`).
+
+Services import it with services/common on sys.path:
+
+    from outbound import client
+    r = client.get(url, timeout=30)
+"""
+import os
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+def _cap_timeout(timeout, remaining):
+    # requests takes a number or a (connect, read) pair; None means no limit
+    remaining = max(remaining, 0.001)
+    if timeout is None:
+        return remaining
+    if isinstance(timeout, tuple):
+        return tuple(remaining if t is None else min(t, remaining) for t in timeout)
+    return min(timeout, remaining)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without calling the host while its circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures;
+    open -> half-open after `reset_timeout` seconds, letting one probe through;
+    the probe's outcome closes or re-opens it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opens = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == "half_open" or (self.failure_threshold and self.failures >= self.failure_threshold):
+                if self.state != "open":
+                    self.opens += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class HostStats:
+    """Counters and a window of recent latencies for one host."""
+
+    def __init__(self, window=1024):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.rejected = 0
+        self.statuses = {}
+        self.latencies = deque(maxlen=window)
+
+    def snapshot(self):
+        ordered = sorted(self.latencies)
+
+        def pct(q):
+            return round(ordered[min(len(ordered) - 1, int(q / 100.0 * len(ordered)))] * 1000.0, 1) if ordered else None
+
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "rejected": self.rejected,
+            "statuses": dict(self.statuses),
+            "p50_ms": pct(50),
+            "p95_ms": pct(95),
+            "p99_ms": pct(99),
+        }
+
+
+class OutboundClient:
+
+    def __init__(self, pool_size=16, max_concurrency=16, retries=2, backoff=0.25, backoff_max=4.0,
+                 breaker_failures=5, breaker_reset=30.0):
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.breaker_failures = breaker_failures
+        self.breaker_reset = breaker_reset
+
+        self.session = requests.Session()
+        # Retries are ours; the adapter only pools connections (one pool per host)
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            pool_size=int(os.getenv("OUTBOUND_POOL_SIZE", "16")),
+            max_concurrency=int(os.getenv("OUTBOUND_MAX_CONCURRENCY", "16")),
+            retries=int(os.getenv("OUTBOUND_RETRIES", "2")),
+            backoff=float(os.getenv("OUTBOUND_BACKOFF_SECS", "0.25")),
+            backoff_max=float(os.getenv("OUTBOUND_BACKOFF_MAX_SECS", "4")),
+            breaker_failures=int(os.getenv("OUTBOUND_BREAKER_FAILURES", "5")),
+            breaker_reset=float(os.getenv("OUTBOUND_BREAKER_RESET_SECS", "30")),
+        )
+
+    def _host(self, host):
+        with self._lock:
+            entry = self._hosts.get(host)
+            if entry is None:
+                entry = self._hosts[host] = (
+                    threading.BoundedSemaphore(self.max_concurrency),
+                    CircuitBreaker(self.breaker_failures, self.breaker_reset),
+                    HostStats(),
+                )
+            return entry
+
+    def _delay(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.strip().isdigit():
+            return min(float(retry_after), self.backoff_max)
+        # Full jitter: spreads retries from many callers over the window
+        return random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt)))
+
+    def request(self, method, url, retries=None, deadline=None, **kwargs):
+        """
+        Like session.request(), with the per-host limits above. Returns the last
+        response (callers still raise_for_status) or raises the last error.
+        `retries` defaults to OUTBOUND_RETRIES for idempotent methods and 0
+        otherwise. `deadline` (seconds) bounds the whole call: each attempt's
+        timeout is cut to the time left, and no retry starts that could not
+        finish in time.
+        """
+        host = urlsplit(url).netloc
+        semaphore, breaker, stats = self._host(host)
+        if retries is None:
+            retries = self.retries if method.upper() in IDEMPOTENT_METHODS else 0
+        timeout = kwargs.pop("timeout", None)
+        started = time.monotonic()
+
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                with self._lock:
+                    stats.rejected += 1
+                raise CircuitOpenError(f"Circuit open for {host}; not calling it")
+
+            error = response = None
+            call_started = time.monotonic()
+            attempt_timeout = timeout
+            if deadline is not None:
+                attempt_timeout = _cap_timeout(timeout, deadline - (call_started - started))
+            with semaphore:
+                try:
+                    response = self.session.request(method, url, timeout=attempt_timeout, **kwargs)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    error = e
+                except Exception:
+                    # Not retried (bad URL, broken body, ...), but the breaker
+                    # still needs the outcome or a half-open probe never ends
+                    with self._lock:
+                        stats.requests += 1
+                        stats.errors += 1
+                    breaker.record_failure()
+                    raise
+            elapsed = time.monotonic() - call_started
+
+            failed = error is not None or response.status_code in RETRY_STATUSES
+            with self._lock:
+                stats.requests += 1
+                stats.latencies.append(elapsed)
+                if response is not None:
+                    stats.statuses[response.status_code] = stats.statuses.get(response.status_code, 0) + 1
+                if failed:
+                    stats.errors += 1
+            if failed:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+                return response
+
+            delay = self._delay(attempt, response)
+            out_of_time = deadline is not None and time.monotonic() - started + delay + elapsed > deadline
+            if attempt >= retries or out_of_time:
+                if error is not None:
+                    raise error
+                return response
+            with self._lock:
+                stats.retries += 1
+            time.sleep(delay)
+            attempt += 1
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def snapshot(self):
+        """Per-host metrics plus circuit state."""
+        with self._lock:
+            hosts = dict(self._hosts)
+            out = {}
+            for host, (_, breaker, stats) in hosts.items():
+                out[host] = dict(stats.snapshot(), circuit=breaker.state, circuit_opens=breaker.opens)
+        return out
+
+
+client = OutboundClient.from_env()
+metrics.register_outbound(client)
@@ -0,0 +1,130 @@
+"""
+Vectorized crop weather-risk model, shared by risk_api (/calculate-risk) and
+forecast_api (/sweep-sowing) so both score with the same weights and levels.
+"""
+from itertools import chain
+from operator import itemgetter
+
+import numpy as np
+
+# Scored parameters and their weight within a stage (solar is not scored)
+PARAMETERS = ("tmin_c", "tmax_c", "rh_pct", "rain_mm", "wind_kmph")
+PARAMETER_WEIGHTS = np.array([0.2, 0.2, 0.2, 0.2, 0.2])
+
+# Upper bounds (exclusive) of Low / Moderate / High; anything above is Very High
+STAGE_LEVEL_BINS = np.array([0.15, 0.30, 0.50])
+OVERALL_LEVEL_BINS = np.array([1.5, 3.0, 5.0])
+LEVELS = np.array(["Low", "Moderate", "High", "Very High"], dtype=object)
+
+
+def risk_levels(scores, is_stage=False):
+    """Buckets scores (any shape) into LEVELS; each bin's upper bound is exclusive."""
+    bins = STAGE_LEVEL_BINS if is_stage else OVERALL_LEVEL_BINS
+    return LEVELS[np.searchsorted(bins, scores, side="right")]
+
+
+def parameter_risk(ideal, forecasted):
+    """
+    Elementwise min(|ideal - forecasted| / ideal, 1); 0 when both are 0 and
+    1 when only the ideal is 0.
+    """
+    ideal = np.asarray(ideal, dtype=float)
+    forecasted = np.asarray(forecasted, dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        deviation = np.minimum(np.abs(ideal - forecasted) / ideal, 1.0)
+    return np.where(ideal == 0, np.where(forecasted == 0, 0.0, 1.0), deviation)
+
+
+def _running_total(values, axis):
+    # cumsum adds strictly left to right, so totals match a Python `+=` loop
+    # bit for bit (np.sum switches to pairwise summation on longer axes).
+    return np.cumsum(values, axis=axis).take(-1, axis=axis)
+
+
+def round2(values):
+    """
+    np.round(values, 2) as Python lists, agreeing with round(x, 2): the rare
+    values within float noise of a .xx5 boundary are rounded one by one.
+    """
+    values = np.asarray(values, dtype=float)
+    rounded = np.round(values, 2)
+    near_half = np.abs((values * 100) % 1 - 0.5) < 1e-6
+    if near_half.any():
+        rounded[near_half] = [round(x, 2) for x in values[near_half].tolist()]
+    return rounded.tolist()
+
+
+def plans_to_arrays(plans):
+    """
+    Packs plans into padded arrays:
+    ideal/forecasted (N, S, P), importance (N, S) and a stage mask (N, S).
+    Raises KeyError on a missing stage field, like the per-stage code did.
+    """
+    counts = [len(plan["stages"]) for plan in plans]
+    stages = [stage for plan in plans for stage in plan["stages"]]
+    get_params = itemgetter(*PARAMETERS)
+    n_params = len(PARAMETERS)
+
+    def packed(key):
+        flat = chain.from_iterable(get_params(stage[key]) for stage in stages)
+        return np.fromiter(flat, dtype=float, count=len(stages) * n_params).reshape(-1, n_params)
+
+    n, s = len(plans), max(counts, default=0)
+    mask = np.arange(s) < np.array(counts, dtype=np.int64)[:, None]
+    ideal = np.zeros((n, s, n_params))
+    forecasted = np.zeros((n, s, n_params))
+    importance = np.zeros((n, s))
+    # Boolean-mask assignment fills row-major, i.e. plan by plan, stage by stage
+    ideal[mask] = packed("ideal")
+    forecasted[mask] = packed("forecasted")
+    importance[mask] = np.fromiter(
+        (stage["importance_weight"] for stage in stages), dtype=float, count=len(stages)
+    )
+    return ideal, forecasted, importance, mask
+
+
+def score_arrays(ideal, forecasted, importance, mask):
+    """
+    Scores N plans x S stages x P parameters in one pass.
+    Returns (stage_scores (N, S), overall_scores (N,)); padded stages score 0.
+    """
+    weighted = parameter_risk(ideal, forecasted) * PARAMETER_WEIGHTS
+    stage_scores = np.where(mask, _running_total(weighted, axis=2) * importance, 0.0)
+    if stage_scores.shape[1] == 0:
+        return stage_scores, np.zeros(stage_scores.shape[0])
+    return stage_scores, _running_total(stage_scores, axis=1)
+
+
+def analyze_plans(plans):
+    """
+    Risk analysis for a list of forecast-filled plans, in input order.
+    Each result has the same shape as /calculate-risk (without 'description').
+    """
+    if not plans:
+        return []
+    ideal, forecasted, importance, mask = plans_to_arrays(plans)
+    stage_scores, overall = score_arrays(ideal, forecasted, importance, mask)
+    stage_levels = risk_levels(stage_scores, is_stage=True)
+    overall_levels = risk_levels(overall)
+
+    stage_scores = round2(stage_scores)
+    stage_levels = stage_levels.tolist()
+    overall = round2(overall)
+    overall_levels = overall_levels.tolist()
+
+    results = []
+    for i, plan in enumerate(plans):
+        scores, levels = stage_scores[i], stage_levels[i]
+        results.append({
+            "crop": plan.get('crop', 'N/A'),
+            "district": plan.get('district', 'N/A'),
+            "stage_wise_risk": [
+                {'name': stage['name'], 'score': scores[j], 'level': levels[j]}
+                for j, stage in enumerate(plan["stages"])
+            ],
+            "overall_risk": {
+                "score": overall[i],
+                "level": overall_levels[i],
+            },
+        })
+    return results
@@ -0,0 +1,96 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+
+from risk_engine import PARAMETERS, analyze_plans, round2
+
+
+# The per-stage scalar implementation the engine replaced
+def calculate_risk(ideal, forecasted):
+    if ideal == 0 and forecasted == 0:
+        return 0.0
+    if ideal == 0:
+        return 1.0
+    deviation = abs(ideal - forecasted) / ideal
+    return min(deviation, 1.0)
+
+
+def interpret_risk(score, is_stage=False):
+    if is_stage:
+        if score < 0.15: return "Low"
+        if score < 0.30: return "Moderate"
+        if score < 0.50: return "High"
+        return "Very High"
+    else:
+        if score < 1.5: return "Low"
+        if score < 3.0: return "Moderate"
+        if score < 5.0: return "High"
+        return "Very High"
+
+
+def analyze_crop_risk(data):
+    total_risk_score = 0
+    stage_risks_list = []
+    for stage in data['stages']:
+        ideal, forecasted = stage['ideal'], stage['forecasted']
+        stage_parameter_risk = (
+            calculate_risk(ideal['tmin_c'], forecasted['tmin_c']) * 0.2 +
+            calculate_risk(ideal['tmax_c'], forecasted['tmax_c']) * 0.2 +
+            calculate_risk(ideal['rh_pct'], forecasted['rh_pct']) * 0.2 +
+            calculate_risk(ideal['rain_mm'], forecasted['rain_mm']) * 0.2 +
+            calculate_risk(ideal['wind_kmph'], forecasted['wind_kmph']) * 0.2
+        )
+        final_stage_risk = stage_parameter_risk * stage['importance_weight']
+        stage_risks_list.append({
+            'name': stage['name'],
+            'score': round(final_stage_risk, 2),
+            'level': interpret_risk(final_stage_risk, is_stage=True),
+        })
+        total_risk_score += final_stage_risk
+    return {
+        "crop": data.get('crop', 'N/A'),
+        "district": data.get('district', 'N/A'),
+        "stage_wise_risk": stage_risks_list,
+        "overall_risk": {"score": round(total_risk_score, 2), "level": interpret_risk(total_risk_score)},
+    }
+
+
+def random_plan(rng):
+    def values():
+        # Zeros hit the ideal == 0 branches; small integers give exact deviations
+        return {p: rng.choice([0, 0, rng.randint(1, 40), round(rng.uniform(0, 60), 1)]) for p in PARAMETERS}
+
+    stages = [
+        {"name": f"stage_{j}", "ideal": values(), "forecasted": values(),
+         "importance_weight": rng.choice([0.5, 1, 1.25, round(rng.uniform(0, 3), 2)])}
+        for j in range(rng.randint(0, 8))
+    ]
+    return {"crop": "wheat", "district": "sehore", "stages": stages}
+
+
+def test_batch_matches_scalar_implementation():
+    rng = random.Random(7)
+    plans = [random_plan(rng) for _ in range(3000)]
+    assert analyze_plans(plans) == [analyze_crop_risk(plan) for plan in plans]
+
+
+@pytest.mark.parametrize("importance", [0.125, 0.625, 1.125, 0.75, 2.5, 1.5, 0.15 / 0.2])
+def test_scores_on_rounding_and_level_boundaries(importance):
+    # One fully off parameter gives a stage score of 0.2 * importance
+    plan = {"stages": [
+        {"name": f"s{j}", "importance_weight": importance,
+         "ideal": dict.fromkeys(PARAMETERS, 10), "forecasted": dict(dict.fromkeys(PARAMETERS, 10), rain_mm=30)}
+        for j in range(10)
+    ]}
+    assert analyze_plans([plan]) == [analyze_crop_risk(plan)]
+
+
+def test_round2_matches_round_at_half_cents():
+    values = np.arange(0, 20001) * 0.005
+    values = np.concatenate([values, np.nextafter(values, 0), np.nextafter(values, 100)])
+    assert round2(values) == [round(x, 2) for x in values.tolist()]
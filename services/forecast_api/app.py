@@ -1,10 +1,17 @@
-from flask import Flask, request, jsonify
+import json
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-from utils import fill_forecast_for_payload, fetch_daily_forecast
+from utils import (
+    fill_forecast_for_payload, fill_forecast_batch, fetch_daily_forecast_with_status,
+    sweep_sowing_for_payload, http,
+)
+import metrics
 
 app = Flask(__name__)
 # Open CORS for all origins; tighten for production if needed
 CORS(app, resources={r"/*": {"origins": "*"}})
+# Request histograms and GET /metrics (Prometheus text format)
+metrics.instrument_flask(app, "forecast_api")
 
 @app.get("/health")
 def health():
@@ -25,6 +32,55 @@ def fill_forecast():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.post("/fill-forecast/batch")
+def fill_forecast_batch_route():
+    """
+    Accepts a JSON list of planner payloads (or {"plans": [...]}) and streams one
+    NDJSON line per plan: {"index", "result"} or {"index", "error"}.
+    Plans sharing a location and nearby sowing dates reuse one weather fetch; lines are grouped by fetch.
+    """
+    data = request.get_json(force=True, silent=True)
+    plans = data.get("plans") if isinstance(data, dict) else data
+    if not isinstance(plans, list) or not plans:
+        return jsonify({"error": "A non-empty JSON list of payloads is required"}), 400
+
+    def generate():
+        for item in fill_forecast_batch(plans):
+            yield json.dumps(item) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+@app.post("/sweep-sowing")
+def sweep_sowing():
+    """
+    Accepts {"plan": <planner payload>, "start_date", "end_date", "step_days"?, "top"?}
+    and returns candidate sowing dates ranked from lowest to highest overall risk,
+    each with per-stage scores computed like /calculate-risk.
+    """
+    try:
+        body = request.get_json(force=True, silent=False)
+        if not body or not isinstance(body.get("plan"), dict):
+            return jsonify({"error": "JSON body with a 'plan' object is required"}), 400
+        try:
+            step_days = int(body.get("step_days", 1))
+            top = None if body.get("top") is None else int(body["top"])
+        except (TypeError, ValueError):
+            return jsonify({"error": "'step_days' and 'top' must be integers"}), 400
+        if top is not None and top < 1:
+            return jsonify({"error": "'top' must be at least 1"}), 400
+        result = sweep_sowing_for_payload(
+            body["plan"],
+            body.get("start_date"),
+            body.get("end_date"),
+            step_days=step_days,
+            top=top,
+        )
+        return jsonify(result), 200
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": f"Invalid sweep request: {e}"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 # Optional legacy shim similar to an earlier design (returns per-day map)
 @app.post("/get-weather")
 def get_weather():
@@ -34,11 +90,19 @@ def get_weather():
         date = data.get("date")
         if not city or not date:
             return jsonify({"error": "City and date are required"}), 400
-        by_date = fetch_daily_forecast(city, date, days=120)
-        return jsonify({"city": city, "start_date": date, "days": len(by_date), "data": by_date})
+        by_date, providers = fetch_daily_forecast_with_status(city, date, days=120)
+        return jsonify({
+            "city": city, "start_date": date, "days": len(by_date),
+            "providers": providers, "data": by_date,
+        })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.get("/outbound/stats")
+def outbound_stats():
+    """Per-provider latency, error, retry and circuit-breaker state."""
+    return jsonify(http.snapshot())
+
 if __name__ == "__main__":
     # For Postman/local use
     app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
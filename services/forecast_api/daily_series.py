@@ -0,0 +1,122 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+FIELDS = ("tmin_c", "tmax_c", "rh_pct", "rain_mm", "wind_kmph", "solar_wm2")
+
+
+def _as_date(d):
+    if isinstance(d, date):
+        return d
+    return datetime.fromisoformat(d).date()
+
+
+def window_from_map(daily_map, start_date, duration_days):
+    """
+    DailySeries(daily_map).window(...) for a single window, read straight
+    from the dict: building the arrays only pays off from a few windows on.
+    """
+    start = _as_date(start_date)
+    columns = [[] for _ in FIELDS]
+    for i in range(max(int(duration_days), 0)):
+        d = daily_map.get((start + timedelta(days=i)).isoformat())
+        if not d:
+            continue
+        for col, field in zip(columns, FIELDS):
+            v = d.get(field)
+            if v is not None:
+                col.append(v)
+    averages = {field: round(sum(col) / len(col), 2) if col else None for field, col in zip(FIELDS, columns)}
+    return averages, sum(len(col) for col in columns)
+
+
+class DailySeries:
+    """
+    Dense, date-indexed view of a daily_map (ISO date -> normalized day).
+
+    Values live in an (n_days, 6) float array with NaN for anything missing,
+    alongside running sums and non-missing counts, so the mean and coverage
+    of any date window is an O(1) difference of two rows.
+    """
+
+    def __init__(self, daily_map):
+        days = {_as_date(iso): d for iso, d in (daily_map or {}).items() if d}
+        if days:
+            self.origin = min(days)
+            n = (max(days) - self.origin).days + 1
+        else:
+            self.origin = None
+            n = 0
+
+        values = np.full((n, len(FIELDS)), np.nan)
+        for day, d in days.items():
+            row = values[(day - self.origin).days]
+            for j, field in enumerate(FIELDS):
+                v = d.get(field)
+                if v is not None:
+                    row[j] = v
+
+        present = ~np.isnan(values)
+        self.values = values
+        self.sums = np.zeros((n + 1, len(FIELDS)))
+        self.counts = np.zeros((n + 1, len(FIELDS)), dtype=np.int64)
+        np.cumsum(np.where(present, values, 0.0), axis=0, out=self.sums[1:])
+        np.cumsum(present, axis=0, out=self.counts[1:])
+
+    def __len__(self):
+        return len(self.values)
+
+    def index_of(self, day):
+        """Row offset of `day` from the first date in the series (may be out of range)."""
+        if self.origin is None:
+            return 0
+        return (_as_date(day) - self.origin).days
+
+    def _bounds(self, start, duration_days):
+        n = len(self.values)
+        a = min(max(start, 0), n)
+        b = min(max(start + duration_days, 0), n)
+        return a, max(a, b)
+
+    def window(self, start_date, duration_days):
+        """
+        Averages each field over [start_date, start_date + duration_days).
+        Returns (averages_dict, covered_count) exactly like the per-day loop:
+        means rounded to 2 places, None for fields with no data.
+        """
+        a, b = self._bounds(self.index_of(start_date), int(duration_days))
+        sums = self.sums[b] - self.sums[a]
+        counts = self.counts[b] - self.counts[a]
+
+        averages = {}
+        for j, field in enumerate(FIELDS):
+            c = int(counts[j])
+            if not c:
+                averages[field] = None
+                continue
+            mean = float(sums[j]) / c
+            # A prefix-sum difference can land a hair off a .xx5 rounding
+            # boundary; re-add that one slice in order to round like sum() does.
+            if abs((mean * 100) % 1 - 0.5) < 1e-6:
+                col = self.values[a:b, j]
+                mean = sum(col[~np.isnan(col)].tolist()) / c
+            averages[field] = round(mean, 2)
+        return averages, int(counts.sum())
+
+    def window_means(self, starts, durations):
+        """
+        Unrounded means for many windows at once.
+        `starts` are row offsets (see index_of) and `durations` day counts,
+        broadcast against each other. Returns (means, counts), each shaped
+        (..., 6), with NaN means where a field has no data in the window.
+        """
+        n = len(self.values)
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.clip(starts + np.asarray(durations, dtype=np.int64), 0, n)
+        starts = np.clip(starts, 0, n)
+        ends = np.maximum(ends, starts)
+        sums = self.sums[ends] - self.sums[starts]
+        counts = self.counts[ends] - self.counts[starts]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+        return means, counts
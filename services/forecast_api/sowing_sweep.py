@@ -0,0 +1,98 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from daily_series import FIELDS, DailySeries
+
+# The risk model is shared with risk_api (services/common)
+_COMMON_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+if _COMMON_DIR not in sys.path:
+    sys.path.insert(0, _COMMON_DIR)
+from risk_engine import PARAMETERS, risk_levels, score_arrays
+
+MAX_SWEEP_DAYS = 366
+_PARAM_COLS = [FIELDS.index(p) for p in PARAMETERS]
+
+
+def sweep_offsets(start_date, end_date, step_days=1):
+    start = datetime.fromisoformat(start_date).date()
+    end = datetime.fromisoformat(end_date).date()
+    if end < start:
+        raise ValueError("end_date must not be before start_date")
+    if step_days < 1:
+        raise ValueError("step_days must be at least 1")
+    offsets = np.arange(0, (end - start).days + 1, step_days)
+    if len(offsets) > MAX_SWEEP_DAYS:
+        raise ValueError(f"Sweep is limited to {MAX_SWEEP_DAYS} candidate dates")
+    return start, offsets
+
+
+def sweep_sowing_dates(plan, daily_map, start_date, end_date, step_days=1):
+    """
+    Scores every candidate sowing date in [start_date, end_date] against one
+    daily weather map, sliding the plan's stage windows with prefix sums.
+
+    Returns a list of candidates, lowest overall risk first:
+    {"sw_date", "overall_risk": {score, level}, "stage_wise_risk": [...]}.
+    Candidates whose windows lack data for any scored parameter are left out.
+    """
+    start, offsets = sweep_offsets(start_date, end_date, step_days)
+    stages = plan.get("stages", [])
+    if not stages:
+        raise ValueError("plan has no stages")
+
+    names = [s["name"] for s in stages]
+    durations = np.array([int(s.get("duration_days", 0) or 0) for s in stages])
+    stage_offsets = np.concatenate(([0], np.cumsum(durations)[:-1]))
+    importance = np.array([float(s["importance_weight"]) for s in stages])
+    ideal = np.array([[float(s["ideal"][p]) for p in PARAMETERS] for s in stages])
+
+    series = daily_map if isinstance(daily_map, DailySeries) else DailySeries(daily_map)
+    base = series.index_of(start)
+    # (candidates, stages, fields): every stage window of every candidate in one pass
+    means, _ = series.window_means(
+        base + offsets[:, None] + stage_offsets[None, :], durations[None, :]
+    )
+    # /fill-forecast hands risk_api means rounded to 2 places. np.round and
+    # round() can disagree right at a .xx5 boundary, so those few windows are
+    # re-averaged through the exact scalar path.
+    means = means[:, :, _PARAM_COLS]
+    forecasted = np.round(means, 2)
+    near_half = np.abs((means * 100) % 1 - 0.5) < 1e-6
+    for k, j in zip(*np.nonzero(near_half.any(axis=2))):
+        day = start + timedelta(days=int(offsets[k] + stage_offsets[j]))
+        averages, _ = series.window(day, int(durations[j]))
+        forecasted[k, j] = [np.nan if averages[p] is None else averages[p] for p in PARAMETERS]
+    complete = ~np.isnan(forecasted).any(axis=(1, 2))
+
+    # Candidates play the role of plans: (candidates, stages, params) in one pass
+    stage_scores, overall = score_arrays(
+        ideal[None, :, :], forecasted, importance[None, :], np.ones((1, len(stages)), dtype=bool)
+    )
+    stage_levels = risk_levels(stage_scores, is_stage=True)
+    overall_levels = risk_levels(overall)
+
+    ranked = []
+    for k in np.flatnonzero(complete)[np.argsort(overall[complete], kind="stable")]:
+        ranked.append({
+            "sw_date": (start + timedelta(days=int(offsets[k]))).isoformat(),
+            "overall_risk": {
+                "score": round(float(overall[k]), 2),
+                "level": overall_levels[k],
+            },
+            "stage_wise_risk": [
+                {"name": name, "score": round(float(score), 2), "level": level}
+                for name, score, level in zip(names, stage_scores[k], stage_levels[k])
+            ],
+        })
+    return ranked
+
+
+def sweep_fetch_days(plan, start_date, end_date):
+    """Days of weather needed from start_date to cover the last candidate's full season."""
+    start = datetime.fromisoformat(start_date).date()
+    end = datetime.fromisoformat(end_date).date()
+    season = sum(int(s.get("duration_days", 0) or 0) for s in plan.get("stages", []))
+    return (end - start).days + max(season, 1)
@@ -0,0 +1,111 @@
+import os
+import random
+import sys
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+
+from daily_series import FIELDS, DailySeries, window_from_map
+
+
+# The per-day loop DailySeries replaced
+def _mean(vals):
+    vals = [v for v in vals if v is not None]
+    return round(sum(vals) / len(vals), 2) if vals else None
+
+
+def average_stage_window(daily_map, start_date, duration_days):
+    start = datetime.fromisoformat(start_date).date()
+    dates = [(start + timedelta(days=i)).isoformat() for i in range(duration_days)]
+    columns = {field: [] for field in FIELDS}
+    for iso in dates:
+        d = daily_map.get(iso)
+        if not d:
+            continue
+        for field in FIELDS:
+            columns[field].append(d.get(field))
+    averages = {field: _mean(vals) for field, vals in columns.items()}
+    covered = sum(v is not None for vals in columns.values() for v in vals)
+    return averages, covered
+
+
+ORIGIN = date(2025, 6, 1)
+
+
+def random_map(rng, days=200, step=None):
+    """Days with gaps, missing fields and (with `step`) values on a grid such as half cents."""
+    daily_map = {}
+    for i in range(days):
+        if rng.random() < 0.2:
+            continue
+        day = {}
+        for field in FIELDS:
+            if rng.random() < 0.1:
+                day[field] = None
+            elif step:
+                day[field] = rng.randint(0, 8000) * step
+            else:
+                day[field] = round(rng.uniform(0, 45), rng.choice([0, 1, 2, 3]))
+        daily_map[(ORIGIN + timedelta(days=i)).isoformat()] = day
+    return daily_map
+
+
+def random_windows(rng, count, days=200):
+    # Windows that start before, inside and after the data, some running past its end
+    return [(rng.randint(-30, days + 10), rng.choice([0, 1, 2, 3, 7, 30, 90, 250])) for _ in range(count)]
+
+
+@pytest.mark.parametrize("step", [None, 0.005, 0.05, 0.015])
+def test_window_matches_per_day_loop(step):
+    rng = random.Random(11)
+    for _ in range(5):
+        daily_map = random_map(rng, step=step)
+        series = DailySeries(daily_map)
+        for offset, duration in random_windows(rng, 400):
+            start = (ORIGIN + timedelta(days=offset)).isoformat()
+            expected = average_stage_window(daily_map, start, duration)
+            assert series.window(start, duration) == expected
+            assert window_from_map(daily_map, start, duration) == expected
+
+
+def test_window_on_half_cent_means():
+    # Two-day means of these values all land on a .xx5 boundary
+    values = [0.01 * k for k in range(1, 200)]
+    daily_map = {
+        (ORIGIN + timedelta(days=i)).isoformat(): dict.fromkeys(FIELDS, v)
+        for i, v in enumerate(values)
+    }
+    series = DailySeries(daily_map)
+    for i in range(len(values)):
+        start = (ORIGIN + timedelta(days=i)).isoformat()
+        assert series.window(start, 2) == average_stage_window(daily_map, start, 2)
+
+
+def test_window_means_match_per_day_loop():
+    rng = random.Random(5)
+    daily_map = random_map(rng)
+    series = DailySeries(daily_map)
+    windows = random_windows(rng, 500)
+    offsets = np.array([series.index_of(ORIGIN + timedelta(days=o)) for o, _ in windows])
+    means, counts = series.window_means(offsets, np.array([d for _, d in windows]))
+    for (offset, duration), row, row_counts in zip(windows, means, counts):
+        start = ORIGIN + timedelta(days=offset)
+        days = [daily_map.get((start + timedelta(days=i)).isoformat()) for i in range(duration)]
+        _, covered = average_stage_window(daily_map, start.isoformat(), duration)
+        assert int(row_counts.sum()) == covered
+        for field, mean in zip(FIELDS, row.tolist()):
+            vals = [d[field] for d in days if d and d.get(field) is not None]
+            if not vals:
+                assert np.isnan(mean)
+            else:
+                assert mean == pytest.approx(sum(vals) / len(vals), abs=1e-9)
+                # Rounded, the prefix-sum mean agrees with the loop except right at .xx5
+                if abs((mean * 100) % 1 - 0.5) >= 1e-6:
+                    assert round(mean, 2) == _mean(vals)
+
+
+def test_empty_map():
+    assert DailySeries({}).window("2025-06-01", 10) == average_stage_window({}, "2025-06-01", 10)
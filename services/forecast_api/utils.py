@@ -1,7 +1,18 @@
 import os
-import requests
-from datetime import datetime, timedelta
+import sys
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
+from daily_series import DailySeries, window_from_map
+from sowing_sweep import sweep_fetch_days, sweep_sowing_dates
+from weather_cache import WeatherCache, date_range, missing_runs
+
+# Pooled outbound client shared by all services (services/common)
+_COMMON_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+if _COMMON_DIR not in sys.path:
+    sys.path.insert(0, _COMMON_DIR)
+from outbound import client as http
+import metrics
 
 load_dotenv()
 
@@ -10,16 +21,30 @@ API_KEYS = {
     "weatherapi": os.getenv("WEATHERAPI_API_KEY"),
 }
 
+# Local day-level weather store; set FORECAST_CACHE_PATH="" to disable.
+CACHE_PATH = os.getenv(
+    "FORECAST_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "weather_cache.sqlite3"),
+)
+weather_cache = WeatherCache(CACHE_PATH) if CACHE_PATH else None
+
+# WeatherAPI's forecast horizon, counted from the location's own today
+WA_HORIZON_DAYS = 14
+
+# Both providers are queried concurrently under one overall deadline (seconds).
+# Late answers keep running in the pool and still land in the weather cache.
+FORECAST_DEADLINE_SECS = float(os.getenv("FORECAST_DEADLINE_SECS", "25"))
+_provider_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("FORECAST_PROVIDER_WORKERS", "8")),
+    thread_name_prefix="forecast-provider",
+)
+
 def _iso(d):
     """Ensure YYYY-MM-DD string."""
     if isinstance(d, str):
         return datetime.fromisoformat(d).date().isoformat()
     return d.isoformat()
 
-def _mean(vals):
-    vals = [v for v in vals if v is not None]
-    return round(sum(vals) / len(vals), 2) if vals else None
-
 def _normalize_vc_day(d):
     # Visual Crossing (metric)
     # tempmin/tempmax (°C), humidity (%), precip (mm), windspeed (km/h), solarradiation (W/m²)
@@ -60,7 +85,7 @@ def fetch_visualcrossing_series(location_str, start_date, days=120):
         "https://weather.visualcrossing.com/VisualCrossingWebServices/rest/services/timeline/"
         f"{location_str}/{start}/{end}?unitGroup=metric&key={API_KEYS['visualcrossing']}&include=days"
     )
-    r = requests.get(url, timeout=30)
+    r = http.get(url, timeout=30, deadline=FORECAST_DEADLINE_SECS)
     r.raise_for_status()
     data = r.json()
     return [_normalize_vc_day(d) for d in data.get("days", [])]
@@ -68,100 +93,177 @@ def fetch_visualcrossing_series(location_str, start_date, days=120):
 def fetch_weatherapi_series(location_str, _start_date, _days=14):
     # WeatherAPI returns next ~14 days from "today"
     url = f"http://api.weatherapi.com/v1/forecast.json?key={API_KEYS['weatherapi']}&q={location_str}&days=14&aqi=no&alerts=no"
-    r = requests.get(url, timeout=30)
+    r = http.get(url, timeout=30, deadline=FORECAST_DEADLINE_SECS)
     r.raise_for_status()
     data = r.json()
     days = data.get("forecast", {}).get("forecastday", [])
     return [_normalize_wa_day(d) for d in days]
 
-def fetch_daily_forecast(location_str, start_date, days=120):
+def _fetch_vc_cached(location_str, start_date, days):
     """
-    Returns dict: ISO date -> {tmin_c,tmax_c,rh_pct,rain_mm,wind_kmph,solar_wm2}
-    Prefers VisualCrossing; fills missing dates with WeatherAPI when available.
+    Serve VisualCrossing days from the local store and fetch only the
+    missing date sub-ranges. Returns (series, status): "partial" when some
+    sub-range failed; raises when nothing at all could be served.
+    """
+    dates = date_range(start_date, days)
+    cached = weather_cache.get_range("visualcrossing", location_str, dates)
+    # Counted in days
+    metrics.cache_event("weather", "hits", len(cached))
+    metrics.cache_event("weather", "misses", len(dates) - len(cached))
+    error = None
+    for run_start, run_days in missing_runs(dates, cached):
+        try:
+            fetched = {
+                _iso(d["date"]): d
+                for d in fetch_visualcrossing_series(location_str, run_start, days=run_days)
+            }
+        except Exception as e:
+            # Keep whatever the cache and earlier runs already gave us
+            print(f"[VC] Error for {run_start} (+{run_days}d): {e}")
+            error = e
+            continue
+        weather_cache.put_range(
+            "visualcrossing", location_str, fetched, covered_dates=date_range(run_start, run_days)
+        )
+        cached.update(fetched)
+    series = [cached[iso] for iso in dates if cached.get(iso)]
+    if error is None:
+        return series, "ok"
+    if not series:
+        raise error
+    return series, "partial"
+
+def _fetch_wa_cached(location_str, start_date):
+    """
+    WeatherAPI always answers for the next ~14 days, so refetch only when
+    part of that horizon has gone stale. Its days start at the location's
+    date, which is within a day of UTC, so only the days every possible
+    start covers decide freshness, and rows are stored under the dates the
+    provider returned.
     """
+    today = datetime.now(timezone.utc).date()
+    span = date_range((today - timedelta(days=1)).isoformat(), WA_HORIZON_DAYS + 2)
+    needed = span[2:-2]
+    cached = weather_cache.get_range("weatherapi", location_str, span)
+    hits = sum(1 for iso in needed if iso in cached)
+    metrics.cache_event("weather", "hits", hits)
+    metrics.cache_event("weather", "misses", len(needed) - hits)
+    if hits < len(needed):
+        fetched = {_iso(d["date"]): d for d in fetch_weatherapi_series(location_str, start_date)}
+        covered = date_range(min(fetched), WA_HORIZON_DAYS) if fetched else needed
+        weather_cache.put_range("weatherapi", location_str, fetched, covered_dates=covered)
+        cached.update(fetched)
+    return [cached[iso] for iso in span if cached.get(iso)], "ok"
+
+def _fetch_vc(location_str, start_date, days):
+    if weather_cache:
+        return _fetch_vc_cached(location_str, start_date, days)
+    return fetch_visualcrossing_series(location_str, start_date, days=days), "ok"
+
+def _fetch_wa(location_str, start_date):
+    if weather_cache:
+        return _fetch_wa_cached(location_str, start_date)
+    return fetch_weatherapi_series(location_str, start_date), "ok"
+
+def fetch_daily_forecast_with_status(location_str, start_date, days=120, deadline=None):
+    """
+    Queries VisualCrossing and WeatherAPI concurrently and merges whatever has
+    arrived within `deadline` seconds (VC first, WA fills gaps).
+    Returns (by_date, providers) where providers maps each provider name to
+    "ok", "partial" (some cached date ranges could not be refreshed),
+    "error" or "timeout".
+    """
+    deadline = FORECAST_DEADLINE_SECS if deadline is None else deadline
+    futures = {
+        "visualcrossing": _provider_pool.submit(_fetch_vc, location_str, start_date, days),
+        "weatherapi": _provider_pool.submit(_fetch_wa, location_str, start_date),
+    }
+    with metrics.span("forecast.fetch"):
+        done, _ = wait(futures.values(), timeout=deadline)
+
     by_date = {}
+    providers = {}
+    for name, tag in (("visualcrossing", "VC"), ("weatherapi", "WA")):
+        fut = futures[name]
+        if fut not in done:
+            print(f"[{tag}] No answer within {deadline}s deadline")
+            providers[name] = "timeout"
+            metrics.upstream_error(name, "timeout")
+            continue
+        try:
+            series, status = fut.result()
+        except Exception as e:
+            print(f"[{tag}] Error: {e}")
+            providers[name] = "error"
+            metrics.upstream_error(name, "error")
+            continue
+        providers[name] = status
+        if status != "ok":
+            metrics.upstream_error(name, status)
+        for d in series:
+            by_date.setdefault(_iso(d["date"]), d)
 
-    # Try VisualCrossing
-    try:
-        vc = fetch_visualcrossing_series(location_str, start_date, days=days)
-        for d in vc:
-            by_date[_iso(d["date"])] = d
-    except Exception as e:
-        print(f"[VC] Error: {e}")
-
-    # Fill gaps with WeatherAPI (~14 days window from now)
-    try:
-        wa = fetch_weatherapi_series(location_str, start_date)
-        for d in wa:
-            iso = _iso(d["date"])
-            if iso not in by_date:
-                by_date[iso] = d
-    except Exception as e:
-        print(f"[WA] Error: {e}")
+    return by_date, providers
 
+def fetch_daily_forecast(location_str, start_date, days=120):
+    """
+    Returns dict: ISO date -> {tmin_c,tmax_c,rh_pct,rain_mm,wind_kmph,solar_wm2}
+    Prefers VisualCrossing; fills missing dates with WeatherAPI when available.
+    Days already in the local weather cache are not requested again.
+    """
+    by_date, _ = fetch_daily_forecast_with_status(location_str, start_date, days=days)
     return by_date
 
 def average_stage_window(daily_map, start_date, duration_days):
     """
     Slice daily_map from start_date for duration_days and average available fields.
+    `daily_map` may be a dict or a prebuilt DailySeries (cheaper for many windows).
     Returns (averages_dict, covered_count)
     """
-    start = datetime.fromisoformat(start_date).date()
-    dates = [(start + timedelta(days=i)).isoformat() for i in range(duration_days)]
-    tmin, tmax, rh, rain, wind, solar = [], [], [], [], [], []
+    if isinstance(daily_map, DailySeries):
+        return daily_map.window(start_date, duration_days)
+    return window_from_map(daily_map, start_date, duration_days)
 
-    for iso in dates:
-        d = daily_map.get(iso)
-        if not d:
-            continue
-        tmin.append(d.get("tmin_c"))
-        tmax.append(d.get("tmax_c"))
-        rh.append(d.get("rh_pct"))
-        rain.append(d.get("rain_mm"))
-        wind.append(d.get("wind_kmph"))
-        solar.append(d.get("solar_wm2"))
-
-    averages = {
-        "tmin_c": _mean(tmin),
-        "tmax_c": _mean(tmax),
-        "rh_pct": _mean(rh),
-        "rain_mm": _mean(rain),
-        "wind_kmph": _mean(wind),
-        "solar_wm2": _mean(solar),
-    }
-    covered = sum(x is not None for x in [*tmin, *tmax, *rh, *rain, *wind, *solar])
-    return averages, covered
+FORECAST_WINDOW_DAYS = 120
+# Longest date range one batch fetch may cover; plans of a location whose
+# sowing dates are further apart are fetched in several clusters
+BATCH_MAX_SPAN_DAYS = max(int(os.getenv("FORECAST_BATCH_MAX_SPAN_DAYS", "240")), FORECAST_WINDOW_DAYS)
 
-def fill_forecast_for_payload(payload: dict):
+def resolve_location(payload: dict):
     """
-    Returns a new payload with each stage['forecasted'] filled using forecast averages.
-    Adds a 'window' {start, end, days} for each stage.
+    The provider search string for a planner payload: "district, state" when present.
     """
-    # Shallow copy
-    payload = dict(payload)
     district = (payload.get("district") or "").strip()
     state = (payload.get("state") or "").strip()
-    sw_date = payload.get("sw_date")
-    if not sw_date:
-        raise ValueError("sw_date is required in payload")
 
     # Prefer "district, state" if present
     location = ", ".join([p for p in [district, state] if p]) or state or district
     if not location:
         # If both missing, try region/crop as a fallback search hint (rough)
         location = (payload.get("region") or "India").strip()
+    return location
 
-    # Fetch a 120-day forecast map keyed by date
-    daily_map = fetch_daily_forecast(location, sw_date, days=120)
+@metrics.timed("forecast.average")
+def fill_stages_from_daily_map(payload: dict, daily_map, providers=None):
+    """
+    Returns a new payload with each stage['forecasted'] averaged from an
+    already fetched daily_map (dict or DailySeries), plus each stage's 'window'.
+    """
+    # Shallow copy
+    payload = dict(payload)
+    sw_date = payload.get("sw_date")
+    if not sw_date:
+        raise ValueError("sw_date is required in payload")
 
     # Walk stages
     stages = payload.get("stages", [])
     cursor_date = datetime.fromisoformat(sw_date).date()
+    series = daily_map if isinstance(daily_map, DailySeries) else DailySeries(daily_map)
     new_stages = []
 
     for stage in stages:
         duration = int(stage.get("duration_days", 0) or 0)
-        averages, _ = average_stage_window(daily_map, cursor_date.isoformat(), duration)
+        averages, _ = series.window(cursor_date, duration)
 
         st_copy = dict(stage)
         st_copy["forecasted"] = {k: v for k, v in averages.items() if v is not None}
@@ -175,4 +277,95 @@ def fill_forecast_for_payload(payload: dict):
         cursor_date = cursor_date + timedelta(days=duration)
 
     payload["stages"] = new_stages
-    return payload
\ No newline at end of file
+    if providers is not None:
+        payload["forecast_providers"] = providers
+    return payload
+
+def fill_forecast_for_payload(payload: dict):
+    """
+    Returns a new payload with each stage['forecasted'] filled using forecast averages.
+    Adds a 'window' {start, end, days} for each stage and a top-level
+    'forecast_providers' map of which providers answered within the deadline.
+    """
+    sw_date = payload.get("sw_date")
+    if not sw_date:
+        raise ValueError("sw_date is required in payload")
+
+    # Fetch a 120-day forecast map keyed by date
+    daily_map, providers = fetch_daily_forecast_with_status(
+        resolve_location(payload), sw_date, days=FORECAST_WINDOW_DAYS
+    )
+    return fill_stages_from_daily_map(payload, daily_map, providers)
+
+def fill_forecast_batch(payloads):
+    """
+    Fills many planner payloads, fetching one covering date range per resolved
+    location (split into clusters of sowing dates at most BATCH_MAX_SPAN_DAYS
+    apart, window included) and sharing that daily map across the cluster.
+
+    Yields {"index": i, "result": payload} or {"index": i, "error": msg}
+    one location group at a time, so callers can stream the output.
+    """
+    groups = {}
+    for i, payload in enumerate(payloads):
+        try:
+            if not isinstance(payload, dict):
+                raise ValueError("each item must be a JSON object")
+            sw_date = payload.get("sw_date")
+            if not sw_date:
+                raise ValueError("sw_date is required in payload")
+            start = datetime.fromisoformat(sw_date).date()
+        except Exception as e:
+            yield {"index": i, "error": str(e)}
+            continue
+        groups.setdefault(resolve_location(payload), []).append((i, start))
+
+    for location, members in groups.items():
+        for cluster in date_clusters(members):
+            first = cluster[0][1]
+            span = (cluster[-1][1] - first).days + FORECAST_WINDOW_DAYS
+            daily_map, providers = fetch_daily_forecast_with_status(location, first.isoformat(), days=span)
+            series = DailySeries(daily_map)
+
+            for i, _ in cluster:
+                try:
+                    yield {"index": i, "result": fill_stages_from_daily_map(payloads[i], series, providers)}
+                except Exception as e:
+                    yield {"index": i, "error": str(e)}
+
+def date_clusters(members, max_span=None):
+    """
+    Splits (index, start_date) pairs into runs sorted by date whose fetch range
+    (first start to last start plus the forecast window) stays within max_span days.
+    """
+    max_span = BATCH_MAX_SPAN_DAYS if max_span is None else max_span
+    clusters = []
+    for member in sorted(members, key=lambda m: m[1]):
+        if clusters and (member[1] - clusters[-1][0][1]).days + FORECAST_WINDOW_DAYS <= max_span:
+            clusters[-1].append(member)
+        else:
+            clusters.append([member])
+    return clusters
+
+def sweep_sowing_for_payload(plan: dict, start_date, end_date, step_days=1, top=None):
+    """
+    Ranks candidate sowing dates for one planner payload by overall risk,
+    fetching the weather series for the location only once.
+    """
+    if not start_date or not end_date:
+        raise ValueError("start_date and end_date are required")
+    location = resolve_location(plan)
+    days = sweep_fetch_days(plan, start_date, end_date)
+    daily_map, providers = fetch_daily_forecast_with_status(location, start_date, days=days)
+
+    ranked = sweep_sowing_dates(plan, DailySeries(daily_map), start_date, end_date, step_days)
+    return {
+        "crop": plan.get("crop", "N/A"),
+        "district": plan.get("district", "N/A"),
+        "start_date": start_date,
+        "end_date": end_date,
+        "evaluated": len(ranked),
+        "best": ranked[0] if ranked else None,
+        "ranked": ranked[:top] if top else ranked,
+        "forecast_providers": providers,
+    }
@@ -0,0 +1,138 @@
+import itertools
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Seconds a cached day stays fresh, per provider. VC's long-range days are
+# statistical and barely move; WeatherAPI is a short-horizon forecast.
+DEFAULT_TTLS = {
+    "visualcrossing": int(os.getenv("FORECAST_CACHE_TTL_VC", str(12 * 3600))),
+    "weatherapi": int(os.getenv("FORECAST_CACHE_TTL_WA", str(3 * 3600))),
+}
+
+# Expired rows are deleted on startup and after every this many writes
+PURGE_EVERY_WRITES = int(os.getenv("FORECAST_CACHE_PURGE_EVERY", "500"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_weather (
+    provider   TEXT NOT NULL,
+    location   TEXT NOT NULL,
+    date       TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    payload    TEXT,
+    PRIMARY KEY (provider, location, date)
+)
+"""
+
+
+def normalize_location(location_str):
+    """'  Sehore ,Madhya  Pradesh' -> 'sehore, madhya pradesh'"""
+    parts = [re.sub(r"\s+", " ", p).strip().lower() for p in (location_str or "").split(",")]
+    return ", ".join(p for p in parts if p)
+
+
+def date_range(start_date, days):
+    start = datetime.fromisoformat(start_date).date()
+    return [(start + timedelta(days=i)).isoformat() for i in range(days)]
+
+
+def missing_runs(dates, have, max_gap=3):
+    """
+    Group the dates not in `have` into (start_iso, days) runs, merging runs
+    separated by at most `max_gap` cached days so a ragged cache does not
+    turn into a burst of tiny provider calls.
+    """
+    runs = []
+    for i, iso in enumerate(dates):
+        if iso in have:
+            continue
+        if runs and i - runs[-1][1] <= max_gap + 1:
+            runs[-1][1] = i
+        else:
+            runs.append([i, i])
+    return [(dates[a], b - a + 1) for a, b in runs]
+
+
+class WeatherCache:
+    """
+    On-disk store of normalized daily rows keyed by (provider, location, date).
+
+    A row with a NULL payload records that the provider was asked for that
+    day and returned nothing, so the gap is not re-requested until it expires.
+    """
+
+    def __init__(self, path, ttls=None, purge_every=PURGE_EVERY_WRITES):
+        self.path = path
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.purge_every = purge_every
+        self._writes = itertools.count(1)
+        self._local = threading.local()
+        self._conn().execute(_SCHEMA)
+        self.purge_expired()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_range(self, provider, location, dates):
+        """
+        Returns {iso: row_or_None} for every date in `dates` that has a fresh entry.
+        """
+        if not dates:
+            return {}
+        cutoff = time.time() - self.ttls.get(provider, 0)
+        cur = self._conn().execute(
+            "SELECT date, payload FROM daily_weather "
+            "WHERE provider = ? AND location = ? AND date BETWEEN ? AND ? AND fetched_at >= ?",
+            (provider, normalize_location(location), min(dates), max(dates), cutoff),
+        )
+        wanted = set(dates)
+        return {
+            iso: (json.loads(payload) if payload else None)
+            for iso, payload in cur
+            if iso in wanted
+        }
+
+    def put_range(self, provider, location, rows_by_date, covered_dates=()):
+        """
+        Store provider rows; any date in `covered_dates` without a row is
+        recorded as an empty answer.
+        """
+        now = time.time()
+        loc = normalize_location(location)
+        records = [(provider, loc, iso, now, json.dumps(row)) for iso, row in rows_by_date.items()]
+        records += [
+            (provider, loc, iso, now, None)
+            for iso in covered_dates
+            if iso not in rows_by_date
+        ]
+        if not records:
+            return
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO daily_weather (provider, location, date, fetched_at, payload) "
+                "VALUES (?, ?, ?, ?, ?)",
+                records,
+            )
+        if self.purge_every and next(self._writes) % self.purge_every == 0:
+            self.purge_expired()
+
+    def purge_expired(self):
+        conn = self._conn()
+        now = time.time()
+        with conn:
+            for provider, ttl in self.ttls.items():
+                conn.execute(
+                    "DELETE FROM daily_weather WHERE provider = ? AND fetched_at < ?",
+                    (provider, now - ttl),
+                )
@@ -0,0 +1,52 @@
+import os
+import sys
+import traceback
+from flask import Flask, request, jsonify
+from flask_cors import CORS
+
+# Shared modules live in services/common
+_COMMON_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+if _COMMON_DIR not in sys.path:
+    sys.path.insert(0, _COMMON_DIR)
+from advisory_pipeline import AdvisoryPipeline, PipelineError
+import metrics
+
+app = Flask(__name__)
+CORS(app)
+# Request histograms and GET /metrics (Prometheus text format); the stages
+# loaded in-process record their phases into the same registry
+metrics.instrument_flask(app, "pipeline_api")
+
+# This is the fused endpoint, so it never forwards to PIPELINE_URL itself.
+# Stages load at startup so the first request does not pay for it.
+pipeline = AdvisoryPipeline(pipeline_url=None)
+print(f"Pipeline stages: {pipeline.modes()}")
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "service": "FasalSaathi Pipeline API", "stages": pipeline.modes()}
+
+
+@app.post("/run-pipeline")
+def run_pipeline():
+    """
+    Farm profile in, risk report out: planner, forecast and risk in one
+    request, in-process where the services are co-located.
+    ?debug=1 also returns the intermediate plan and forecast payloads.
+    """
+    profile = request.get_json(silent=True)
+    if not isinstance(profile, dict):
+        return jsonify({"error": "A JSON farm profile is required"}), 400
+    try:
+        result = pipeline.run(profile, include_intermediate=request.args.get("debug") in ("1", "true"))
+    except PipelineError as e:
+        return jsonify({"error": str(e), "stage": e.stage}), e.status
+    except Exception as e:
+        print(traceback.format_exc())
+        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
+    return jsonify(result)
+
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=5003, debug=True)
@@ -1,20 +1,62 @@
+import os
+import sys
+import threading
+import time
+import numpy as np
 import pandas as pd
 import joblib
 import traceback
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from datetime import datetime
+from compiled_model import CompiledPlanner
+from micro_batcher import MicroBatcher
+from prediction_cache import PredictionCache
+
+# Shared instrumentation (services/common)
+_COMMON_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+if _COMMON_DIR not in sys.path:
+    sys.path.insert(0, _COMMON_DIR)
+import metrics
 
 app = Flask(__name__)
 CORS(app)
+# Request histograms and GET /metrics (Prometheus text format)
+metrics.instrument_flask(app, "planner_api")
+
+# Relative paths resolve against this directory, not the working directory,
+# so the fused pipeline can load this module from any process
+SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 model_pipeline = None
+model_filename = os.path.join(SERVICE_DIR, 'final_crop_model.joblib')
+TRAINING_CSV = os.path.join(
+    SERVICE_DIR, os.environ.get("PLANNER_TRAINING_CSV", "mp_agriculture_stagewise_10000rows_district_season.csv"))
+
+# auto: use the compiled boosters when present, else the joblib pipeline
+MODEL_FORMAT = os.environ.get("PLANNER_MODEL_FORMAT", "auto")
+COMPILED_MODEL_DIR = os.path.join(SERVICE_DIR, os.environ.get("PLANNER_COMPILED_MODEL", "compiled_model"))
+XGB_THREADS = int(os.environ.get("PLANNER_XGB_THREADS", "0")) or None
+model_path = model_filename
 
 def load_model():
-    global model_pipeline
+    global model_pipeline, model_path
+    started = time.perf_counter()
+    if MODEL_FORMAT in ("auto", "compiled") and os.path.isdir(COMPILED_MODEL_DIR):
+        try:
+            model_pipeline = CompiledPlanner.load(COMPILED_MODEL_DIR, nthread=XGB_THREADS)
+            model_path = os.path.join(COMPILED_MODEL_DIR, "manifest.json")
+            print(f"Compiled model '{COMPILED_MODEL_DIR}' loaded in {time.perf_counter() - started:.2f}s.")
+            return
+        except Exception as e:
+            print(f"An error occurred while loading the compiled model: {e}")
+    if MODEL_FORMAT == "compiled":
+        model_pipeline = None
+        return
+
     try:
-        model_filename = 'final_crop_model.joblib'
         model_pipeline = joblib.load(model_filename)
+        model_path = model_filename
         print(f"Model '{model_filename}' loaded successfully.")
     except FileNotFoundError:
         print(f"Error: Model file '{model_filename}' not found.")
@@ -25,61 +67,206 @@ def load_model():
 
 load_model()
 
-def format_prediction_to_detailed_json(raw_predictions, input_data):
-    targets = ['total_duration_estimate'] + \
-              [f'{stage}_{metric}' for stage in ['sw', 'sd_e', 'tilrr', 'stel', 'btng', 'hdng', 'flwr', 'grnm', 'grnd', 'rpng', 'hrvst'] for metric in ['tmin', 'tmax', 'rh', 'rain', 'wind']] + \
-              [f'{stage}_stage_dur' for stage in ['sw', 'sd_e', 'tilrr', 'stel', 'btng', 'hdng', 'flwr', 'grnm', 'grnd', 'rpng', 'hrvst']]
-    
-    results_df = pd.DataFrame(raw_predictions, columns=targets)
-    
-    stage_map = {
-        "sw": {"name": "Sowing & Germination", "importance_weight": 1.4},
-        "sd_e": {"name": "Seedling / Emergence", "importance_weight": 1.2},
-        "tilrr": {"name": "Tillering", "importance_weight": 1.6},
-        "stel": {"name": "Stem Elongation", "importance_weight": 1.4},
-        "btng": {"name": "Booting", "importance_weight": 1.5},
-        "hdng": {"name": "Heading", "importance_weight": 1.5},
-        "flwr": {"name": "Flowering", "importance_weight": 1.6},
-        "grnm": {"name": "Grain Filling", "importance_weight": 1.6},
-        "rpng": {"name": "Ripening", "importance_weight": 0.9},
-        "hrvst": {"name": "Harvest", "importance_weight": 0.8}
-    }
-    
+FEATURES = ['crop', 'seed_type', 'soil', 'district', 'season']
+
+STAGE_CODES = ['sw', 'sd_e', 'tilrr', 'stel', 'btng', 'hdng', 'flwr', 'grnm', 'grnd', 'rpng', 'hrvst']
+TARGETS = ['total_duration_estimate'] + \
+          [f'{stage}_{metric}' for stage in STAGE_CODES for metric in ['tmin', 'tmax', 'rh', 'rain', 'wind']] + \
+          [f'{stage}_stage_dur' for stage in STAGE_CODES]
+TARGET_INDEX = {name: i for i, name in enumerate(TARGETS)}
+
+STAGE_MAP = {
+    "sw": {"name": "Sowing & Germination", "importance_weight": 1.4},
+    "sd_e": {"name": "Seedling / Emergence", "importance_weight": 1.2},
+    "tilrr": {"name": "Tillering", "importance_weight": 1.6},
+    "stel": {"name": "Stem Elongation", "importance_weight": 1.4},
+    "btng": {"name": "Booting", "importance_weight": 1.5},
+    "hdng": {"name": "Heading", "importance_weight": 1.5},
+    "flwr": {"name": "Flowering", "importance_weight": 1.6},
+    "grnm": {"name": "Grain Filling", "importance_weight": 1.6},
+    "rpng": {"name": "Ripening", "importance_weight": 0.9},
+    "hrvst": {"name": "Harvest", "importance_weight": 0.8}
+}
+
+# Set PLANNER_MICROBATCH=1 to merge concurrent /predict calls into one model call
+MICROBATCH_ENABLED = os.environ.get("PLANNER_MICROBATCH", "0") == "1"
+MICROBATCH_MAX = int(os.environ.get("PLANNER_MICROBATCH_MAX", "64"))
+MICROBATCH_WAIT_MS = float(os.environ.get("PLANNER_MICROBATCH_WAIT_MS", "5"))
+BATCH_LIMIT = int(os.environ.get("PLANNER_BATCH_LIMIT", "5000"))
+
+# Memoized model rows keyed by the feature tuple; PLANNER_CACHE_PATH adds a disk tier.
+# PLANNER_WARMUP=seen precomputes every feature tuple in the training CSV,
+# PLANNER_WARMUP=cross every (crop, seed_type) pair x soil x district x season.
+CACHE_ENABLED = os.environ.get("PLANNER_CACHE", "1") == "1"
+CACHE_SIZE = int(os.environ.get("PLANNER_CACHE_SIZE", "100000"))
+CACHE_PATH = os.environ.get("PLANNER_CACHE_PATH") or None
+if CACHE_PATH:
+    CACHE_PATH = os.path.join(SERVICE_DIR, CACHE_PATH)
+WARMUP_MODE = os.environ.get("PLANNER_WARMUP", "")
+
+
+def format_prediction_row(row, record):
+    """
+    Builds the detailed plan JSON from one row of model output (indexed like
+    TARGETS) and the input record it was predicted for.
+    """
     stages_list = []
-    pred_data = results_df.iloc[0]
-    
-    for stage_code, stage_details in stage_map.items():
+    for stage_code, stage_details in STAGE_MAP.items():
         stage_entry = {
             "name": stage_details["name"],
-            "duration_days": int(round(pred_data.get(f'{stage_code}_stage_dur', 0))),
+            "duration_days": int(round(row[TARGET_INDEX[f'{stage_code}_stage_dur']])),
             "importance_weight": stage_details["importance_weight"],
             "ideal": {
-                "tmin_c": round(pred_data.get(f'{stage_code}_tmin', 0.0), 2),
-                "tmax_c": round(pred_data.get(f'{stage_code}_tmax', 0.0), 2),
-                "rh_pct": int(round(pred_data.get(f'{stage_code}_rh', 0))),
-                "rain_mm": round(pred_data.get(f'{stage_code}_rain', 0.0), 2),
-                "wind_kmph": round(pred_data.get(f'{stage_code}_wind', 0.0), 2),
+                "tmin_c": round(row[TARGET_INDEX[f'{stage_code}_tmin']], 2),
+                "tmax_c": round(row[TARGET_INDEX[f'{stage_code}_tmax']], 2),
+                "rh_pct": int(round(row[TARGET_INDEX[f'{stage_code}_rh']])),
+                "rain_mm": round(row[TARGET_INDEX[f'{stage_code}_rain']], 2),
+                "wind_kmph": round(row[TARGET_INDEX[f'{stage_code}_wind']], 2),
             },
             "forecasted": {}
         }
         stages_list.append(stage_entry)
         
     final_json = {
-        "state": input_data['state'].iloc[0] if 'state' in input_data.columns else None,
-        "total_duration_days": int(round(results_df['total_duration_estimate'].iloc[0])),
+        "state": record.get('state'),
+        "total_duration_days": int(round(row[TARGET_INDEX['total_duration_estimate']])),
         "meta": {
             "version": "1.0",
             "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "notes": "Ideal stage-level dataset generated by the prediction model."
         },
-        "crop": input_data['crop'].iloc[0],
-        "sw_date": input_data['sw_date'].iloc[0] if 'sw_date' in input_data.columns else None,
-        "district": input_data['district'].iloc[0],
+        "crop": record['crop'],
+        "sw_date": record.get('sw_date'),
+        "district": record['district'],
         "stages": stages_list
     }
     
     return final_json
 
+
+def format_predictions(raw_predictions, records):
+    """Formats every row of a (n, len(TARGETS)) prediction array; no per-row DataFrame."""
+    return [format_prediction_row(row, record) for row, record in zip(raw_predictions.tolist(), records)]
+
+
+def format_prediction_to_detailed_json(raw_predictions, input_data):
+    return format_prediction_row(raw_predictions[0].tolist(), input_data.iloc[0].to_dict())
+
+
+def predict_rows(records):
+    """One model call for many input records; returns the raw output rows."""
+    if isinstance(model_pipeline, CompiledPlanner):
+        return list(model_pipeline.predict_records(records))
+    frame = pd.DataFrame.from_records(records, columns=FEATURES)
+    return list(model_pipeline.predict(frame))
+
+
+def missing_features(record):
+    return [f for f in FEATURES if f not in record]
+
+
+def _model_tag():
+    try:
+        st = os.stat(model_path)
+        return f"{st.st_size}-{int(st.st_mtime)}"
+    except OSError:
+        return ""
+
+
+prediction_cache = (
+    PredictionCache(max_entries=CACHE_SIZE, path=CACHE_PATH, model_tag=_model_tag())
+    if CACHE_ENABLED else None
+)
+if prediction_cache is not None:
+    metrics.register_cache("prediction", lambda: prediction_cache.stats,
+                           size=lambda: prediction_cache.snapshot()["size"])
+
+
+def feature_key(record):
+    """The cache key for a record, or None when a feature is not a plain string."""
+    values = tuple(record[f] for f in FEATURES)
+    return values if all(isinstance(v, str) for v in values) else None
+
+
+def predict_rows_cached(records, count=True):
+    """
+    Like predict_rows, but serves known feature tuples from the prediction
+    cache and predicts each distinct missing tuple once.
+    """
+    if prediction_cache is None:
+        return predict_rows(records)
+
+    keys = [feature_key(r) for r in records]
+    found = prediction_cache.get_many({k for k in keys if k is not None}, count=count)
+
+    pending = {}
+    for i, key in enumerate(keys):
+        if key not in found:
+            pending.setdefault(key if key is not None else ("#", i), i)
+    if pending:
+        predicted = predict_rows([records[i] for i in pending.values()])
+        fresh = dict(zip(pending, predicted))
+        prediction_cache.put_many({k: v for k, v in fresh.items() if k[0] != "#"})
+        if count:
+            prediction_cache.record_misses(len(pending))
+        found.update(fresh)
+
+    return [found[key if key is not None else ("#", i)] for i, key in enumerate(keys)]
+
+
+micro_batcher = (
+    MicroBatcher(predict_rows_cached, max_batch=MICROBATCH_MAX, max_wait_ms=MICROBATCH_WAIT_MS)
+    if MICROBATCH_ENABLED else None
+)
+
+
+def plan_for_record(record):
+    """The /predict plan for one validated profile; also used in-process by the fused pipeline."""
+    with metrics.span("planner.predict"):
+        if micro_batcher is not None:
+            row = micro_batcher.predict(record)
+        else:
+            row = predict_rows_cached([record])[0]
+    with metrics.span("planner.format"):
+        return format_prediction_row(row.tolist(), record)
+
+
+warmup_status = {"mode": WARMUP_MODE or None, "state": "off", "rows": 0, "seconds": None}
+
+
+def warmup_records(mode):
+    df = pd.read_csv(TRAINING_CSV, usecols=FEATURES, dtype=str).dropna()
+    if mode == "seen":
+        return df.drop_duplicates().to_dict("records")
+    if mode == "cross":
+        # Seed types belong to a crop, so cross the observed pairs with the rest
+        grid = df[["crop", "seed_type"]].drop_duplicates()
+        for col in ("soil", "district", "season"):
+            grid = grid.merge(df[[col]].drop_duplicates(), how="cross")
+        return grid[FEATURES].to_dict("records")
+    raise ValueError(f"Unknown PLANNER_WARMUP mode '{mode}', expected 'seen' or 'cross'")
+
+
+def warm_prediction_cache(mode, chunk_size=4096):
+    warmup_status["state"] = "running"
+    started = time.perf_counter()
+    try:
+        records = warmup_records(mode)
+        for i in range(0, len(records), chunk_size):
+            predict_rows_cached(records[i:i + chunk_size], count=False)
+            warmup_status["rows"] = min(i + chunk_size, len(records))
+        warmup_status["state"] = "done"
+        print(f"Prediction cache warmed with {len(records)} feature tuples.")
+    except Exception as e:
+        warmup_status["state"] = f"failed: {e}"
+        print(f"Prediction cache warm-up failed: {e}")
+    warmup_status["seconds"] = round(time.perf_counter() - started, 2)
+
+
+if WARMUP_MODE and prediction_cache is not None and model_pipeline is not None:
+    threading.Thread(target=warm_prediction_cache, args=(WARMUP_MODE,), daemon=True).start()
+
+
 @app.route("/predict", methods=['POST'])
 def predict():
     if model_pipeline is None:
@@ -89,11 +276,12 @@ def predict():
         json_data = request.get_json()
         if not json_data:
             return jsonify({"error": "No input data provided"}), 400
-            
-        input_data = pd.DataFrame(json_data, index=[0])
-        raw_prediction = model_pipeline.predict(input_data)
-        
-        formatted_response = format_prediction_to_detailed_json(raw_prediction, input_data)
+
+        missing = missing_features(json_data)
+        if missing:
+            return jsonify({"error": f"Missing input fields: {', '.join(missing)}"}), 400
+
+        formatted_response = plan_for_record(json_data)
         
         return jsonify(formatted_response)
     
@@ -101,5 +289,56 @@ def predict():
         print(traceback.format_exc())
         return jsonify({"error": f"An error occurred during prediction: {str(e)}"}), 500
 
+
+@app.route("/predict/batch", methods=['POST'])
+def predict_batch():
+    """
+    Accepts a JSON list of farm profiles (or {"profiles": [...]}) and predicts
+    them all in one model call (cached feature tuples are not re-predicted). Returns {"predictions": [...]} in input order;
+    invalid profiles get an {"error": ...} entry instead of a plan.
+    """
+    if model_pipeline is None:
+        return jsonify({"error": "Model is not loaded. Please check server logs."}), 500
+
+    data = request.get_json(silent=True)
+    profiles = data.get("profiles") if isinstance(data, dict) else data
+    if not isinstance(profiles, list) or not profiles:
+        return jsonify({"error": "A non-empty JSON list of profiles is required"}), 400
+    if len(profiles) > BATCH_LIMIT:
+        return jsonify({"error": f"At most {BATCH_LIMIT} profiles per batch"}), 400
+
+    try:
+        predictions = [None] * len(profiles)
+        valid = []
+        for i, profile in enumerate(profiles):
+            if not isinstance(profile, dict):
+                predictions[i] = {"error": "Profile must be a JSON object"}
+            elif missing_features(profile):
+                predictions[i] = {"error": f"Missing input fields: {', '.join(missing_features(profile))}"}
+            else:
+                valid.append(i)
+
+        if valid:
+            records = [profiles[i] for i in valid]
+            with metrics.span("planner.predict_batch"):
+                raw = np.asarray(predict_rows_cached(records))
+            with metrics.span("planner.format_batch"):
+                for i, formatted in zip(valid, format_predictions(raw, records)):
+                    predictions[i] = formatted
+
+        return jsonify({"predictions": predictions})
+
+    except Exception as e:
+        print(traceback.format_exc())
+        return jsonify({"error": f"An error occurred during prediction: {str(e)}"}), 500
+
+@app.route("/cache/stats", methods=['GET'])
+def cache_stats():
+    return jsonify({
+        "predictions": prediction_cache.snapshot() if prediction_cache is not None else None,
+        "warmup": warmup_status,
+        "microbatch": micro_batcher.snapshot() if micro_batcher is not None else None,
+    })
+
 if __name__ == "__main__":
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,170 @@
+"""
+Compact inference artifact for the planner model.
+
+`export_compiled_model` unpacks the trained sklearn Pipeline
+(OneHotEncoder -> RegressorChain of XGBRegressor) into a directory holding a
+manifest (feature categories, one-hot column index, target and chain order)
+and one UBJ booster per target. `CompiledPlanner` loads that directory and
+walks the chain with raw boosters, without sklearn or a DataFrame.
+train_parallel.py writes the same layout, adding "booster_inputs" when
+targets are chained in independent groups instead of one long chain.
+
+    python compiled_model.py final_crop_model.joblib compiled_model
+"""
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import xgboost as xgb
+
+MANIFEST = "manifest.json"
+FORMAT_VERSION = 1
+
+
+def _booster_file(chain_idx):
+    return f"target_{chain_idx:03d}.ubj"
+
+
+def export_compiled_model(pipeline, features, targets, out_dir, sample=None, tolerance=1e-3):
+    """
+    Writes the compiled artifact for a fitted pipeline. When `sample` (a
+    DataFrame of inputs) is given, the compiled model is checked against
+    pipeline.predict on it and export fails if they differ by more than
+    `tolerance`.
+    """
+    preprocessor = pipeline.named_steps["preprocessor"]
+    chain = pipeline.named_steps["regressor"]
+    encoder = preprocessor.named_transformers_["cat"]
+    if list(preprocessor.transformers_[0][2]) != list(features):
+        raise ValueError("Preprocessor columns do not match the planner features")
+
+    os.makedirs(out_dir, exist_ok=True)
+    for chain_idx, estimator in enumerate(chain.estimators_):
+        estimator.get_booster().save_model(os.path.join(out_dir, _booster_file(chain_idx)))
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "features": list(features),
+        "categories": [[str(c) for c in cats] for cats in encoder.categories_],
+        "targets": list(targets),
+        "chain_order": [int(i) for i in chain.order_],
+        # With sparse input XGBoost treats absent entries (zeros) as missing
+        "sparse_input": bool(getattr(preprocessor, "sparse_output_", False)),
+        "boosters": [_booster_file(i) for i in range(len(chain.estimators_))],
+    }
+
+    if sample is not None:
+        expected = pipeline.predict(sample)
+        actual = CompiledPlanner(manifest, out_dir).predict(sample)
+        max_diff = float(np.max(np.abs(expected - actual))) if len(sample) else 0.0
+        if max_diff > tolerance:
+            raise ValueError(f"Compiled model deviates from the pipeline by {max_diff}")
+        manifest["max_abs_diff"] = max_diff
+
+    with open(os.path.join(out_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+class CompiledPlanner:
+    """Runtime for an exported planner artifact; predict() mirrors Pipeline.predict."""
+
+    def __init__(self, manifest, model_dir, nthread=None):
+        if manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported compiled model format {manifest.get('format_version')}")
+        self.features = manifest["features"]
+        self.targets = manifest["targets"]
+        self.order = np.asarray(manifest["chain_order"])
+        self.inv_order = np.argsort(self.order)
+        self.absent = np.nan if manifest["sparse_input"] else 0.0
+
+        # One-hot column of each (feature, value)
+        self.column_index = []
+        offset = 0
+        for cats in manifest["categories"]:
+            self.column_index.append({c: offset + i for i, c in enumerate(cats)})
+            offset += len(cats)
+        self.n_encoded = offset
+
+        # Which earlier boosters' predictions each booster reads; absent means
+        # the full RegressorChain layout (every earlier booster, in order)
+        inputs = manifest.get("booster_inputs")
+        self.input_columns = None if inputs is None else [
+            np.concatenate([np.arange(self.n_encoded), self.n_encoded + np.asarray(prev, dtype=np.int64)])
+            for prev in inputs
+        ]
+
+        self.boosters = []
+        for name in manifest["boosters"]:
+            booster = xgb.Booster(model_file=os.path.join(model_dir, name))
+            if nthread:
+                booster.set_param({"nthread": nthread})
+            self.boosters.append(booster)
+
+    @classmethod
+    def load(cls, model_dir, nthread=None):
+        with open(os.path.join(model_dir, MANIFEST)) as f:
+            return cls(json.load(f), model_dir, nthread=nthread)
+
+    def encode(self, records):
+        """
+        Input matrix for the first booster plus room for the chained predictions,
+        with one-hot zeros marked the way the pipeline's sparse matrix did.
+        """
+        X = np.full((len(records), self.n_encoded + len(self.boosters)), self.absent, dtype=np.float32)
+        for i, record in enumerate(records):
+            for feature, index in zip(self.features, self.column_index):
+                col = index.get(str(record.get(feature)))
+                if col is not None:
+                    X[i, col] = 1.0
+        return X
+
+    def predict_records(self, records):
+        """(n, len(targets)) predictions for a list of input dicts."""
+        X = self.encode(records)
+        Y_chain = np.zeros((len(records), len(self.boosters)))
+        for chain_idx, booster in enumerate(self.boosters):
+            width = self.n_encoded + chain_idx
+            inputs = X[:, :width] if self.input_columns is None else X[:, self.input_columns[chain_idx]]
+            Y_chain[:, chain_idx] = booster.inplace_predict(inputs, missing=np.nan)
+            column = Y_chain[:, chain_idx].astype(np.float32)
+            if self.absent != 0.0:
+                # scipy drops explicit zeros when hstacking previous predictions
+                column[column == 0.0] = np.nan
+            X[:, width] = column
+        return Y_chain[:, self.inv_order]
+
+    def predict(self, X):
+        """Accepts a DataFrame (like Pipeline.predict) or a list of dicts."""
+        records = X.to_dict("records") if hasattr(X, "to_dict") else X
+        return self.predict_records(records)
+
+
+def main(argv):
+    import joblib
+    import pandas as pd
+
+    if len(argv) < 3:
+        print("usage: python compiled_model.py <model.joblib> <out_dir> [training.csv]")
+        return 2
+    model_file, out_dir = argv[1], argv[2]
+    csv = argv[3] if len(argv) > 3 else "mp_agriculture_stagewise_10000rows_district_season.csv"
+
+    pipeline = joblib.load(model_file)
+    features = list(pipeline.named_steps["preprocessor"].transformers_[0][2])
+    df = pd.read_csv(csv)
+    targets = ['total_duration_estimate'] + \
+              [col for col in df.columns if col.endswith(('_tmin', '_tmax', '_rh', '_rain', '_wind'))] + \
+              [col for col in df.columns if col.endswith('_stage_dur')]
+
+    started = time.perf_counter()
+    manifest = export_compiled_model(pipeline, features, targets, out_dir, sample=df[features].head(500))
+    print(f"Compiled model written to '{out_dir}' in {time.perf_counter() - started:.1f}s "
+          f"(max abs diff vs pipeline: {manifest['max_abs_diff']:.2e}).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
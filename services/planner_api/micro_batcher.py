@@ -0,0 +1,72 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Merges concurrent single predictions into one model call.
+
+    The first queued request opens a window of `max_wait_ms`; everything that
+    arrives within it (up to `max_batch` items) is predicted together and each
+    caller gets its own output row back.
+    """
+
+    def __init__(self, predict_many, max_batch=64, max_wait_ms=5):
+        self.predict_many = predict_many
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self.batches = 0
+        self.items = 0
+        self._worker = threading.Thread(target=self._run, name="planner-microbatch", daemon=True)
+        self._worker.start()
+
+    def submit(self, record):
+        future = Future()
+        self._queue.put((record, future))
+        return future
+
+    def predict(self, record, timeout=None):
+        """Blocks until this record's output row is ready."""
+        return self.submit(record).result(timeout=timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            records = [record for record, _ in batch]
+            try:
+                rows = self.predict_many(records)
+            except Exception:
+                # One bad record must not fail its neighbours; retry them alone
+                for record, future in batch:
+                    try:
+                        future.set_result(self.predict_many([record])[0])
+                    except Exception as e:
+                        future.set_exception(e)
+            else:
+                for (_, future), row in zip(batch, rows):
+                    future.set_result(row)
+            self.batches += 1
+            self.items += len(batch)
+
+    def snapshot(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
@@ -0,0 +1,111 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class PredictionCache:
+    """
+    Model output rows keyed by the tuple of categorical input features.
+
+    The planner's prediction is fully determined by that tuple, so rows can
+    be reused across requests. An in-memory LRU sits in front of an optional
+    SQLite file; `model_tag` namespaces disk rows so a retrained model never
+    serves stale predictions.
+    """
+
+    def __init__(self, max_entries=100000, path=None, model_tag=""):
+        self.max_entries = max_entries
+        self.path = path
+        self.model_tag = model_tag
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+        if path:
+            self._conn().execute(
+                "CREATE TABLE IF NOT EXISTS predictions "
+                "(model_tag TEXT NOT NULL, key TEXT NOT NULL, row BLOB NOT NULL, "
+                "PRIMARY KEY (model_tag, key))"
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _disk_key(key):
+        return "\x1f".join(key)
+
+    def _remember(self, key, row):
+        self._rows[key] = row
+        self._rows.move_to_end(key)
+        while len(self._rows) > self.max_entries:
+            self._rows.popitem(last=False)
+
+    def get_many(self, keys, count=True):
+        """
+        Returns {key: row} for the keys already cached in memory or on disk.
+        Pass count=False to leave the hit counters alone (e.g. during warm-up).
+        """
+        found = {}
+        with self._lock:
+            for key in keys:
+                row = self._rows.get(key)
+                if row is not None:
+                    self._rows.move_to_end(key)
+                    found[key] = row
+            if count:
+                self.stats["hits"] += len(found)
+
+        if self.path:
+            for key in keys:
+                if key in found:
+                    continue
+                hit = self._conn().execute(
+                    "SELECT row FROM predictions WHERE model_tag = ? AND key = ?",
+                    (self.model_tag, self._disk_key(key)),
+                ).fetchone()
+                if hit:
+                    found[key] = np.frombuffer(hit[0], dtype=np.float64)
+            with self._lock:
+                disk = [k for k in found if k not in self._rows]
+                for key in disk:
+                    self._remember(key, found[key])
+                if count:
+                    self.stats["disk_hits"] += len(disk)
+        return found
+
+    def put_many(self, rows_by_key):
+        rows_by_key = {k: np.asarray(v, dtype=np.float64) for k, v in rows_by_key.items()}
+        with self._lock:
+            for key, row in rows_by_key.items():
+                self._remember(key, row)
+        if self.path and rows_by_key:
+            conn = self._conn()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO predictions (model_tag, key, row) VALUES (?, ?, ?)",
+                    [(self.model_tag, self._disk_key(k), v.tobytes()) for k, v in rows_by_key.items()],
+                )
+
+    def record_misses(self, count):
+        with self._lock:
+            self.stats["misses"] += count
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            size = len(self._rows)
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+        served = stats["hits"] + stats["disk_hits"]
+        return {
+            **stats,
+            "size": size,
+            "hit_ratio": round(served / lookups, 4) if lookups else 0.0,
+        }
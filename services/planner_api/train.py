@@ -5,6 +5,7 @@ from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import OneHotEncoder
 from sklearn.multioutput import RegressorChain
 import xgboost as xgb
+from compiled_model import export_compiled_model
 
 df = pd.read_csv("mp_agriculture_stagewise_10000rows_district_season.csv")
 features = ['crop', 'seed_type', 'soil', 'district', 'season']
@@ -37,3 +38,7 @@ pipeline.fit(X, Y)
 model_filename = 'final_crop_model.joblib'
 joblib.dump(pipeline, model_filename)
 print(f"\nModel has been saved to '{model_filename}'. It is compatible with your API.")
+
+compiled_dir = 'compiled_model'
+manifest = export_compiled_model(pipeline, features, targets, compiled_dir, sample=X.head(500))
+print(f"Compiled inference model saved to '{compiled_dir}' (max abs diff vs pipeline: {manifest['max_abs_diff']:.2e}).")
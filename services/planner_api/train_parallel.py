@@ -0,0 +1,272 @@
+"""
+Parallel, incremental training for the planner model.
+
+Targets are split into independent groups that train in a process pool:
+  stage  - one chain per crop stage (sw_*, sd_e_*, ...) plus the total duration
+  target - every target on its own
+  chain  - the single full RegressorChain that train.py fits (no parallelism)
+
+The one-hot design matrix is cached under --cache-dir, keyed by the CSV's
+content hash. Trained groups are cached too, keyed by the feature rows, the
+group's own target columns and the hyperparameters, so a rerun reuses every
+group whose inputs did not change even when other columns of the CSV did.
+Each target is fit twice: on the training split to score the held-out rows,
+then on every row for the saved booster; --val-fraction 0 skips the first. The result is
+the compiled artifact that app.py loads (see compiled_model.py), plus
+training_report.json with per-target fit time and validation error.
+
+    python train_parallel.py --groups stage --workers 4
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import xgboost as xgb
+
+from compiled_model import FORMAT_VERSION, MANIFEST, CompiledPlanner
+
+FEATURES = ['crop', 'seed_type', 'soil', 'district', 'season']
+XGB_PARAMS = {"n_estimators": 100, "learning_rate": 0.1, "max_depth": 5, "random_state": 42}
+
+
+def planner_targets(columns):
+    """Same target order as train.py."""
+    return ['total_duration_estimate'] + \
+           [col for col in columns if col.endswith(('_tmin', '_tmax', '_rh', '_rain', '_wind'))] + \
+           [col for col in columns if col.endswith('_stage_dur')]
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_design_matrix(csv_path, cache_dir):
+    """
+    Reads the CSV with categorical feature dtypes and float32 targets, and
+    caches the category codes and targets as .npy files. Returns the cache
+    entry directory and its metadata.
+    """
+    digest = file_digest(csv_path)
+    entry = os.path.join(cache_dir, "design", digest[:16])
+    meta_path = os.path.join(entry, "meta.json")
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            return entry, json.load(f), True
+
+    columns = pd.read_csv(csv_path, nrows=0).columns
+    targets = planner_targets(columns)
+    dtypes = {f: "category" for f in FEATURES}
+    dtypes.update({t: "float32" for t in targets})
+    df = pd.read_csv(csv_path, usecols=FEATURES + targets, dtype=dtypes)
+
+    # Category order matches OneHotEncoder's sorted categories_
+    categories, codes = [], []
+    for f in FEATURES:
+        col = df[f].cat.reorder_categories(sorted(df[f].cat.categories))
+        categories.append([str(c) for c in col.cat.categories])
+        codes.append(col.cat.codes.to_numpy(dtype=np.int32))
+
+    os.makedirs(entry, exist_ok=True)
+    np.save(os.path.join(entry, "codes.npy"), np.stack(codes, axis=1))
+    np.save(os.path.join(entry, "Y.npy"), df[targets].to_numpy(dtype=np.float32))
+    meta = {"csv_sha256": digest, "rows": len(df), "categories": categories, "targets": targets}
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+    return entry, meta, False
+
+
+def one_hot(codes, categories):
+    """CSR one-hot matrix equal to OneHotEncoder(handle_unknown='ignore') output."""
+    offsets = np.cumsum([0] + [len(c) for c in categories[:-1]])
+    n, k = codes.shape
+    valid = codes >= 0
+    cols = (codes + offsets)[valid]
+    rows = np.repeat(np.arange(n), k).reshape(n, k)[valid]
+    width = sum(len(c) for c in categories)
+    return sp.csr_matrix((np.ones(len(cols), dtype=np.float32), (rows, cols)), shape=(n, width))
+
+
+def target_groups(targets, mode):
+    if mode == "chain":
+        return [list(targets)]
+    if mode == "target":
+        return [[t] for t in targets]
+    if mode == "stage":
+        groups = {}
+        for t in targets:
+            key = t.rsplit("_", 2)[0] if t.endswith("_stage_dur") else t.rsplit("_", 1)[0]
+            groups.setdefault(key, []).append(t)
+        return list(groups.values())
+    raise ValueError(f"Unknown group mode '{mode}'")
+
+
+def split_rows(n, val_fraction, seed=42):
+    order = np.random.default_rng(seed).permutation(n)
+    n_val = int(round(n * val_fraction))
+    return np.sort(order[n_val:]), np.sort(order[:n_val])
+
+
+def _with_previous(X, previous):
+    # Same as RegressorChain: sparse hstack, so zero-valued inputs are absent
+    return X if previous.shape[1] == 0 else sp.hstack((X, previous), format="csr")
+
+
+def fit_group(task):
+    """
+    Worker: fits one chain of targets. Earlier targets in the group feed later
+    ones (true values while fitting, predictions when validating). Validation
+    scores models fit on the training split; the saved boosters are then
+    refit on every row, so the artifact matches train.py.
+    """
+    entry, meta, group, val_fraction, xgb_params, out_dir = task
+    codes = np.load(os.path.join(entry, "codes.npy"), mmap_mode="r")
+    Y = np.load(os.path.join(entry, "Y.npy"), mmap_mode="r")
+    target_cols = [meta["targets"].index(t) for t in group]
+    X = one_hot(np.asarray(codes), meta["categories"])
+    train_idx, val_idx = split_rows(len(codes), val_fraction)
+
+    Y_all = np.asarray(Y[:, target_cols], dtype=np.float64)
+    X_train, Y_train = X[train_idx], Y_all[train_idx]
+    X_val, Y_val = X[val_idx], Y_all[val_idx]
+    val_pred = np.zeros_like(Y_val)
+
+    report = []
+    for j, target in enumerate(group):
+        entry_report = {"target": target}
+        if len(val_idx):
+            model = xgb.XGBRegressor(**xgb_params)
+            model.fit(_with_previous(X_train, Y_train[:, :j]), Y_train[:, j])
+            val_pred[:, j] = model.predict(_with_previous(X_val, val_pred[:, :j]))
+            err = val_pred[:, j] - Y_val[:, j]
+            entry_report["val_rmse"] = round(float(np.sqrt(np.mean(err ** 2))), 4)
+            entry_report["val_mae"] = round(float(np.mean(np.abs(err))), 4)
+
+        started = time.perf_counter()
+        model = xgb.XGBRegressor(**xgb_params)
+        model.fit(_with_previous(X, Y_all[:, :j]), Y_all[:, j])
+        entry_report["fit_seconds"] = round(time.perf_counter() - started, 3)
+        model.get_booster().save_model(os.path.join(out_dir, f"{target}.ubj"))
+        report.append(entry_report)
+    return group, report
+
+
+def features_digest(entry, meta):
+    """Hash of the feature rows every group is fit on."""
+    h = hashlib.sha256(json.dumps(meta["categories"]).encode())
+    h.update(np.ascontiguousarray(np.load(os.path.join(entry, "codes.npy"), mmap_mode="r")).tobytes())
+    return h.hexdigest()
+
+
+def group_key(features, Y, meta, group, val_fraction, xgb_params):
+    # Only the columns this group fits on, so edits to other targets keep it cached
+    h = hashlib.sha256(features.encode())
+    h.update(np.ascontiguousarray(Y[:, [meta["targets"].index(t) for t in group]]).tobytes())
+    h.update(json.dumps([group, val_fraction, xgb_params], sort_keys=True).encode())
+    return h.hexdigest()[:16]
+
+
+def train(csv_path, out_dir, groups_mode="stage", workers=None, val_fraction=0.1, cache_dir=".train_cache"):
+    started = time.perf_counter()
+    entry, meta, design_cached = load_design_matrix(csv_path, cache_dir)
+    print(f"Design matrix {'loaded from cache' if design_cached else 'built'}: "
+          f"{meta['rows']} rows, {len(meta['targets'])} targets.")
+
+    workers = workers or os.cpu_count() or 1
+    groups = target_groups(meta["targets"], groups_mode)
+    xgb_params = dict(XGB_PARAMS, n_jobs=max(1, (os.cpu_count() or 1) // min(workers, len(groups))))
+    # n_jobs only changes speed, not the fitted trees
+    key_params = {k: v for k, v in xgb_params.items() if k != "n_jobs"}
+
+    features = features_digest(entry, meta)
+    Y = np.load(os.path.join(entry, "Y.npy"), mmap_mode="r")
+    pending, reports = [], {}
+    for group in groups:
+        group_dir = os.path.join(cache_dir, "groups", group_key(features, Y, meta, group, val_fraction, key_params))
+        report_path = os.path.join(group_dir, "report.json")
+        if os.path.exists(report_path):
+            with open(report_path) as f:
+                reports[tuple(group)] = (group_dir, json.load(f), True)
+        else:
+            os.makedirs(group_dir, exist_ok=True)
+            pending.append((entry, meta, group, val_fraction, xgb_params, group_dir))
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+            for group, report in pool.map(fit_group, pending):
+                group_dir = next(t[-1] for t in pending if t[2] == group)
+                with open(os.path.join(group_dir, "report.json"), "w") as f:
+                    json.dump(report, f)
+                reports[tuple(group)] = (group_dir, report, False)
+    print(f"Trained {len(pending)} group(s), reused {len(groups) - len(pending)} from cache.")
+
+    # Lay the groups out as one compiled artifact
+    os.makedirs(out_dir, exist_ok=True)
+    boosters, chain_order, booster_inputs, rows = [], [], [], []
+    for group in groups:
+        group_dir, report, cached = reports[tuple(group)]
+        first = len(boosters)
+        for j, target in enumerate(group):
+            name = f"target_{len(boosters):03d}.ubj"
+            shutil.copyfile(os.path.join(group_dir, f"{target}.ubj"), os.path.join(out_dir, name))
+            boosters.append(name)
+            chain_order.append(meta["targets"].index(target))
+            booster_inputs.append(list(range(first, first + j)))
+        rows += [dict(r, group=group[0], cached=cached) for r in report]
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "features": FEATURES,
+        "categories": meta["categories"],
+        "targets": meta["targets"],
+        "chain_order": chain_order,
+        "sparse_input": True,
+        "boosters": boosters,
+        "booster_inputs": booster_inputs,
+        "trained_with": {"groups": groups_mode, "val_fraction": val_fraction, **key_params},
+    }
+    with open(os.path.join(out_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+    with open(os.path.join(out_dir, "training_report.json"), "w") as f:
+        json.dump(rows, f, indent=2)
+
+    # Loading it back catches a malformed artifact before the API does
+    CompiledPlanner(manifest, out_dir)
+    print_report(rows)
+    print(f"Compiled model saved to '{out_dir}' in {time.perf_counter() - started:.1f}s.")
+    return manifest, rows
+
+
+def print_report(rows):
+    print(f"{'target':<26}{'fit s':>8}{'val rmse':>11}{'val mae':>10}")
+    for r in rows:
+        print(f"{r['target']:<26}{r['fit_seconds']:>8.2f}"
+              f"{r.get('val_rmse', float('nan')):>11.4f}{r.get('val_mae', float('nan')):>10.4f}"
+              f"{'  (cached)' if r['cached'] else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default="mp_agriculture_stagewise_10000rows_district_season.csv")
+    parser.add_argument("--out", default="compiled_model")
+    parser.add_argument("--groups", choices=["stage", "target", "chain"], default="stage")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--val-fraction", type=float, default=0.1,
+                        help="held-out share for validation scores; 0 skips the validation fit")
+    parser.add_argument("--cache-dir", default=".train_cache")
+    args = parser.parse_args()
+    train(args.csv, args.out, args.groups, args.workers, args.val_fraction, args.cache_dir)
+
+
+if __name__ == "__main__":
+    main()
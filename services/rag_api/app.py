@@ -1,53 +1,155 @@
-from flask import Flask, jsonify, request
-from src.helper import download_hugging_face_embeddings
-from langchain_pinecone import PineconeVectorStore
-from langchain_openai import ChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.chains import create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_core.prompts import ChatPromptTemplate
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+from flask import Flask, Response, jsonify, request, stream_with_context
+from types import SimpleNamespace
+from src.local_index import LocalIndex, chunk_id
+from src.answer_cache import AnswerCache
+from src.runtime import LazyRuntime, NotReady, timed
 from dotenv import load_dotenv
 from src.prompt import *
+import json
 import os
+import sys
 from flask_cors import CORS
 
+# Shared instrumentation (services/common)
+_COMMON_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+if _COMMON_DIR not in sys.path:
+    sys.path.insert(0, _COMMON_DIR)
+import metrics
+
 app = Flask(__name__)
 
 CORS(app)
+# Request histograms and GET /metrics (Prometheus text format)
+metrics.instrument_flask(app, "rag_api")
 
 load_dotenv()
 
 PINECONE_API_KEY = os.environ.get('PINECONE_API_KEY')
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
-os.environ["PINECONE_API_KEY"] = PINECONE_API_KEY
-os.environ["GOOGLE_API_KEY"] = GOOGLE_API_KEY
+# auto: the local index when store_index.py has built one, else Pinecone
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "auto")
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "local_index")
+# exact: score every chunk; ivf: only the nearest LOCAL_INDEX_NPROBE clusters
+LOCAL_INDEX_SEARCH = os.getenv("LOCAL_INDEX_SEARCH", "exact")
+LOCAL_INDEX_NPROBE = int(os.getenv("LOCAL_INDEX_NPROBE", "8"))
+
+# Answers reused for repeated questions; ANSWER_CACHE_SIZE=0 disables the cache
+# and ANSWER_CACHE_THRESHOLD above 1 keeps only the exact-match tier
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL_SECS = float(os.getenv("ANSWER_CACHE_TTL_SECS", str(24 * 3600)))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.93"))
 
-embeddings = download_hugging_face_embeddings()
+# Embedder saved by `python -m src.export_embedder` (skips the hub lookup);
+# EMBEDDING_QUANTIZE=1 runs it with int8 Linear layers
+EMBEDDING_MODEL_PATH = os.getenv("EMBEDDING_MODEL_PATH") or None
+EMBEDDING_QUANTIZE = os.getenv("EMBEDDING_QUANTIZE", "0") in ("1", "true")
+# background: load after startup while /health already answers; lazy: on the
+# first request; eager: before the server starts, as before
+RAG_WARMUP = os.getenv("RAG_WARMUP", "background")
+# How long a request waits for loading to finish before it gets a 503
+RAG_READY_WAIT_SECS = float(os.getenv("RAG_READY_WAIT_SECS", "30"))
 
 index_name = "fasalsaathi-expert-ai" 
-docsearch = PineconeVectorStore.from_existing_index(
-    index_name=index_name,
-    embedding=embeddings
-)
 
-retriever = docsearch.as_retriever(search_type="similarity", search_kwargs={"k": 3})
+def build_retriever(embeddings):
+    """(retriever, search_by_vector): the latter retrieves for an already embedded query."""
+    if VECTOR_BACKEND == "local" or (VECTOR_BACKEND == "auto" and LocalIndex.exists(LOCAL_INDEX_DIR)):
+        from src.helper import LocalIndexRetriever
 
-chatModel = ChatGoogleGenerativeAI(
-    model="gemini-2.5-pro",
-    temperature=0.7,
-    convert_system_message_to_human=True
-)
+        index = LocalIndex(LOCAL_INDEX_DIR, nprobe=LOCAL_INDEX_NPROBE)
+        print(f"Using local vector index '{LOCAL_INDEX_DIR}' ({len(index)} chunks, {LOCAL_INDEX_SEARCH} search).")
+        retriever = LocalIndexRetriever(index=index, embeddings=embeddings, k=3, mode=LOCAL_INDEX_SEARCH)
+        return retriever, retriever.search_by_vector
+
+    from langchain_pinecone import PineconeVectorStore
+
+    os.environ["PINECONE_API_KEY"] = PINECONE_API_KEY
+    docsearch = PineconeVectorStore.from_existing_index(
+        index_name=index_name,
+        embedding=embeddings
+    )
+    retriever = docsearch.as_retriever(search_type="similarity", search_kwargs={"k": 3})
+    return retriever, lambda vector: docsearch.similarity_search_by_vector(list(map(float, vector)), k=3)
+
+def build_components(timings):
+    """Embedder, retriever and chains; the heavy imports happen here, not at import time."""
+    with timed(timings, "imports"):
+        from src.helper import download_hugging_face_embeddings
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        from langchain.chains.combine_documents import create_stuff_documents_chain
+        from langchain_core.prompts import ChatPromptTemplate
+
+    with timed(timings, "embedder"):
+        embeddings = download_hugging_face_embeddings(model_path=EMBEDDING_MODEL_PATH, quantize=EMBEDDING_QUANTIZE)
+        # The first encode initialises the tokenizer and kernels
+        embeddings.embed_query("warm up")
 
-prompt = ChatPromptTemplate.from_messages(
-    [
-        ("system", system_prompt),
-        ("human", "{input}"),
-    ]
+    with timed(timings, "retriever"):
+        retriever, search_by_vector = build_retriever(embeddings)
+
+    with timed(timings, "chain"):
+        if GOOGLE_API_KEY:
+            os.environ["GOOGLE_API_KEY"] = GOOGLE_API_KEY
+        chatModel = ChatGoogleGenerativeAI(
+            model="gemini-2.5-pro",
+            temperature=0.7,
+            convert_system_message_to_human=True
+        )
+
+        prompt = ChatPromptTemplate.from_messages(
+            [
+                ("system", system_prompt),
+                ("human", "{input}"),
+            ]
+        )
+
+        # Retrieval runs separately (run_chain) so the two phases can be timed
+        question_answer_chain = create_stuff_documents_chain(chatModel, prompt)
+
+    return SimpleNamespace(embeddings=embeddings, retriever=retriever, search_by_vector=search_by_vector,
+                           question_answer_chain=question_answer_chain)
+
+runtime = LazyRuntime(build_components)
+
+answer_cache = AnswerCache(
+    embed=lambda text: runtime.get().embeddings.embed_query(text),
+    max_entries=ANSWER_CACHE_SIZE,
+    ttl=ANSWER_CACHE_TTL_SECS,
+    threshold=ANSWER_CACHE_THRESHOLD,
 )
+metrics.register_cache("answer", lambda: answer_cache.stats, size=lambda: answer_cache.snapshot()["size"])
+
+def context_ids(docs):
+    """Chunk ids of the retrieved documents, as in the local index."""
+    return [getattr(doc, "id", None) or chunk_id(doc.page_content, doc.metadata) for doc in docs]
+
+def components_or_error():
+    """(components, None), or (None, 503 response) while they cannot be loaded."""
+    try:
+        return runtime.get(timeout=RAG_READY_WAIT_SECS), None
+    except NotReady as e:
+        return None, (jsonify({"error": f"Service is not ready: {e}", **runtime.snapshot()}), 503)
+
+def retrieve(rt, msg, vector=None):
+    """Context documents for `msg`, reusing the answer cache's embedding of it when there is one."""
+    with metrics.span("rag.retrieval"):
+        if vector is None:
+            return rt.retriever.invoke(msg)
+        return rt.search_by_vector(vector)
 
-question_answer_chain = create_stuff_documents_chain(chatModel, prompt)
-rag_chain = create_retrieval_chain(retriever, question_answer_chain)
+def run_chain(rt, msg, vector=None):
+    docs = retrieve(rt, msg, vector)
+    try:
+        with metrics.span("rag.generation"):
+            answer = rt.question_answer_chain.invoke({"input": msg, "context": docs})
+    except Exception:
+        metrics.upstream_error("gemini", "error")
+        raise
+    return {"answer": answer, "context": context_ids(docs)}
 
 @app.route("/get", methods=["POST"])
 def chat():
@@ -55,9 +157,108 @@ def chat():
     msg = data.get("msg")
     if not msg:
         return jsonify({"error": "No message provided"}), 400
+    rt, error = components_or_error()
+    if error:
+        return error
     
-    response = rag_chain.invoke({"input": msg})
-    return jsonify({"answer": response["answer"]})
+    cached, cache = answer_cache.get_or_compute(msg, lambda vector: run_chain(rt, msg, vector))
+    return jsonify({"answer": cached["answer"], "cache": cache})
+
+@app.route("/get/stream", methods=["POST"])
+def chat_stream():
+    """
+    Like /get, as NDJSON events: {"type": "context", "ids"} once retrieval is
+    done, {"type": "token", "text"} per chunk of the answer as the model
+    produces it, then {"type": "done", "answer", "cache", "timings_ms"}.
+    Failures after the stream has started arrive as {"type": "error"}.
+    If the client disconnects, generation is abandoned.
+    """
+    data = request.get_json()
+    msg = data.get("msg")
+    if not msg:
+        return jsonify({"error": "No message provided"}), 400
+    rt, error = components_or_error()
+    if error:
+        return error
+
+    started = time.perf_counter()
+    cached, cache, vector = answer_cache.lookup(msg)
+
+    def event(kind, **fields):
+        return json.dumps({"type": kind, **fields}) + "\n"
+
+    def generate():
+        if cached is not None:
+            yield event("context", ids=cached["context"])
+            yield event("token", text=cached["answer"])
+            yield event("done", answer=cached["answer"], cache=cache,
+                        timings_ms={"total": round((time.perf_counter() - started) * 1000, 1)})
+            return
+
+        try:
+            docs = retrieve(rt, msg, vector)
+        except Exception as e:
+            yield event("error", error=f"Retrieval failed: {e}")
+            return
+        ids = context_ids(docs)
+        retrieved = time.perf_counter()
+        yield event("context", ids=ids)
+
+        tokens = rt.question_answer_chain.stream({"input": msg, "context": docs})
+        parts = []
+        first_token = None
+        try:
+            for text in tokens:
+                if first_token is None:
+                    first_token = time.perf_counter()
+                parts.append(text)
+                yield event("token", text=text)
+        except GeneratorExit:
+            print(f"Client disconnected from /get/stream after {len(parts)} chunks; generation cancelled.")
+            raise
+        except Exception as e:
+            metrics.upstream_error("gemini", "error")
+            yield event("error", error=f"Generation failed: {e}")
+            return
+        finally:
+            # Closing the chain's iterator closes the model's streaming response
+            tokens.close()
+
+        finished = time.perf_counter()
+        metrics.observe_phase("rag.generation", finished - retrieved)
+        answer = "".join(parts)
+        answer_cache.store(msg, {"answer": answer, "context": ids}, vector, finished - started)
+        yield event("done", answer=answer, cache="miss", timings_ms={
+            "retrieval": round((retrieved - started) * 1000, 1),
+            "first_token": round(((first_token or finished) - started) * 1000, 1),
+            "total": round((finished - started) * 1000, 1),
+        })
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/answer-cache/stats", methods=["GET"])
+def get_answer_cache_stats():
+    return jsonify(answer_cache.snapshot())
+
+@app.route("/health", methods=["GET"])
+def health():
+    """Liveness: the process serves requests, whether or not the models are loaded."""
+    return jsonify({"status": "ok", "service": "FasalSaathi Expert API", "state": runtime.state})
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """Readiness: 200 once the embedder, retriever and chain are loaded, else 503."""
+    status = {**runtime.snapshot(), "import_seconds": IMPORT_SECONDS}
+    return jsonify(status), 200 if runtime.state == "ready" else 503
+
+IMPORT_SECONDS = round(time.perf_counter() - _IMPORT_STARTED, 3)
+print(f"app.py imported in {IMPORT_SECONDS}s; RAG_WARMUP={RAG_WARMUP}.")
+
+if RAG_WARMUP == "eager":
+    runtime.get()
+elif RAG_WARMUP == "background":
+    runtime.start()
 
 if __name__ == '__main__':
     app.run(host="0.0.0.0", port=8080, debug=False)
@@ -0,0 +1,200 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+
+from src.local_index import normalize
+
+_PUNCTUATION = re.compile(r"[^\w\s]", re.UNICODE)
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_query(text):
+    """Case, punctuation and whitespace insensitive form of a question."""
+    return _SPACES.sub(" ", _PUNCTUATION.sub(" ", str(text).lower())).strip()
+
+
+class AnswerCache:
+    """
+    LRU of chain answers with two lookup tiers:
+      exact     the normalized question was answered before
+      semantic  a cached question's embedding is within `threshold` cosine
+                similarity of this one (set threshold > 1 to disable)
+    Entries expire after `ttl` seconds (0 = never). Concurrent misses on the
+    same normalized question share one chain call.
+    """
+
+    def __init__(self, embed, max_entries=512, ttl=0, threshold=0.93):
+        self.embed = embed
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries = OrderedDict()  # key -> (answer, created, slot)
+        self._matrix = None  # (max_entries, dim) unit query vectors, by slot
+        self._slot_keys = [None] * max_entries
+        self._free = list(range(max_entries - 1, -1, -1))
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "coalesced": 0,
+                      "errors": 0, "evictions": 0, "expired": 0}
+        self._compute_seconds = 0.0
+        self._lookup_seconds = 0.0
+        self._lookups = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _fresh(self, created):
+        return not self.ttl or time.time() - created <= self.ttl
+
+    def _drop(self, key):
+        _, _, slot = self._entries.pop(key)
+        self._slot_keys[slot] = None
+        self._free.append(slot)
+
+    def _remember(self, key, answer, vector):
+        if key in self._entries:
+            self._drop(key)
+        while not self._free:
+            self._drop(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+        slot = self._free.pop()
+        if vector is not None:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+            self._matrix[slot] = vector
+        self._slot_keys[slot] = key
+        self._entries[key] = (answer, time.time(), slot)
+
+    def _exact(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if not self._fresh(entry[1]):
+            self._drop(key)
+            self.stats["expired"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def _nearest(self, vector):
+        """(key, similarity) of the most similar fresh cached question, or None."""
+        if self._matrix is None or not self._entries:
+            return None
+        scores = self._matrix @ vector
+        for slot in np.argsort(-scores):
+            if scores[slot] < self.threshold:
+                return None
+            key = self._slot_keys[slot]
+            if key is None:
+                continue
+            if self._exact(key) is not None:
+                return key, float(scores[slot])
+        return None
+
+    def lookup(self, question):
+        """
+        (answer, tier, vector) with tier "exact" or "semantic" on a hit, or
+        (None, "miss", vector) where `vector` is the question's embedding to
+        hand back to store().
+        """
+        if not self.enabled:
+            return None, "miss", None
+        started = time.perf_counter()
+        key = normalize_query(question)
+        with self._lock:
+            answer = self._exact(key)
+            if answer is not None:
+                self.stats["exact_hits"] += 1
+                self._hit(started)
+                return answer, "exact", None
+
+        vector = None
+        if self.threshold <= 1:
+            vector = normalize(self.embed(question)).reshape(-1)
+            with self._lock:
+                nearest = self._nearest(vector)
+                if nearest is not None:
+                    self.stats["semantic_hits"] += 1
+                    self._hit(started)
+                    return self._entries[nearest[0]][0], "semantic", vector
+        return None, "miss", vector
+
+    def _hit(self, started):
+        self._lookups += 1
+        self._lookup_seconds += time.perf_counter() - started
+
+    def store(self, question, answer, vector=None, seconds=0.0):
+        """Caches a freshly computed answer; `seconds` is what computing it cost."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.stats["misses"] += 1
+            self._compute_seconds += seconds
+            self._remember(normalize_query(question), answer, vector)
+
+    def get_or_compute(self, question, compute):
+        """
+        Returns (answer, tier) with tier "exact", "semantic" or "miss";
+        `compute(vector)` runs the chain on a miss, given the question's unit
+        embedding from the semantic lookup (None when there was none) so it
+        need not embed it again. Exceptions are not cached.
+        """
+        if not self.enabled:
+            return compute(None), "miss"
+
+        answer, tier, vector = self.lookup(question)
+        if tier != "miss":
+            return answer, tier
+
+        key = normalize_query(question)
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            return future.result(), "exact"
+
+        try:
+            started = time.perf_counter()
+            answer = compute(vector)
+            self.store(question, answer, vector, time.perf_counter() - started)
+            future.set_result(answer)
+            return answer, "miss"
+        except Exception as e:
+            with self._lock:
+                self.stats["errors"] += 1
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            size = len(self._entries)
+            compute_seconds = self._compute_seconds
+            lookup_ms = self._lookup_seconds * 1000 / self._lookups if self._lookups else 0.0
+        served = stats["exact_hits"] + stats["semantic_hits"] + stats["coalesced"]
+        lookups = served + stats["misses"] + stats["errors"]
+        avg = compute_seconds / stats["misses"] if stats["misses"] else 0.0
+        return {
+            **stats,
+            "size": size,
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "hit_ratio": round(served / lookups, 4) if lookups else 0.0,
+            "llm_calls_saved": served,
+            "avg_hit_ms": round(lookup_ms, 3),
+            "avg_chain_seconds": round(avg, 3),
+            "estimated_seconds_saved": round(served * avg, 1),
+        }
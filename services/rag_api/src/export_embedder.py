@@ -0,0 +1,27 @@
+"""
+Saves the embedding model to a local directory so app.py can load it from
+disk (EMBEDDING_MODEL_PATH) instead of resolving it on the HuggingFace hub
+at startup.
+
+    python -m src.export_embedder [--out models/all-MiniLM-L6-v2]
+"""
+import argparse
+import time
+
+from src.helper import EMBEDDING_MODEL
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="models/all-MiniLM-L6-v2")
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+
+    started = time.perf_counter()
+    SentenceTransformer(EMBEDDING_MODEL).save(args.out)
+    print(f"Saved '{EMBEDDING_MODEL}' to '{args.out}' in {time.perf_counter() - started:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
 from langchain.document_loaders import PyPDFLoader, DirectoryLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.embeddings import HuggingFaceEmbeddings
-from typing import List
+from typing import Any, List
 from langchain.schema import Document
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
 
 
 #Extract Data From the PDF File
@@ -19,19 +21,13 @@ def load_pdf_file(data):
 
 def filter_to_minimal_docs(docs: List[Document]) -> List[Document]:
     """
-    Given a list of Document objects, return a new list of Document objects
-    containing only 'source' in metadata and the original page_content.
+    Trims each Document's metadata down to 'source', in place (the loader's
+    Documents are not needed afterwards, so they are not copied), and returns
+    the same list.
     """
-    minimal_docs: List[Document] = []
     for doc in docs:
-        src = doc.metadata.get("source")
-        minimal_docs.append(
-            Document(
-                page_content=doc.page_content,
-                metadata={"source": src}
-            )
-        )
-    return minimal_docs
+        doc.metadata = {"source": doc.metadata.get("source")}
+    return docs
 
 
 
@@ -44,6 +40,38 @@ def text_split(extracted_data):
 
 
 #Download the Embeddings from HuggingFace 
-def download_hugging_face_embeddings():
-    embeddings=HuggingFaceEmbeddings(model_name='sentence-transformers/all-MiniLM-L6-v2')  #this model return 384 dimensions
-    return embeddings
\ No newline at end of file
+EMBEDDING_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'  #this model return 384 dimensions
+
+def download_hugging_face_embeddings(batch_size=32, model_path=None, quantize=False):
+    """
+    `model_path` loads a copy saved by `python -m src.export_embedder` instead
+    of resolving the model on the HuggingFace hub. `quantize` converts the
+    Linear layers to int8 (dynamic quantization) for faster CPU inference;
+    its vectors differ slightly from the float model's that built the index.
+    """
+    embeddings=HuggingFaceEmbeddings(model_name=model_path or EMBEDDING_MODEL,
+                                     encode_kwargs={"batch_size": batch_size})
+    if quantize:
+        import torch
+        embeddings.client = torch.quantization.quantize_dynamic(embeddings.client, {torch.nn.Linear}, dtype=torch.qint8)
+    return embeddings
+
+
+
+#Retriever over the local vector index (src/local_index.py)
+class LocalIndexRetriever(BaseRetriever):
+    """Embeds the query and searches a LocalIndex; returns Documents like the Pinecone retriever."""
+    index: Any
+    embeddings: Any
+    k: int = 3
+    mode: str = "exact"
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.search_by_vector(self.embeddings.embed_query(query))
+
+    def search_by_vector(self, vector) -> List[Document]:
+        """Retrieval for an already embedded query."""
+        return [
+            Document(page_content=chunk["text"], metadata=chunk["metadata"])
+            for chunk, _ in self.index.search_chunks(vector, self.k, self.mode)
+        ]
@@ -0,0 +1,236 @@
+"""
+Incremental, parallel ingestion of data/*.pdf into the local index.
+
+1. Every PDF is fingerprinted (size and mtime, then sha256). Files unchanged
+   since the last run keep their chunk list from the manifest and are not
+   parsed again.
+2. New or changed files are parsed and split in a process pool.
+3. Only chunks whose id (hash of source and text) is not already in the
+   index are embedded, a batch at a time.
+4. The index is written to a temporary directory in bounded batches, vectors
+   straight into a memory-mapped .npy, and swapped in when complete.
+   Optionally the same new vectors are upserted to Pinecone.
+
+With nothing changed the run stops after step 1, before the embedding model
+is even loaded.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from src.local_index import CHUNKS, VECTORS, LocalIndex, chunk_id, normalize, write_ivf, write_meta
+
+MANIFEST = "ingest_manifest.json"
+# Same splitter settings as helper.text_split
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 20
+PINECONE_BATCH = 100
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def parse_pdf(path):
+    """Worker: one PDF -> (path, [chunk text]), split page by page like text_split()."""
+    from langchain.document_loaders import PyPDFLoader
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    texts = []
+    for page in PyPDFLoader(path).lazy_load():
+        texts.extend(splitter.split_text(page.page_content))
+    return path, texts
+
+
+def load_manifest(index_dir):
+    try:
+        with open(os.path.join(index_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def scan_files(data_dir, previous):
+    """
+    {path: fingerprint} for every PDF, plus the paths that need parsing.
+    A fingerprint keeps its "chunks" id list when the file is unchanged.
+    """
+    files, changed = {}, []
+    for path in sorted(str(Path(data_dir) / name) for name in os.listdir(data_dir) if name.endswith(".pdf")):
+        st = os.stat(path)
+        prev = previous.get(path)
+        if prev and prev["size"] == st.st_size and prev["mtime_ns"] == st.st_mtime_ns:
+            files[path] = prev
+            continue
+        digest = file_digest(path)
+        if prev and prev["sha256"] == digest:
+            files[path] = dict(prev, mtime_ns=st.st_mtime_ns)
+            continue
+        files[path] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest, "chunks": None}
+        changed.append(path)
+    return files, changed
+
+
+def _swap_in(tmp_dir, out_dir):
+    backup = out_dir.rstrip("/\\") + ".old"
+    shutil.rmtree(backup, ignore_errors=True)
+    if os.path.exists(out_dir):
+        os.replace(out_dir, backup)
+    os.replace(tmp_dir, out_dir)
+    shutil.rmtree(backup, ignore_errors=True)
+
+
+def ingest(data_dir, out_dir, load_embeddings, model_name, dtype="float32", ivf_lists=None,
+           workers=None, batch_size=512, pinecone_index=None, force=False):
+    """
+    Brings the local index at `out_dir` up to date with the PDFs in `data_dir`.
+    `load_embeddings()` is only called when some chunk needs embedding.
+    `pinecone_index` (a pinecone Index) additionally receives new chunks and
+    loses removed ones. Returns a summary dict.
+    """
+    started = time.perf_counter()
+    settings = {
+        "embedding_model": model_name,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "dtype": dtype,
+        "ivf_lists": ivf_lists,
+    }
+    manifest = {} if force else load_manifest(out_dir)
+    if manifest.get("settings") != settings or not LocalIndex.exists(out_dir):
+        manifest = {}
+    previous = manifest.get("files", {})
+    pinecone_synced = pinecone_index is None or manifest.get("pinecone_synced", False)
+
+    files, changed = scan_files(data_dir, previous)
+    removed = sorted(set(previous) - set(files))
+    summary = {"files": len(files), "changed": len(changed), "removed": len(removed)}
+
+    if not changed and not removed and pinecone_synced:
+        if files != previous:
+            manifest["files"] = files
+            with open(os.path.join(out_dir, MANIFEST), "w") as f:
+                json.dump(manifest, f, indent=2)
+        summary.update(chunks=len({cid for f in files.values() for cid in f["chunks"]}), embedded=0,
+                       seconds=round(time.perf_counter() - started, 2))
+        print(f"Index '{out_dir}' is up to date ({summary['files']} files, {summary['chunks']} chunks).")
+        return summary
+
+    # Parse and split the changed files in parallel
+    new_texts = {}
+    if changed:
+        if len(changed) > 1 and workers != 1:
+            with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(changed))) as pool:
+                parsed = list(pool.map(parse_pdf, changed))
+        else:
+            parsed = [parse_pdf(path) for path in changed]
+        for path, texts in parsed:
+            ids = []
+            for text in texts:
+                cid = chunk_id(text, {"source": path})
+                new_texts.setdefault(cid, (text, path))
+                ids.append(cid)
+            files[path]["chunks"] = ids
+
+    old = LocalIndex(out_dir, upcast=False) if manifest else None
+    old_rows = {c["id"]: i for i, c in enumerate(old.chunks)} if old else {}
+    old_ids = set(old_rows)
+
+    # Final row order: files in name order, each chunk once
+    rows, seen = [], set()
+    for path in sorted(files):
+        for cid in files[path]["chunks"]:
+            if cid not in seen:
+                seen.add(cid)
+                rows.append(cid)
+
+    tmp_dir = out_dir.rstrip("/\\") + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    embeddings = None
+    vectors = None
+    embedded = 0
+    with open(os.path.join(tmp_dir, CHUNKS), "w", encoding="utf-8") as chunks_out:
+        for start in range(0, len(rows), batch_size):
+            window = rows[start:start + batch_size]
+            fresh = [cid for cid in window if cid not in old_rows]
+            fresh_vectors = {}
+            if fresh:
+                if embeddings is None:
+                    embeddings = load_embeddings()
+                batch = normalize(embeddings.embed_documents([new_texts[cid][0] for cid in fresh]))
+                fresh_vectors = dict(zip(fresh, batch))
+                embedded += len(fresh)
+
+            if vectors is None:
+                dimension = old.meta["dimension"] if old else len(next(iter(fresh_vectors.values())))
+                vectors = open_memmap(os.path.join(tmp_dir, VECTORS), mode="w+", dtype=dtype,
+                                      shape=(len(rows), dimension))
+
+            upserts = []
+            for offset, cid in enumerate(window):
+                if cid in fresh_vectors:
+                    vectors[start + offset] = fresh_vectors[cid]
+                    text, source = new_texts[cid]
+                    record = {"id": cid, "text": text, "metadata": {"source": source}}
+                else:
+                    vectors[start + offset] = old.vectors[old_rows[cid]]
+                    record = old.chunks[old_rows[cid]]
+                chunks_out.write(json.dumps(record) + "\n")
+                # Pinecone gets new chunks, or everything when it has never been synced
+                if pinecone_index is not None and (cid in fresh_vectors or not pinecone_synced):
+                    upserts.append((record, vectors[start + offset]))
+
+            if upserts:
+                _pinecone_upsert(pinecone_index, upserts)
+
+    if vectors is None:
+        raise ValueError(f"No text chunks found in '{data_dir}'")
+    vectors.flush()
+
+    if pinecone_index is not None:
+        stale = sorted(old_ids - seen)
+        for i in range(0, len(stale), PINECONE_BATCH):
+            pinecone_index.delete(ids=stale[i:i + PINECONE_BATCH])
+
+    ivf = write_ivf(tmp_dir, vectors, ivf_lists)
+    write_meta(tmp_dir, len(rows), vectors.shape[1], dtype, model_name, ivf)
+    del vectors
+    with open(os.path.join(tmp_dir, MANIFEST), "w") as f:
+        json.dump({
+            "settings": settings,
+            "files": files,
+            "pinecone_synced": pinecone_index is not None or manifest.get("pinecone_synced", False),
+        }, f, indent=2)
+    _swap_in(tmp_dir, out_dir)
+
+    summary.update(chunks=len(rows), embedded=embedded, reused=len(rows) - embedded,
+                   seconds=round(time.perf_counter() - started, 2))
+    print(f"Index '{out_dir}' updated: {summary['changed']} changed and {summary['removed']} removed "
+          f"of {summary['files']} files; {embedded} chunks embedded, {summary['reused']} reused "
+          f"in {summary['seconds']}s.")
+    return summary
+
+
+def _pinecone_upsert(index, items):
+    """items: [(chunk record, vector)], sent in PINECONE_BATCH-sized requests."""
+    for i in range(0, len(items), PINECONE_BATCH):
+        index.upsert(vectors=[
+            # "text" is where langchain's PineconeVectorStore looks for the page content
+            {"id": record["id"], "values": np.asarray(vector, dtype=np.float32).tolist(),
+             "metadata": {"text": record["text"], **record["metadata"]}}
+            for record, vector in items[i:i + PINECONE_BATCH]
+        ])
@@ -0,0 +1,173 @@
+"""
+On-disk vector index for the RAG corpus, searched in-process.
+
+Layout of an index directory (written by `build_local_index`):
+  meta.json         dimension, dtype, row count, embedding model, IVF settings
+  vectors.npy       (n, dim) L2-normalised float32 or float16, memory-mapped
+  chunks.jsonl      one {"id", "text", "metadata"} per row, same order
+  ivf_*.npy         optional inverted-file index (centroids, row order, offsets)
+
+Search is cosine similarity (dot product of unit vectors), like the Pinecone
+index. "exact" scores every row; "ivf" scores only the rows in the `nprobe`
+lists whose centroids are nearest the query.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+META = "meta.json"
+VECTORS = "vectors.npy"
+CHUNKS = "chunks.jsonl"
+FORMAT_VERSION = 1
+
+# Rows scored per block when float16 vectors are upcast for the dot product
+BLOCK_ROWS = 8192
+
+
+def chunk_id(text, metadata):
+    source = (metadata or {}).get("source", "")
+    return hashlib.sha1(f"{source}\x1f{text}".encode("utf-8")).hexdigest()
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def kmeans(vectors, n_lists, iterations=10, seed=0):
+    """Spherical k-means on unit vectors; returns (centroids, assignment)."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for j in range(n_lists):
+            members = vectors[assignment == j]
+            if len(members):
+                centroids[j] = members.sum(axis=0)
+        centroids = normalize(centroids)
+    return centroids, np.argmax(vectors @ centroids.T, axis=1)
+
+
+def write_ivf(out_dir, vectors, ivf_lists=None):
+    """
+    Writes the IVF files for unit `vectors`; returns the number of lists.
+    `ivf_lists` defaults to ~sqrt(n) when the corpus is large enough to
+    benefit; 0 skips IVF.
+    """
+    if ivf_lists is None:
+        ivf_lists = int(np.sqrt(len(vectors))) if len(vectors) >= 1024 else 0
+    ivf_lists = min(ivf_lists, len(vectors))
+    if ivf_lists:
+        centroids, assignment = kmeans(np.asarray(vectors, dtype=np.float32), ivf_lists)
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.searchsorted(assignment[order], np.arange(ivf_lists + 1))
+        np.save(os.path.join(out_dir, "ivf_centroids.npy"), centroids)
+        np.save(os.path.join(out_dir, "ivf_order.npy"), order.astype(np.int64))
+        np.save(os.path.join(out_dir, "ivf_offsets.npy"), offsets.astype(np.int64))
+    return ivf_lists
+
+
+def write_meta(out_dir, count, dimension, dtype, model_name, ivf_lists):
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "count": count,
+        "dimension": dimension,
+        "dtype": dtype,
+        "metric": "cosine",
+        "embedding_model": model_name,
+        "ivf_lists": ivf_lists,
+    }
+    with open(os.path.join(out_dir, META), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def build_local_index(out_dir, texts, metadatas, vectors, model_name="", dtype="float32", ivf_lists=None):
+    """Writes an index directory from in-memory chunks and vectors (see src/ingest.py for the streaming build)."""
+    if dtype not in ("float32", "float16"):
+        raise ValueError(f"Unsupported vector dtype '{dtype}'")
+    vectors = normalize(vectors)
+    if len(vectors) != len(texts) or len(texts) != len(metadatas):
+        raise ValueError("texts, metadatas and vectors must have the same length")
+
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, VECTORS), vectors.astype(dtype))
+    with open(os.path.join(out_dir, CHUNKS), "w", encoding="utf-8") as f:
+        for text, metadata in zip(texts, metadatas):
+            f.write(json.dumps({"id": chunk_id(text, metadata), "text": text, "metadata": metadata}) + "\n")
+
+    ivf_lists = write_ivf(out_dir, vectors, ivf_lists)
+    dimension = int(vectors.shape[1]) if len(vectors) else 0
+    return write_meta(out_dir, len(vectors), dimension, dtype, model_name, ivf_lists)
+
+
+class LocalIndex:
+
+    def __init__(self, index_dir, nprobe=8, upcast=True):
+        """
+        float16 vectors are upcast to float32 in memory once (`upcast`), which
+        keeps queries on BLAS; pass upcast=False to score them straight from
+        the memory map in blocks when the matrix is too large for that.
+        """
+        with open(os.path.join(index_dir, META)) as f:
+            self.meta = json.load(f)
+        if self.meta.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported local index format {self.meta.get('format_version')}")
+        self.vectors = np.load(os.path.join(index_dir, VECTORS), mmap_mode="r")
+        if upcast and self.vectors.dtype != np.float32:
+            self.vectors = np.asarray(self.vectors, dtype=np.float32)
+        with open(os.path.join(index_dir, CHUNKS), encoding="utf-8") as f:
+            self.chunks = [json.loads(line) for line in f]
+        self.nprobe = nprobe
+
+        self.centroids = None
+        if self.meta.get("ivf_lists"):
+            self.centroids = np.load(os.path.join(index_dir, "ivf_centroids.npy"))
+            self.ivf_order = np.load(os.path.join(index_dir, "ivf_order.npy"))
+            self.ivf_offsets = np.load(os.path.join(index_dir, "ivf_offsets.npy"))
+
+    @classmethod
+    def exists(cls, index_dir):
+        return os.path.exists(os.path.join(index_dir, META))
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def _scores(self, query, rows=None):
+        vectors = self.vectors if rows is None else self.vectors[rows]
+        if vectors.dtype == np.float32:
+            return vectors @ query
+        out = np.empty(len(vectors), dtype=np.float32)
+        for start in range(0, len(vectors), BLOCK_ROWS):
+            block = np.asarray(vectors[start:start + BLOCK_ROWS], dtype=np.float32)
+            out[start:start + BLOCK_ROWS] = block @ query
+        return out
+
+    def _candidates(self, query, nprobe):
+        lists = np.argsort(-(self.centroids @ query))[:nprobe]
+        return np.concatenate([self.ivf_order[self.ivf_offsets[j]:self.ivf_offsets[j + 1]] for j in lists])
+
+    def search(self, query_vector, k=3, mode="exact", nprobe=None):
+        """Returns [(row, score)] best first. mode: "exact" or "ivf" (exact when no IVF was built)."""
+        query = normalize(query_vector).reshape(-1)
+        rows = None
+        if mode == "ivf" and self.centroids is not None:
+            rows = self._candidates(query, nprobe or self.nprobe)
+        elif mode not in ("exact", "ivf"):
+            raise ValueError(f"Unknown search mode '{mode}'")
+
+        scores = self._scores(query, rows)
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        ids = top if rows is None else rows[top]
+        return [(int(i), float(scores[j])) for i, j in zip(ids, top)]
+
+    def search_chunks(self, query_vector, k=3, mode="exact"):
+        """Like search(), with the stored chunk dicts: [(chunk, score)]."""
+        return [(self.chunks[row], score) for row, score in self.search(query_vector, k, mode)]
@@ -0,0 +1,69 @@
+"""
+Compares retrieval backends on the fixed question set in eval/retrieval_queries.json.
+
+    python -m src.retrieval_eval [--pinecone]
+
+Reports, for the local index in IVF mode and (with --pinecone) for the
+Pinecone index, how many of the exact local top-k chunks each one returns
+(recall@k, matched on chunk text) and the mean search latency. Query
+embedding time is measured separately since every backend pays it.
+"""
+import argparse
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+
+from src.helper import download_hugging_face_embeddings
+from src.local_index import LocalIndex
+
+EVAL_SET = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "eval", "retrieval_queries.json")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", default=os.getenv("LOCAL_INDEX_DIR", "local_index"))
+    parser.add_argument("--pinecone", action="store_true", help="also query the Pinecone index")
+    parser.add_argument("--pinecone-index", default="fasalsaathi-expert-ai")
+    args = parser.parse_args()
+    load_dotenv()
+
+    with open(EVAL_SET) as f:
+        eval_set = json.load(f)
+    k, queries = eval_set["k"], eval_set["queries"]
+
+    embeddings = download_hugging_face_embeddings()
+    index = LocalIndex(args.index)
+
+    started = time.perf_counter()
+    vectors = [embeddings.embed_query(q) for q in queries]
+    embed_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+    def timed(search):
+        results, seconds = [], 0.0
+        for q, v in zip(queries, vectors):
+            started = time.perf_counter()
+            results.append(search(q, v))
+            seconds += time.perf_counter() - started
+        return results, seconds * 1e6 / len(queries)
+
+    exact, exact_us = timed(lambda q, v: [c["text"] for c, _ in index.search_chunks(v, k, "exact")])
+    backends = {"local ivf": timed(lambda q, v: [c["text"] for c, _ in index.search_chunks(v, k, "ivf")])}
+    if args.pinecone:
+        from langchain_pinecone import PineconeVectorStore
+        store = PineconeVectorStore.from_existing_index(index_name=args.pinecone_index, embedding=embeddings)
+        backends["pinecone"] = timed(
+            lambda q, v: [d.page_content for d in store.similarity_search_by_vector(v, k=k)]
+        )
+
+    print(f"{len(queries)} queries, k={k}, {len(index)} chunks; query embedding {embed_ms:.1f} ms")
+    print(f"{'backend':<12}{'recall@k':>10}{'search us':>12}")
+    print(f"{'local exact':<12}{1.0:>10.3f}{exact_us:>12.1f}")
+    for name, (results, us) in backends.items():
+        recall = sum(len(set(r) & set(e)) / k for r, e in zip(results, exact)) / len(queries)
+        print(f"{name:<12}{recall:>10.3f}{us:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
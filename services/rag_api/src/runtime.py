@@ -0,0 +1,75 @@
+"""
+Lazily built service components with background warm-up.
+
+`LazyRuntime(build)` runs `build(timings)` once, either on a background
+thread (start()) or on the first get(). Until it succeeds the service is
+alive but not ready. A failed build is retried on the next get() and does
+not take the process down.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+
+class NotReady(Exception):
+    """The components are still loading, or failed to load."""
+
+
+@contextmanager
+def timed(timings, phase):
+    """Records the seconds spent in the block as timings[phase]."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[phase] = round(time.perf_counter() - started, 3)
+
+
+class LazyRuntime:
+
+    def __init__(self, build):
+        self.build = build
+        self.components = None
+        self.state = "cold"  # cold, warming, ready or failed
+        self.error = None
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def _load(self, timeout):
+        if not self._lock.acquire(timeout=-1 if timeout is None else timeout):
+            raise NotReady(f"Still loading after {timeout}s")
+        try:
+            if self.components is not None:
+                return self.components
+            self.state, self.error = "warming", None
+            timings = {}
+            try:
+                with timed(timings, "total"):
+                    components = self.build(timings)
+            except Exception as e:
+                self.state, self.error, self.timings = "failed", str(e), timings
+                print(f"Loading failed after {timings['total']}s: {e}")
+                raise NotReady(f"Failed to load: {e}") from e
+            self.components, self.state, self.timings = components, "ready", timings
+            print(f"Ready in {timings['total']}s ({timings}).")
+            return components
+        finally:
+            self._lock.release()
+
+    def start(self):
+        """Loads on a background thread; get() callers wait for it."""
+        def warm():
+            try:
+                self._load(None)
+            except NotReady:
+                pass
+
+        threading.Thread(target=warm, name="warmup", daemon=True).start()
+
+    def get(self, timeout=None):
+        """The built components, loading them if needed; NotReady after `timeout` seconds or on failure."""
+        components = self.components
+        return components if components is not None else self._load(timeout)
+
+    def snapshot(self):
+        return {"state": self.state, "error": self.error, "timings_s": dict(self.timings)}
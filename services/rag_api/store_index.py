@@ -1,9 +1,8 @@
 from dotenv import load_dotenv
+import argparse
 import os
-from src.helper import load_pdf_file, filter_to_minimal_docs, text_split, download_hugging_face_embeddings
-from pinecone import Pinecone
-from pinecone import ServerlessSpec 
-from langchain_pinecone import PineconeVectorStore
+from src.helper import download_hugging_face_embeddings
+from src.ingest import ingest
 
 load_dotenv()
 
@@ -11,36 +10,61 @@ load_dotenv()
 PINECONE_API_KEY=os.environ.get('PINECONE_API_KEY')
 OPENAI_API_KEY=os.environ.get('OPENAI_API_KEY')
 
-os.environ["PINECONE_API_KEY"] = PINECONE_API_KEY
-os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
+EMBEDDING_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
 
 
-extracted_data=load_pdf_file(data='data/')
-filter_data = filter_to_minimal_docs(extracted_data)
-text_chunks=text_split(filter_data)
+def pinecone_index():
+    from pinecone import Pinecone
+    from pinecone import ServerlessSpec
 
-embeddings = download_hugging_face_embeddings()
+    os.environ["PINECONE_API_KEY"] = PINECONE_API_KEY
+    if OPENAI_API_KEY:
+        os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
 
-pinecone_api_key = PINECONE_API_KEY
-pc = Pinecone(api_key=pinecone_api_key)
+    pinecone_api_key = PINECONE_API_KEY
+    pc = Pinecone(api_key=pinecone_api_key)
 
+    index_name = "medical-chatbot"  # change if desired
 
+    if not pc.has_index(index_name):
+        pc.create_index(
+            name=index_name,
+            dimension=384,
+            metric="cosine",
+            spec=ServerlessSpec(cloud="aws", region="us-east-1"),
+        )
 
-index_name = "medical-chatbot"  # change if desired
+    return pc.Index(index_name)
 
-if not pc.has_index(index_name):
-    pc.create_index(
-        name=index_name,
-        dimension=384,
-        metric="cosine",
-        spec=ServerlessSpec(cloud="aws", region="us-east-1"),
-    )
 
-index = pc.Index(index_name)
+def main():
+    parser = argparse.ArgumentParser(
+        description="Chunk and embed the PDFs in data/ into the vector store. Only new or changed "
+                    "files are parsed and only new chunks embedded; the local index always keeps the "
+                    "vectors, and --backend pinecone/both also syncs them to Pinecone.")
+    parser.add_argument("--backend", choices=["local", "pinecone", "both"], default="local")
+    parser.add_argument("--data", default="data/")
+    parser.add_argument("--out", default=os.getenv("LOCAL_INDEX_DIR", "local_index"))
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    parser.add_argument("--ivf-lists", type=int, default=None, help="IVF lists (default: ~sqrt(chunks) for large corpora)")
+    parser.add_argument("--workers", type=int, default=None, help="PDF parsing processes (default: CPU count)")
+    parser.add_argument("--batch", type=int, default=512, help="chunks embedded and written per batch")
+    parser.add_argument("--full", action="store_true", help="ignore the manifest and rebuild from scratch")
+    args = parser.parse_args()
+
+    ingest(
+        args.data,
+        args.out,
+        load_embeddings=lambda: download_hugging_face_embeddings(batch_size=min(args.batch, 256)),
+        model_name=EMBEDDING_MODEL,
+        dtype=args.dtype,
+        ivf_lists=args.ivf_lists,
+        workers=args.workers,
+        batch_size=args.batch,
+        pinecone_index=pinecone_index() if args.backend in ("pinecone", "both") else None,
+        force=args.full,
+    )
 
 
-docsearch = PineconeVectorStore.from_documents(
-    documents=text_chunks,
-    index_name=index_name,
-    embedding=embeddings, 
-)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
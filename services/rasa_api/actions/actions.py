@@ -1,5 +1,6 @@
 # actions/actions.py
 import os
+import sys
 import json
 import logging
 from typing import Any, Dict, List, Text
@@ -9,6 +10,16 @@ from rasa_sdk import Action, Tracker
 from rasa_sdk.executor import CollectingDispatcher
 from rasa_sdk.events import SlotSet, EventType
 
+# Pooled outbound client shared by all services (services/common)
+_COMMON_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, "common"))
+if _COMMON_DIR not in sys.path:
+    sys.path.insert(0, _COMMON_DIR)
+from outbound import client as http
+import metrics
+from advisory_pipeline import AdvisoryPipeline, PipelineError
+
+from .report_outbox import PermanentDeliveryError, ReportOutbox
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -23,6 +34,18 @@ FORECAST_TIMEOUT = int(os.getenv("FORECAST_TIMEOUT", "20"))
 RISK_TIMEOUT     = int(os.getenv("RISK_TIMEOUT", "20"))
 SAVE_TIMEOUT     = int(os.getenv("SAVE_TIMEOUT_SECS", "15"))
 
+# Final reports go through a local write-ahead queue (see report_outbox.py).
+# STORE_SYNC_WAIT_SECS > 0 waits that long for delivery so the backend's key can go into the slots.
+REPORT_OUTBOX_PATH = os.getenv(
+    "REPORT_OUTBOX_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "report_outbox.sqlite3"),
+)
+STORE_SYNC_WAIT  = float(os.getenv("STORE_SYNC_WAIT_SECS", "0"))
+
+# The action server is not ours to add routes to, so /metrics gets its own
+# port; 0 leaves it off
+METRICS_PORT     = int(os.getenv("ACTIONS_METRICS_PORT", "0"))
+
 REQUIRED_INPUT_SLOTS = ["crop", "seed_type", "soil", "district", "season", "state", "sw_date"]
 
 
@@ -31,6 +54,7 @@ class ActionCallCropPlanner(Action):
     def name(self) -> Text:
         return "action_call_crop_planner"
 
+    @metrics.timed("rasa.action_call_crop_planner")
     def run(self, dispatcher: CollectingDispatcher, tracker: Tracker, domain: Dict[Text, Any]) -> List[EventType]:
         missing = [s for s in REQUIRED_INPUT_SLOTS if not tracker.get_slot(s)]
         if missing:
@@ -48,12 +72,15 @@ class ActionCallCropPlanner(Action):
         }
 
         try:
-            logger.info("Calling planner API with payload:\n%s", json.dumps(payload, indent=2))
-            resp = requests.post(PLANNER_URL, json=payload, timeout=PLANNER_TIMEOUT)
+            logger.info("Calling planner API (%s)…", PLANNER_URL)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Planner payload:\n%s", json.dumps(payload, indent=2))
+            resp = http.post(PLANNER_URL, json=payload, timeout=PLANNER_TIMEOUT, deadline=PLANNER_TIMEOUT)
             resp.raise_for_status()
             data = resp.json()
 
-            logger.info("Planner API response:\n%s", json.dumps(data, indent=2))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Planner API response:\n%s", json.dumps(data, indent=2))
             dispatcher.utter_message(
                 text="I've fetched your crop plan. (Full JSON attached)",
                 json_message={"stage": "ideals", "planner_response": data},
@@ -75,6 +102,7 @@ class ActionCallForecast(Action):
     def name(self) -> Text:
         return "action_call_forecast"
 
+    @metrics.timed("rasa.action_call_forecast")
     def run(self, dispatcher: CollectingDispatcher, tracker: Tracker, domain: Dict[Text, Any]) -> List[EventType]:
         planner_json = tracker.get_slot("planner_response")
         if not planner_json:
@@ -83,11 +111,12 @@ class ActionCallForecast(Action):
 
         try:
             logger.info("Calling forecast API (%s)…", FORECAST_URL)
-            res = requests.post(FORECAST_URL, json=planner_json, timeout=FORECAST_TIMEOUT)
+            res = http.post(FORECAST_URL, json=planner_json, timeout=FORECAST_TIMEOUT, deadline=FORECAST_TIMEOUT)
             res.raise_for_status()
             forecast_json = res.json()
 
-            logger.info("Forecast response:\n%s", json.dumps(forecast_json, indent=2))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Forecast response:\n%s", json.dumps(forecast_json, indent=2))
             dispatcher.utter_message(
                 text="(forecast) Added the latest forecast to your plan.",
                 json_message={"stage": "forecast", "forecast_response": forecast_json},
@@ -113,6 +142,7 @@ class ActionCallRisk(Action):
     def name(self) -> Text:
         return "action_call_risk"
 
+    @metrics.timed("rasa.action_call_risk")
     def run(self, dispatcher: CollectingDispatcher, tracker: Tracker, domain: Dict[Text, Any]) -> List[EventType]:
         forecast_json = tracker.get_slot("forecast_response") or tracker.get_slot("forecasted_file")
         if not forecast_json:
@@ -121,11 +151,12 @@ class ActionCallRisk(Action):
 
         try:
             logger.info("Calling risk API (%s)…", RISK_URL)
-            res = requests.post(RISK_URL, json=forecast_json, timeout=RISK_TIMEOUT)
+            res = http.post(RISK_URL, json=forecast_json, timeout=RISK_TIMEOUT, deadline=RISK_TIMEOUT)
             res.raise_for_status()
             risk_json = res.json()
 
-            logger.info("Risk response:\n%s", json.dumps(risk_json, indent=2))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Risk response:\n%s", json.dumps(risk_json, indent=2))
             dispatcher.utter_message(
                 text="(risk) Computed stage-wise risk and overall risk.",
                 json_message={"stage": "risk", "risk_response": risk_json},
@@ -146,11 +177,103 @@ class ActionCallRisk(Action):
             return []
 
 
+# 1-3 fused) Planner → forecast → risk in one step
+advisory_pipeline = AdvisoryPipeline()
+
+PIPELINE_ERROR_TEXT = {
+    "input": "Some details are missing or invalid. Please check your answers.",
+    "planner": "The planner service is not reachable right now. Please try again.",
+    "forecast": "Forecast service isn’t reachable right now.",
+    "risk": "Risk service isn’t reachable right now.",
+}
+
+
+class ActionRunAdvisoryPipeline(Action):
+    """
+    Runs the planner, forecast and risk stages in one go (in-process when the
+    services are co-located, see common/advisory_pipeline.py). Only the final
+    risk report goes into the slots; the intermediate payloads are logged and
+    kept in slots only with debug logging on.
+    """
+
+    def name(self) -> Text:
+        return "action_run_advisory_pipeline"
+
+    @metrics.timed("rasa.action_run_advisory_pipeline")
+    def run(self, dispatcher: CollectingDispatcher, tracker: Tracker, domain: Dict[Text, Any]) -> List[EventType]:
+        missing = [s for s in REQUIRED_INPUT_SLOTS if not tracker.get_slot(s)]
+        if missing:
+            dispatcher.utter_message(text=f"Some details are missing: {', '.join(missing)}")
+            return []
+
+        profile = {s: tracker.get_slot(s) for s in REQUIRED_INPUT_SLOTS}
+        debug = logger.isEnabledFor(logging.DEBUG)
+
+        try:
+            result = advisory_pipeline.run(profile, include_intermediate=debug)
+        except PipelineError as e:
+            logger.error("Advisory pipeline failed at %s: %s", e.stage, e)
+            dispatcher.utter_message(text=PIPELINE_ERROR_TEXT.get(e.stage, "Something went wrong while preparing your report."))
+            return []
+        except Exception as e:
+            logger.exception("Unexpected error in advisory pipeline: %s", e)
+            dispatcher.utter_message(text="Something went wrong while preparing your report.")
+            return []
+
+        risk_json = result["risk"]
+        logger.info("Advisory pipeline done: modes=%s timings_ms=%s", result.get("modes"), result.get("timings_ms"))
+        if debug:
+            logger.debug("Advisory pipeline result:\n%s", json.dumps(result, indent=2))
+
+        dispatcher.utter_message(
+            text="(risk) Built your crop plan, added the latest forecast and computed stage-wise risk.",
+            json_message={"stage": "risk", "risk_response": risk_json},
+        )
+        events: List[EventType] = [SlotSet("risk_response", risk_json)]
+        if debug:
+            events += [
+                SlotSet("planner_response", result.get("planner")),
+                SlotSet("forecast_response", result.get("forecast")),
+            ]
+        return events
+
+
 # 4) Store FINAL data (prefer risk → forecast → planner)
+def send_report(payload: Dict[Text, Any], key: Text) -> Dict[Text, Any]:
+    """Delivers one queued report; the outbox retries anything but a rejection."""
+    res = http.post(
+        RAW_DATA_ENDPOINT, json=payload, headers={"Idempotency-Key": key},
+        timeout=SAVE_TIMEOUT, retries=0,
+    )
+    if 400 <= res.status_code < 500 and res.status_code not in (408, 429):
+        raise PermanentDeliveryError(f"{res.status_code}: {res.text[:200]}")
+    res.raise_for_status()
+    try:
+        return res.json()
+    except ValueError:
+        return {"status": "ok", "raw_text": res.text}
+
+
+report_outbox = ReportOutbox(
+    REPORT_OUTBOX_PATH,
+    send_report,
+    batch_size=int(os.getenv("REPORT_OUTBOX_BATCH", "20")),
+    interval=float(os.getenv("REPORT_OUTBOX_INTERVAL_SECS", "2")),
+    backoff_max=float(os.getenv("REPORT_OUTBOX_BACKOFF_MAX_SECS", "300")),
+)
+report_outbox.start()
+metrics.REGISTRY.gauge(
+    "report_outbox_reports", "Final reports in the local outbox by delivery state.", ("state",),
+).add_source(lambda: {(state,): count for state, count in report_outbox.snapshot().items()})
+if METRICS_PORT:
+    metrics.start_http_server(METRICS_PORT)
+
+
 class ActionStoreFinalData(Action):
     def name(self) -> Text:
         return "action_store_final_data"
 
+    @metrics.timed("rasa.action_store_final_data")
     def run(self, dispatcher: CollectingDispatcher, tracker: Tracker, domain: Dict[Text, Any]) -> List[EventType]:
         user_id = tracker.get_slot("user_id") or tracker.sender_id
         final_json = (
@@ -167,35 +290,30 @@ class ActionStoreFinalData(Action):
             dispatcher.utter_message(text="I need your user ID to save your report.")
             return []
 
-        payload = {"userid": str(user_id), "report": final_json}
-
         try:
-            logger.info("Saving FINAL JSON to %s for user_id=%s", RAW_DATA_ENDPOINT, user_id)
-            res = requests.post(RAW_DATA_ENDPOINT, json=payload, timeout=SAVE_TIMEOUT)
-            res.raise_for_status()
-            try:
-                out = res.json()
-            except ValueError:
-                out = {"status": "ok", "raw_text": res.text}
-
-            logger.info("Store response:\n%s", json.dumps(out, indent=2))
-
-            report_key = out.get("key") or (out.get("data") or {}).get("key") or out.get("report_id")
-            events: List[EventType] = [SlotSet("storage_response", out)]
-            if report_key:
-                events += [SlotSet("report_key", report_key), SlotSet("report_id", report_key)]
-
-            dispatcher.utter_message(
-                text="✅ Saved your final report.",
-                json_message={"stage": "indexed", "storage_response": out},
-            )
-            return events
-
-        except requests.RequestException as e:
-            logger.exception("Store API error: %s", e)
-            dispatcher.utter_message(text="I couldn’t save your report right now. Please try again.")
-            return []
+            key = report_outbox.enqueue(user_id, final_json)
+            logger.info("Queued FINAL JSON for user_id=%s (idempotency key %s)", user_id, key[:12])
+            # Normally 0: the turn returns as soon as the report is durably queued
+            status = report_outbox.wait_delivered(key, STORE_SYNC_WAIT) if STORE_SYNC_WAIT > 0 else None
         except Exception as e:
-            logger.exception("Unexpected error while saving final data: %s", e)
+            logger.exception("Could not queue final data: %s", e)
             dispatcher.utter_message(text="Something went wrong while saving your report.")
             return []
+
+        if status and status["state"] == "delivered":
+            out = status["response"] or {}
+        else:
+            out = {"status": "queued", "idempotency_key": key}
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Store response:\n%s", json.dumps(out, indent=2))
+
+        report_key = out.get("key") or (out.get("data") or {}).get("key") or out.get("report_id")
+        events: List[EventType] = [SlotSet("storage_response", out)]
+        if report_key:
+            events += [SlotSet("report_key", report_key), SlotSet("report_id", report_key)]
+
+        dispatcher.utter_message(
+            text="✅ Saved your final report.",
+            json_message={"stage": "indexed", "storage_response": out},
+        )
+        return events
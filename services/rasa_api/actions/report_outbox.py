@@ -0,0 +1,207 @@
+"""
+Durable outbox for final reports.
+
+`ReportOutbox.enqueue` commits the report to a local SQLite write-ahead
+queue and returns at once; a background flusher claims due reports in
+batches and posts them concurrently, one request per report, since the
+backend's set-raw-data endpoint takes a single report. Each enqueue gets
+its own idempotency key, so a retried delivery is recognised by the backend
+instead of stored twice, while saving the same report again is stored as a
+new report. Failed deliveries are retried with jittered exponential
+backoff for as long as it takes. Only permanent rejections (4xx other than
+408/429) stop, and those rows are kept as 'failed' rather than deleted.
+"""
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class PermanentDeliveryError(Exception):
+    """The backend rejected the report; retrying will not help."""
+
+
+class ReportOutbox:
+    """
+    `send(payload, key)` delivers one report and returns the backend's JSON
+    answer; it raises PermanentDeliveryError for rejections and anything
+    else for failures worth retrying.
+    """
+
+    def __init__(self, path, send, batch_size=20, interval=2.0, workers=4,
+                 backoff=2.0, backoff_max=300.0, lease=60.0, retention=7 * 24 * 3600):
+        self.path = path
+        self.send = send
+        self.batch_size = batch_size
+        self.interval = interval
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.lease = lease
+        self.retention = retention
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._delivered = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report-outbox")
+        self._thread = None
+        self._start_lock = threading.Lock()
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "key TEXT NOT NULL UNIQUE, "
+                "payload TEXT NOT NULL, "
+                "state TEXT NOT NULL DEFAULT 'pending', "
+                "attempts INTEGER NOT NULL DEFAULT 0, "
+                "next_attempt REAL NOT NULL, "
+                "created REAL NOT NULL, "
+                "delivered REAL, "
+                "response TEXT, "
+                "last_error TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (state, next_attempt)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # A queued report must survive a crash, not just a restart
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, user_id, report):
+        """Durably queues {"userid", "report"}; returns its idempotency key."""
+        # Per enqueue, not per content: only retries of this delivery share it
+        key = uuid.uuid4().hex
+        payload = {"userid": str(user_id), "report": report, "idempotency_key": key}
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO outbox (key, payload, next_attempt, created) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(payload), now, now),
+        )
+        self._wakeup.set()
+        return key
+
+    def status(self, key):
+        row = self._conn().execute(
+            "SELECT state, attempts, response, last_error FROM outbox WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "state": row[0],
+            "attempts": row[1],
+            "response": json.loads(row[2]) if row[2] else None,
+            "last_error": row[3],
+        }
+
+    def wait_delivered(self, key, timeout):
+        """Blocks up to `timeout` seconds for the report to leave the queue; returns its status."""
+        deadline = time.monotonic() + timeout
+        with self._delivered:
+            while True:
+                status = self.status(key)
+                remaining = deadline - time.monotonic()
+                if status is None or status["state"] != "pending" or remaining <= 0:
+                    return status
+                self._delivered.wait(remaining)
+
+    def _claim(self):
+        """Leases up to batch_size due rows so a second flusher will not send them too."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT id, key, payload, attempts FROM outbox "
+                "WHERE state = 'pending' AND next_attempt <= ? ORDER BY id LIMIT ?",
+                (now, self.batch_size),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE outbox SET next_attempt = ? WHERE id = ?",
+                [(now + self.lease, row[0]) for row in rows],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def _deliver(self, row):
+        row_id, key, payload, attempts = row
+        conn = self._conn()
+        try:
+            response = self.send(json.loads(payload), key)
+        except PermanentDeliveryError as e:
+            logger.error("Report %s rejected by the backend, keeping it as failed: %s", key[:12], e)
+            conn.execute(
+                "UPDATE outbox SET state = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+                (attempts + 1, str(e), row_id),
+            )
+            return False
+        except Exception as e:
+            delay = random.uniform(0.5, 1.0) * min(self.backoff_max, self.backoff * (2 ** attempts))
+            logger.warning("Report %s delivery failed (attempt %d), retrying in %.0fs: %s",
+                           key[:12], attempts + 1, delay, e)
+            conn.execute(
+                "UPDATE outbox SET attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+                (attempts + 1, time.time() + delay, str(e), row_id),
+            )
+            return False
+        conn.execute(
+            "UPDATE outbox SET state = 'delivered', attempts = ?, delivered = ?, response = ?, "
+            "last_error = NULL WHERE id = ?",
+            (attempts + 1, time.time(), json.dumps(response), row_id),
+        )
+        return True
+
+    def flush_once(self):
+        """Posts one claimed batch of due reports concurrently; returns how many were attempted."""
+        rows = self._claim()
+        if rows:
+            list(self._pool.map(self._deliver, rows))
+            with self._delivered:
+                self._delivered.notify_all()
+        return len(rows)
+
+    def _prune(self):
+        self._conn().execute(
+            "DELETE FROM outbox WHERE state = 'delivered' AND delivered < ?",
+            (time.time() - self.retention,),
+        )
+
+    def _run(self):
+        last_prune = 0.0
+        while True:
+            self._wakeup.clear()
+            try:
+                # Keep draining while full batches come back
+                while self.flush_once() >= self.batch_size:
+                    pass
+                if time.time() - last_prune > 3600:
+                    self._prune()
+                    last_prune = time.time()
+            except Exception as e:
+                logger.exception("Report outbox flush failed: %s", e)
+            self._wakeup.wait(self.interval)
+
+    def start(self):
+        """Starts the background flusher (once); it also drains reports left by a previous run."""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="report-outbox-flusher", daemon=True)
+                self._thread.start()
+
+    def snapshot(self):
+        rows = self._conn().execute("SELECT state, COUNT(*) FROM outbox GROUP BY state").fetchall()
+        counts = {"pending": 0, "delivered": 0, "failed": 0}
+        counts.update(dict(rows))
+        return counts
@@ -1,143 +1,211 @@
 import json
 import requests
 import os 
-from flask import Flask, request, jsonify
+import sys
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
+from description_cache import DescriptionCache, description_signature, signature_key
+from description_jobs import DescriptionJobs
+
+# Pooled outbound client shared by all services (services/common)
+_COMMON_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "common"))
+if _COMMON_DIR not in sys.path:
+    sys.path.insert(0, _COMMON_DIR)
+from outbound import client as http
+import metrics
+from risk_engine import analyze_plans
 
 API_KEY = os.environ.get("GEMINI_API_KEY")
+BATCH_CHUNK_SIZE = int(os.environ.get("RISK_BATCH_CHUNK_SIZE", "4096"))
+
+# Hard cap on how long a description may hold up a response (seconds)
+DESCRIPTION_TIMEOUT = float(os.environ.get("DESCRIPTION_TIMEOUT_SECS", "12"))
+# template: answer at once with the template summary (or the LLM's, if it is
+# already cached) plus a handle to poll for the LLM one; sync: wait for the
+# LLM description; async: return only a handle to poll; stream: NDJSON with
+# the score first and the description second
+DESCRIPTION_MODE = os.environ.get("DESCRIPTION_MODE", "template")
+DESCRIPTION_MODES = ("template", "sync", "async", "stream")
+
+# Generated descriptions keyed by risk signature; set DESCRIPTION_CACHE_PATH
+# to also keep them on disk across restarts
+description_cache = DescriptionCache(
+    max_entries=int(os.environ.get("DESCRIPTION_CACHE_SIZE", "1024")),
+    path=os.environ.get("DESCRIPTION_CACHE_PATH") or None,
+    ttl=float(os.environ.get("DESCRIPTION_CACHE_TTL_SECS", str(7 * 24 * 3600))),
+)
+
+metrics.register_cache("description", lambda: description_cache.stats,
+                       size=lambda: description_cache.snapshot()["size"])
 
 app = Flask(__name__)
 CORS(app)
+# Request histograms and GET /metrics (Prometheus text format)
+metrics.instrument_flask(app, "risk_api")
 
 
-def calculate_risk(ideal, forecasted):
-    if ideal == 0 and forecasted == 0:
-        return 0.0
-    if ideal == 0:
-        return 1.0
-    deviation = abs(ideal - forecasted) / ideal
-    return min(deviation, 1.0)
+def fallback_description(risk_data):
+    """Template summary used when the LLM is unavailable or too slow."""
+    overall_level = risk_data['overall_risk']['level']
+    stage_risks = sorted(risk_data['stage_wise_risk'], key=lambda x: x['score'], reverse=True)
+    text = (
+        f"The overall weather risk for your {risk_data['crop']} crop in "
+        f"{risk_data['district']} is {overall_level}."
+    )
+    if stage_risks:
+        top_stages = " and ".join(f"{s['name']} ({s['level']} risk)" for s in stage_risks[:2])
+        text += f" Pay the most attention during {top_stages}."
+    return text
 
 
-def interpret_risk(score, is_stage=False):
-    if is_stage:
-        if score < 0.15: return "Low"
-        if score < 0.30: return "Moderate"
-        if score < 0.50: return "High"
-        return "Very High"
-    else:
-        if score < 1.5: return "Low"
-        if score < 3.0: return "Moderate"
-        if score < 5.0: return "High"
-        return "Very High"
+def request_description(risk_data):
+    """Asks Gemini for the farmer-facing summary; raises on any failure."""
+    crop = risk_data['crop']
+    district = risk_data['district']
+    overall_level = risk_data['overall_risk']['level']
+    
+    stage_risks = sorted(risk_data['stage_wise_risk'], key=lambda x: x['score'], reverse=True)
+    top_stages_info = [f"'{stage['name']}' ({stage['level']} risk)" for stage in stage_risks[:2]]
 
+    system_prompt = "You are an agricultural expert providing clear, concise advice to farmers. Your tone should be helpful and direct."
+    user_prompt = (
+        f"I have an analysis for a {crop} crop in {district}. "
+        f"The overall risk is '{overall_level}'. The most critical stages are {', '.join(top_stages_info)}. "
+        f"Please provide a short, 2-3 sentence summary explaining this risk to a farmer. "
+        f"Focus on what the overall risk means and which stages need the most attention."
+    )
+
+    api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-05-20:generateContent?key={API_KEY}"
+
+    payload = {
+        "contents": [{"parts": [{"text": user_prompt}]}],
+        "systemInstruction": {"parts": [{"text": system_prompt}]}
+    }
+
+    response = http.post(
+        api_url, json=payload, headers={'Content-Type': 'application/json'},
+        timeout=DESCRIPTION_TIMEOUT, deadline=DESCRIPTION_TIMEOUT,
+    )
+    response.raise_for_status() 
+    
+    result = response.json()
+    
+    description = result.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', '')
+    if not description or not description.strip():
+        raise ValueError("empty summary in model response")
+    return description.strip()
 
+
+@metrics.timed("risk.description")
 def generate_description(risk_data):
+    """
+    LLM summary for a risk analysis, served from the description cache when the
+    same signature was seen before; falls back to the template on any failure.
+    """
     if not API_KEY:
-        return "Description could not be generated: API Key not configured."
-        
+        print("Description could not be generated: API Key not configured.")
+        return fallback_description(risk_data)
+
     try:
-        
-        crop = risk_data['crop']
-        district = risk_data['district']
-        overall_level = risk_data['overall_risk']['level']
-        
-        stage_risks = sorted(risk_data['stage_wise_risk'], key=lambda x: x['score'], reverse=True)
-        top_stages_info = [f"'{stage['name']}' ({stage['level']} risk)" for stage in stage_risks[:2]]
-
-        system_prompt = "You are an agricultural expert providing clear, concise advice to farmers. Your tone should be helpful and direct."
-        user_prompt = (
-            f"I have an analysis for a {crop} crop in {district}. "
-            f"The overall risk is '{overall_level}'. The most critical stages are {', '.join(top_stages_info)}. "
-            f"Please provide a short, 2-3 sentence summary explaining this risk to a farmer. "
-            f"Focus on what the overall risk means and which stages need the most attention."
-        )
-
-        api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-05-20:generateContent?key={API_KEY}"
-
-        payload = {
-            "contents": [{"parts": [{"text": user_prompt}]}],
-            "systemInstruction": {"parts": [{"text": system_prompt}]}
-        }
-
-        response = requests.post(api_url, json=payload, headers={'Content-Type': 'application/json'})
-        response.raise_for_status() 
-        
-        result = response.json()
-        
-        description = result.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', '')
-        
-        return description.strip() if description else "Could not generate a summary."
+        key = signature_key(description_signature(risk_data))
+        return description_cache.get_or_compute(key, lambda: request_description(risk_data))
 
     except requests.exceptions.HTTPError as e:
-        return f"Description could not be generated due to API error (Status {e.response.status_code}): {e.response.text}"
+        print(f"Description could not be generated due to API error (Status {e.response.status_code}): {e.response.text}")
+        metrics.upstream_error("gemini", "http_error")
     except requests.exceptions.RequestException as e:
-        return f"Description could not be generated due to a network error: {e}"
+        print(f"Description could not be generated due to a network error: {e}")
+        metrics.upstream_error("gemini", "network")
     except Exception as e:
-        return f"Description could not be generated due to an unexpected error: {e}"
+        print(f"Description could not be generated due to an unexpected error: {e}")
+        metrics.upstream_error("gemini", "error")
+    return fallback_description(risk_data)
+
 
+description_jobs = DescriptionJobs(
+    generate_description,
+    fallback_description,
+    timeout=DESCRIPTION_TIMEOUT,
+    workers=int(os.environ.get("DESCRIPTION_WORKERS", "8")),
+)
 
+
+@metrics.timed("risk.score")
 def analyze_crop_risk(data):
-    total_risk_score = 0
-    stage_risks_list = []
-    parameter_weights = {
-        'tmin_c': 0.2, 'tmax_c': 0.2, 'rh_pct': 0.2, 'rain_mm': 0.2, 'wind_kmph': 0.2
-    }
+    return analyze_plans([data])[0]
 
-    for stage in data['stages']:
-        stage_name = stage['name']
-        ideal = stage['ideal']
-        forecasted = stage['forecasted']
-        importance = stage['importance_weight']
-
-        tmin_risk = calculate_risk(ideal['tmin_c'], forecasted['tmin_c'])
-        tmax_risk = calculate_risk(ideal['tmax_c'], forecasted['tmax_c'])
-        rh_risk = calculate_risk(ideal['rh_pct'], forecasted['rh_pct'])
-        rain_risk = calculate_risk(ideal['rain_mm'], forecasted['rain_mm'])
-        wind_risk = calculate_risk(ideal['wind_kmph'], forecasted['wind_kmph'])
-
-        stage_parameter_risk = (
-            tmin_risk * parameter_weights['tmin_c'] +
-            tmax_risk * parameter_weights['tmax_c'] +
-            rh_risk * parameter_weights['rh_pct'] +
-            rain_risk * parameter_weights['rain_mm'] +
-            wind_risk * parameter_weights['wind_kmph']
-        )
-        
-        final_stage_risk = stage_parameter_risk * importance
-        risk_level = interpret_risk(final_stage_risk, is_stage=True)
-        
-        stage_risks_list.append({
-            'name': stage_name,
-            'score': round(final_stage_risk, 2),
-            'level': risk_level
-        })
-        total_risk_score += final_stage_risk
-
-    overall_risk_level = interpret_risk(total_risk_score)
-    
-    risk_result = {
-        "crop": data.get('crop', 'N/A'),
-        "district": data.get('district', 'N/A'),
-        "stage_wise_risk": stage_risks_list,
-        "overall_risk": {
-            "score": round(total_risk_score, 2),
-            "level": overall_risk_level
-        }
-    }
-    return risk_result
+
+def analyze_crop_risk_batch(plans, chunk_size=BATCH_CHUNK_SIZE):
+    """
+    Yields {"index", "result"} or {"index", "error"} per plan, scoring
+    `chunk_size` plans per vectorized pass so memory stays flat.
+    """
+    for start in range(0, len(plans), chunk_size):
+        chunk = plans[start:start + chunk_size]
+        try:
+            with metrics.span("risk.score_batch"):
+                results = analyze_plans(chunk)
+        except Exception:
+            # Isolate the bad plan(s) instead of failing the whole chunk
+            results = []
+            for plan in chunk:
+                try:
+                    results.append({"result": analyze_plans([plan])[0]})
+                except KeyError as e:
+                    results.append({"error": f"Missing key in input data: {e}"})
+                except Exception as e:
+                    results.append({"error": f"Invalid plan: {e}"})
+        else:
+            results = [{"result": result} for result in results]
+        for offset, item in enumerate(results):
+            yield {"index": start + offset, **item}
 
 
 @app.route("/calculate-risk", methods=['POST'])
 def handle_risk_calculation():
+    """
+    Scores the plan; ?description=template|sync|async|stream picks how the LLM
+    summary is delivered (default DESCRIPTION_MODE). In template and async mode
+    the response carries a description_id to fetch from /descriptions/<id>.
+    """
     if not request.json:
         return jsonify({"error": "Invalid request: No JSON data provided"}), 400
 
+    mode = request.args.get("description", DESCRIPTION_MODE)
+    if mode not in DESCRIPTION_MODES:
+        return jsonify({"error": f"Invalid description mode '{mode}', expected one of {DESCRIPTION_MODES}"}), 400
+
     try:
         risk_analysis_data = analyze_crop_risk(request.json)
-        human_description = generate_description(risk_analysis_data)
-        risk_analysis_data['description'] = human_description
-        return jsonify(risk_analysis_data)
+
+        if mode == "sync":
+            # Nothing to poll later, so no job is registered
+            risk_analysis_data['description'] = description_jobs.describe(risk_analysis_data)['description']
+            return jsonify(risk_analysis_data)
+
+        description_id = description_jobs.submit(risk_analysis_data)
+        if mode == "template":
+            job = description_jobs.poll(description_id)
+            if job["status"] == "pending":
+                risk_analysis_data['description'] = fallback_description(risk_analysis_data)
+            else:
+                risk_analysis_data['description'] = job['description']
+            risk_analysis_data['description_id'] = description_id
+            risk_analysis_data['description_status'] = job["status"]
+            return jsonify(risk_analysis_data)
+
+        if mode == "async":
+            risk_analysis_data['description'] = None
+            risk_analysis_data['description_id'] = description_id
+            risk_analysis_data['description_status'] = "pending"
+            return jsonify(risk_analysis_data), 202
+
+        # stream
+        def generate():
+            yield json.dumps({"type": "risk", "description_id": description_id, **risk_analysis_data}) + "\n"
+            yield json.dumps({"type": "description", **description_jobs.wait(description_id)}) + "\n"
+
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
         
     except KeyError as e:
         return jsonify({"error": f"Missing key in input data: {e}"}), 400
@@ -145,5 +213,48 @@ def handle_risk_calculation():
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
 
+@app.route("/descriptions/<description_id>", methods=['GET'])
+def get_description(description_id):
+    """
+    Status of an async description: pending, ready or fallback.
+    Pass ?wait=1 to block until it resolves (bounded by DESCRIPTION_TIMEOUT_SECS).
+    """
+    if request.args.get("wait") in ("1", "true"):
+        job = description_jobs.wait(description_id)
+    else:
+        job = description_jobs.poll(description_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired description_id"}), 404
+    return jsonify(job)
+
+
+@app.route("/description-cache/stats", methods=['GET'])
+def get_description_cache_stats():
+    return jsonify(description_cache.snapshot())
+
+
+@app.route("/outbound/stats", methods=['GET'])
+def get_outbound_stats():
+    return jsonify(http.snapshot())
+
+
+@app.route("/calculate-risk/batch", methods=['POST'])
+def handle_risk_calculation_batch():
+    """
+    Scores a JSON list of forecast-filled plans (or {"plans": [...]}) and streams
+    one NDJSON line per plan in input order. No LLM descriptions are generated.
+    """
+    data = request.get_json(silent=True)
+    plans = data.get("plans") if isinstance(data, dict) else data
+    if not isinstance(plans, list) or not plans:
+        return jsonify({"error": "Invalid request: a non-empty list of plans is required"}), 400
+
+    def generate():
+        for item in analyze_crop_risk_batch(plans):
+            yield json.dumps(item) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
 if __name__ == "__main__":
     app.run(host='0.0.0.0', port=5002, debug=True)
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+def description_signature(risk_data):
+    """
+    Everything the description prompt depends on: crop, district, overall
+    level and the two highest-scoring stages with their levels.
+    """
+    stage_risks = sorted(risk_data['stage_wise_risk'], key=lambda x: x['score'], reverse=True)
+    return {
+        "crop": str(risk_data['crop']).strip().lower(),
+        "district": str(risk_data['district']).strip().lower(),
+        "overall_level": risk_data['overall_risk']['level'],
+        "top_stages": [[s['name'], s['level']] for s in stage_risks[:2]],
+    }
+
+
+def signature_key(signature):
+    blob = json.dumps(signature, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class DescriptionCache:
+    """
+    Content-addressed LRU of generated descriptions, optionally backed by
+    SQLite. Concurrent misses on the same key share one in-flight call.
+    """
+
+    def __init__(self, max_entries=1024, path=None, ttl=0):
+        self.max_entries = max_entries
+        self.path = path
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0, "errors": 0}
+        self._compute_seconds = 0.0
+        if path:
+            self._conn().execute(
+                "CREATE TABLE IF NOT EXISTS descriptions "
+                "(key TEXT PRIMARY KEY, text TEXT NOT NULL, created REAL NOT NULL)"
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _fresh(self, created):
+        return not self.ttl or time.time() - created <= self.ttl
+
+    def _remember(self, key, text, created):
+        self._entries[key] = (text, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_get(self, key):
+        row = self._conn().execute(
+            "SELECT text, created FROM descriptions WHERE key = ?", (key,)
+        ).fetchone()
+        return row if row and self._fresh(row[1]) else None
+
+    def _disk_put(self, key, text, created):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO descriptions (key, text, created) VALUES (?, ?, ?)",
+                (key, text, created),
+            )
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns the cached text for `key`, or runs `compute()` once for all
+        concurrent callers and caches its result. Exceptions are not cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and self._fresh(entry[1]):
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[0]
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+
+        if not leader:
+            # Counted once the leader's outcome is known: a shared failure saved nothing
+            try:
+                text = future.result()
+            except Exception:
+                with self._lock:
+                    self.stats["errors"] += 1
+                raise
+            with self._lock:
+                self.stats["coalesced"] += 1
+            return text
+
+        try:
+            row = self._disk_get(key) if self.path else None
+            if row:
+                text, created = row
+                with self._lock:
+                    self.stats["disk_hits"] += 1
+            else:
+                started = time.monotonic()
+                text, created = compute(), time.time()
+                if self.path:
+                    self._disk_put(key, text, created)
+                with self._lock:
+                    self.stats["misses"] += 1
+                    self._compute_seconds += time.monotonic() - started
+            with self._lock:
+                self._remember(key, text, created)
+            future.set_result(text)
+            return text
+        except Exception as e:
+            with self._lock:
+                self.stats["errors"] += 1
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            size = len(self._entries)
+            compute_seconds = self._compute_seconds
+        served = stats["hits"] + stats["disk_hits"] + stats["coalesced"]
+        lookups = served + stats["misses"] + stats["errors"]
+        avg = compute_seconds / stats["misses"] if stats["misses"] else 0.0
+        return {
+            **stats,
+            "size": size,
+            "hit_ratio": round(served / lookups, 4) if lookups else 0.0,
+            "llm_calls_saved": served,
+            "avg_llm_seconds": round(avg, 3),
+            "estimated_seconds_saved": round(served * avg, 1),
+        }
@@ -0,0 +1,81 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DescriptionJobs:
+    """
+    Runs description generation on a background pool so risk scores can be
+    returned before the LLM answers. Each job gets an id that can be polled
+    or waited on; a job that misses the hard timeout resolves to the
+    fallback text while the slow call is left to finish in the background.
+    Jobs are kept for `ttl` seconds, and at most `max_jobs` of them.
+    """
+
+    def __init__(self, generate, fallback, timeout, workers=8, ttl=900, max_jobs=10000):
+        self.generate = generate
+        self.fallback = fallback
+        self.timeout = timeout
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="risk-description")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, risk_data):
+        """Starts a description that callers may poll later by the returned id."""
+        job_id = uuid.uuid4().hex
+        future = self._pool.submit(self.generate, risk_data)
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            self._jobs[job_id] = (future, now, risk_data)
+            # Insertion order is age order: drop the oldest beyond the cap
+            while len(self._jobs) > self.max_jobs:
+                del self._jobs[next(iter(self._jobs))]
+        return job_id
+
+    def describe(self, risk_data):
+        """
+        The description for a caller that waits for it right away (sync mode):
+        same timeout and fallback as a job, but nothing is kept to poll.
+        """
+        future = self._pool.submit(self.generate, risk_data)
+        return self._outcome(future, time.monotonic(), risk_data, wait=True)
+
+    def _prune(self, now):
+        expired = [k for k, (_, created, _) in self._jobs.items() if now - created > self.ttl]
+        for k in expired:
+            del self._jobs[k]
+
+    def _outcome(self, future, created, risk_data, wait):
+        remaining = self.timeout - (time.monotonic() - created)
+
+        if not future.done() and remaining > 0:
+            if not wait:
+                return {"status": "pending", "description": None}
+            try:
+                future.result(timeout=remaining)
+            except Exception:
+                pass  # timed out or failed; both fall through to the fallback
+
+        if future.done() and future.exception() is None:
+            return {"status": "ready", "description": future.result()}
+        return {"status": "fallback", "description": self.fallback(risk_data)}
+
+    def _resolve(self, job_id, wait):
+        with self._lock:
+            self._prune(time.monotonic())
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        return {"description_id": job_id, **self._outcome(*job, wait=wait)}
+
+    def poll(self, job_id):
+        """Current state without blocking: pending, ready or fallback (None if unknown)."""
+        return self._resolve(job_id, wait=False)
+
+    def wait(self, job_id):
+        """Blocks until the description is ready or the hard timeout has passed."""
+        return self._resolve(job_id, wait=True)